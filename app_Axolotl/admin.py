@@ -1,8 +1,121 @@
 from django.contrib import admin
-from .models import Usuario, Artista, Producto, Pedido, DetallePedido
 
-admin.site.register(Usuario)
-admin.site.register(Artista)
-admin.site.register(Producto)
-admin.site.register(Pedido)
-admin.site.register(DetallePedido)
\ No newline at end of file
+from .models import (
+    Usuario, Artista, Producto, Pedido, DetallePedido, StockMovement,
+    PedidoArchivado, DetallePedidoArchivado,
+)
+
+
+class AdminIndexado(admin.ModelAdmin):
+    """Base de los admin de la app: sólo consultas que usan índices.
+
+    Igual que `buscar_admin` del panel, la búsqueda es por prefijo (`^campo`
+    sobre columnas indexadas) y un término numérico también busca por id.
+    """
+    # Un solo COUNT(*) exacto por lista: sin el segundo conteo de la tabla completa
+    show_full_result_count = False
+    # date_hierarchy que salta por el índice (templatetags/admin_fechas.py)
+    change_list_template = 'admin/change_list_fechas.html'
+
+    def get_search_results(self, request, queryset, search_term):
+        termino = search_term.strip()
+        resultado, duplicados = super().get_search_results(request, queryset, termino)
+        if termino.isdigit():
+            resultado = resultado | queryset.filter(pk=int(termino))
+        return resultado, duplicados
+
+
+@admin.register(Usuario)
+class UsuarioAdmin(AdminIndexado):
+    list_display = ('id', 'nombre', 'email', 'tel', 'user')
+    list_select_related = ('user',)
+    search_fields = ('^nombre', '^email')
+    ordering = ('nombre',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Artista)
+class ArtistaAdmin(AdminIndexado):
+    list_display = ('id', 'nombre_artista')
+    search_fields = ('^nombre_artista',)
+    ordering = ('nombre_artista',)
+
+
+@admin.register(Producto)
+class ProductoAdmin(AdminIndexado):
+    list_display = ('id', 'nombre_producto', 'artista', 'genero', 'tipo', 'precio', 'stock', 'novedad')
+    list_select_related = ('artista',)
+    # Campos con choices: las opciones del filtro no consultan la BD
+    list_filter = ('tipo', 'genero', 'novedad')
+    search_fields = ('^nombre_producto',)
+    ordering = ('nombre_producto',)
+    autocomplete_fields = ('artista',)
+
+
+@admin.register(Pedido)
+class PedidoAdmin(AdminIndexado):
+    list_display = ('id', 'usuario', 'cantidad_producto', 'total', 'fecha')
+    # Usuario.__str__ lee user.username
+    list_select_related = ('usuario__user',)
+    search_fields = ('^usuario__nombre',)
+    raw_id_fields = ('usuario',)
+    date_hierarchy = 'fecha'
+
+
+@admin.register(DetallePedido)
+class DetallePedidoAdmin(AdminIndexado):
+    list_display = ('id', 'numero_pedido', 'producto', 'usuario', 'cantidad_producto', 'precio', 'total', 'fecha')
+    list_select_related = ('producto', 'usuario__user')
+    search_fields = ('^producto__nombre_producto',)
+    autocomplete_fields = ('producto', 'usuario')
+    raw_id_fields = ('pedido',)
+    date_hierarchy = 'fecha'
+
+    @admin.display(description='Pedido', ordering='pedido_id')
+    def numero_pedido(self, obj):
+        # Mostrar el pedido con str() haría un JOIN más (Pedido.__str__ lee el usuario)
+        return f'#{obj.pedido_id}'
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(AdminIndexado):
+    list_display = ('id', 'producto', 'tipo', 'cantidad', 'compactado', 'numero_pedido', 'fecha')
+    list_select_related = ('producto',)
+    list_filter = ('tipo', 'compactado')
+    search_fields = ('^producto__nombre_producto',)
+    autocomplete_fields = ('producto',)
+    raw_id_fields = ('pedido',)
+    date_hierarchy = 'fecha'
+
+    @admin.display(description='Pedido', ordering='pedido_id')
+    def numero_pedido(self, obj):
+        return f'#{obj.pedido_id}' if obj.pedido_id else '-'
+
+
+class AdminArchivo(AdminIndexado):
+    # El archivo sólo lo escribe `archivar_pedidos`
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PedidoArchivado)
+class PedidoArchivadoAdmin(AdminArchivo):
+    list_display = ('id', 'usuario', 'cantidad_producto', 'total', 'fecha', 'archivado_en')
+    list_select_related = ('usuario__user',)
+    search_fields = ('^usuario__nombre',)
+    raw_id_fields = ('usuario',)
+    date_hierarchy = 'fecha'
+
+
+@admin.register(DetallePedidoArchivado)
+class DetallePedidoArchivadoAdmin(AdminArchivo):
+    list_display = ('id', 'numero_pedido', 'nombre_producto', 'cantidad_producto', 'precio', 'total', 'fecha')
+    raw_id_fields = ('pedido', 'usuario', 'producto')
+    date_hierarchy = 'fecha'
+
+    @admin.display(description='Pedido', ordering='pedido_id')
+    def numero_pedido(self, obj):
+        return f'#{obj.pedido_id}'
@@ -0,0 +1,180 @@
+"""Segmentos RFM y retención por cohortes sobre todo el historial de pedidos.
+
+En lugar de recorrer los pedidos de cada cliente con el ORM, las columnas
+(usuario, fecha, total) de `Pedido` y `PedidoArchivado` se leen en bloques con
+`values_list(...).iterator()` directamente a arreglos de NumPy y todos los
+cálculos son agrupaciones vectorizadas. Los resultados se guardan en
+`SegmentoCliente` y `CohorteMensual` para que el panel no tenga que recalcular.
+
+NumPy es opcional para el resto del sitio; sólo lo necesita este módulo.
+"""
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+from .models import CohorteMensual, Pedido, PedidoArchivado, SegmentoCliente
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+COLUMNAS = [('usuario', 'i8'), ('fecha', 'U10'), ('total', 'f8')]
+
+
+def _leer_columnas(queryset, chunk_size):
+    # La fecha se trae como texto 'AAAA-MM-DD' para que NumPy la convierta de una
+    # vez, sin crear un datetime de Python por fila.
+    filas = (
+        queryset.order_by()
+        .annotate(
+            _dia=Substr(Cast('fecha', CharField()), 1, 10),
+            _total=Cast('total', FloatField()),
+        )
+        .values_list('usuario_id', '_dia', '_total')
+        .iterator(chunk_size=chunk_size)
+    )
+    return np.fromiter(filas, dtype=COLUMNAS)
+
+
+def cargar_pedidos(chunk_size=20000):
+    """Devuelve (usuario, dia, total) de todos los pedidos, activos y archivados.
+
+    `dia` son días desde 1970-01-01 (int64).
+    """
+    datos = np.concatenate([
+        _leer_columnas(Pedido.objects.all(), chunk_size),
+        _leer_columnas(PedidoArchivado.objects.all(), chunk_size),
+    ])
+    dias = datos['fecha'].astype('datetime64[D]').astype(np.int64)
+    return datos['usuario'], dias, datos['total']
+
+
+def _quintil(valores):
+    """Puntaje 1..5 según el rango de cada valor (5 = los más altos, empates iguales)."""
+    menores = np.searchsorted(np.sort(valores), valores, side='left')
+    return (menores * 5 // len(valores) + 1).astype(np.int8)
+
+
+def calcular_rfm(usuario, dias, total, hoy):
+    """Recencia/frecuencia/monto y puntajes por cliente.
+
+    Devuelve un dict de arreglos alineados con `usuario_id` (ids únicos).
+    """
+    usuario_id, grupo = np.unique(usuario, return_inverse=True)
+    frecuencia = np.bincount(grupo)
+    monto = np.bincount(grupo, weights=total)
+    ultima = np.full(len(usuario_id), dias.min())
+    np.maximum.at(ultima, grupo, dias)
+    recencia = hoy - ultima
+
+    r = (6 - _quintil(recencia)).astype(np.int8)
+    f = _quintil(frecuencia)
+    m = _quintil(monto)
+    segmento = np.select(
+        [
+            (r >= 4) & (f >= 4),
+            (r <= 2) & (f >= 3),
+            r <= 1,
+            f >= 4,
+            (r >= 4) & (frecuencia == 1),
+        ],
+        ['campeones', 'en_riesgo', 'perdidos', 'leales', 'nuevos'],
+        default='ocasionales',
+    )
+    return {
+        'usuario_id': usuario_id,
+        'recencia': recencia,
+        'frecuencia': frecuencia,
+        'monto': monto,
+        'r': r,
+        'f': f,
+        'm': m,
+        'segmento': segmento,
+    }
+
+
+def calcular_cohortes(usuario, dias):
+    """Clientes distintos por (mes de primera compra, meses transcurridos).
+
+    Devuelve (cohorte, meses, clientes) con `cohorte` en meses desde 1970-01.
+    """
+    mes = dias.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    usuario_id, grupo = np.unique(usuario, return_inverse=True)
+    primer_mes = np.full(len(usuario_id), mes.max())
+    np.minimum.at(primer_mes, grupo, mes)
+
+    # Un cliente cuenta una sola vez por mes aunque haya comprado varias veces
+    base = mes.min()
+    ancho = mes.max() - base + 1
+    pares = np.unique(grupo.astype(np.int64) * ancho + (mes - base))
+    cliente, mes_compra = pares // ancho, pares % ancho + base
+    cohorte = primer_mes[cliente]
+    meses = mes_compra - cohorte
+
+    claves, clientes = np.unique((cohorte - base) * ancho + meses, return_counts=True)
+    return claves // ancho + base, claves % ancho, clientes
+
+
+def _mes_a_fecha(mes):
+    return date(1970 + int(mes) // 12, int(mes) % 12 + 1, 1)
+
+
+def guardar_resultados(rfm, cohortes, lote=2000):
+    """Reemplaza los segmentos y cohortes guardados por los nuevos resultados."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        SegmentoCliente.objects.all().delete()
+        segmentos = (
+            SegmentoCliente(
+                usuario_id=int(usuario_id),
+                recencia_dias=int(recencia),
+                frecuencia=int(frecuencia),
+                monto=Decimal(f'{monto:.2f}'),
+                puntaje_r=int(r),
+                puntaje_f=int(f),
+                puntaje_m=int(m),
+                segmento=str(segmento),
+                calculado=ahora,
+            )
+            for usuario_id, recencia, frecuencia, monto, r, f, m, segmento in zip(
+                rfm['usuario_id'], rfm['recencia'], rfm['frecuencia'], rfm['monto'],
+                rfm['r'], rfm['f'], rfm['m'], rfm['segmento'],
+            )
+        )
+        # bulk_create convierte su argumento en lista; se le pasa de a un lote
+        # para no tener millones de instancias en memoria a la vez.
+        while True:
+            bloque = list(islice(segmentos, lote))
+            if not bloque:
+                break
+            SegmentoCliente.objects.bulk_create(bloque)
+        CohorteMensual.objects.all().delete()
+        CohorteMensual.objects.bulk_create(
+            [
+                CohorteMensual(cohorte=_mes_a_fecha(cohorte), meses=int(meses), clientes=int(clientes), calculado=ahora)
+                for cohorte, meses, clientes in zip(*cohortes)
+            ],
+            batch_size=lote,
+        )
+
+
+def calcular_segmentos(chunk_size=20000):
+    """Calcula y guarda RFM y cohortes. Devuelve el número de clientes segmentados."""
+    if np is None:
+        raise ImportError('La analítica de clientes necesita numpy (pip install numpy).')
+    usuario, dias, total = cargar_pedidos(chunk_size)
+    if not len(usuario):
+        with transaction.atomic():
+            SegmentoCliente.objects.all().delete()
+            CohorteMensual.objects.all().delete()
+        return 0
+    hoy = np.datetime64(timezone.now().date(), 'D').astype(np.int64)
+    rfm = calcular_rfm(usuario, dias, total, hoy)
+    guardar_resultados(rfm, calcular_cohortes(usuario, dias))
+    return len(rfm['usuario_id'])
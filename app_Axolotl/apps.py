@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class AppAxolotlConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_Axolotl'
+
+    def ready(self):
+        # Señales que marcan las páginas estáticas a regenerar, publican cambios en vivo,
+        # invalidan las redirecciones por nombre y la instantánea del catálogo
+        from . import estaticos, eventos, instantanea, rutas  # noqa: F401
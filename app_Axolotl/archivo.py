@@ -0,0 +1,96 @@
+"""Archivo de pedidos viejos.
+
+Los pedidos con más de `settings.ARCHIVO_PEDIDOS_DIAS` días se copian a
+`PedidoArchivado`/`DetallePedidoArchivado` y se borran de las tablas activas
+(`python manage.py archivar_pedidos`). Cada lote es una transacción corta para
+no retener el bloqueo de escritura de SQLite mientras la tienda sigue vendiendo.
+
+Las vistas que necesitan el historial completo combinan ambas fuentes con
+`combinar_con_archivo`.
+"""
+import time
+from datetime import timedelta
+from itertools import islice
+from heapq import merge
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado
+
+
+def fecha_corte(dias=None):
+    if dias is None:
+        dias = getattr(settings, 'ARCHIVO_PEDIDOS_DIAS', 365)
+    return timezone.now() - timedelta(days=dias)
+
+
+def _archivar_lote(ids):
+    with transaction.atomic():
+        pedidos = list(Pedido.objects.filter(id__in=ids))
+        detalles = list(
+            DetallePedido.objects.filter(pedido_id__in=ids).select_related('producto')
+        )
+        PedidoArchivado.objects.bulk_create([
+            PedidoArchivado(
+                id=p.id,
+                usuario_id=p.usuario_id,
+                cantidad_producto=p.cantidad_producto,
+                total=p.total,
+                fecha=p.fecha,
+            )
+            for p in pedidos
+        ])
+        DetallePedidoArchivado.objects.bulk_create([
+            DetallePedidoArchivado(
+                id=d.id,
+                pedido_id=d.pedido_id,
+                usuario_id=d.usuario_id,
+                producto_id=d.producto_id,
+                nombre_producto=d.producto.nombre_producto,
+                cantidad_producto=d.cantidad_producto,
+                precio=d.precio,
+                fecha=d.fecha,
+                total=d.total,
+            )
+            for d in detalles
+        ])
+        DetallePedido.objects.filter(pedido_id__in=ids).delete()
+        Pedido.objects.filter(id__in=ids).delete()
+    return len(pedidos)
+
+
+def archivar_pedidos(antes_de, lote=500, pausa=0):
+    """Mueve al archivo los pedidos anteriores a `antes_de`, de `lote` en `lote`.
+
+    Entre lotes se libera el bloqueo (y se duerme `pausa` segundos si se pide)
+    para que los checkouts concurrentes no esperen a que termine todo el archivo.
+    Devuelve el número de pedidos archivados.
+    """
+    archivados = 0
+    while True:
+        ids = list(
+            Pedido.objects.filter(fecha__lt=antes_de)
+            .order_by('id')
+            .values_list('id', flat=True)[:lote]
+        )
+        if not ids:
+            break
+        archivados += _archivar_lote(ids)
+        if pausa:
+            time.sleep(pausa)
+    return archivados
+
+
+def combinar_con_archivo(activos, archivados, limite=None):
+    """Une dos querysets ordenados por '-fecha' en una sola lista ordenada.
+
+    `activos` y `archivados` deben venir ya ordenados por '-fecha'; con `limite`
+    sólo se leen `limite` filas de cada uno.
+    """
+    if limite is not None:
+        activos = activos[:limite]
+        archivados = archivados[:limite]
+    combinados = merge(activos, archivados, key=lambda fila: fila.fecha, reverse=True)
+    return list(islice(combinados, limite))
@@ -0,0 +1,217 @@
+"""Minificación de HTML y compresión de respuestas.
+
+Las plantillas de la tienda repiten estilos en línea e indentación por cada
+tarjeta de producto. `CompresionMiddleware` quita los espacios que no cambian
+la página y comprime HTML/JSON/CSS/JS con Brotli (si está instalado) o gzip,
+según `Accept-Encoding`:
+
+- `COMPRESION_MINIMO` (bytes): por debajo no vale la pena comprimir.
+- `MINIFICAR_HTML`: desactivarlo para depurar el HTML tal cual sale de la plantilla.
+
+Las respuestas en streaming se comprimen bloque a bloque (sin juntarlas en
+memoria); el stream de eventos (`text/event-stream`) se deja sin tocar para
+que cada evento llegue apenas se envía.
+"""
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+TIPOS_COMPRIMIBLES = (
+    'text/html', 'text/plain', 'text/css', 'text/javascript',
+    'application/json', 'application/javascript', 'image/svg+xml',
+)
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 5  # la 11 comprime un poco más pero cuesta decenas de veces más CPU
+
+_re_bloques = re.compile(
+    r'(<(pre|textarea|script)\b.*?</\2\s*>|<style\b.*?</style\s*>|<!--.*?-->|<[^>]+>)',
+    re.IGNORECASE | re.DOTALL,
+)
+_re_espacios = re.compile(r'\s+')
+_re_espacios_tag = re.compile(r'("[^"]*"|\'[^\']*\')|\s+')
+_re_css_comentarios = re.compile(r'/\*.*?\*/', re.DOTALL)
+# No se quitan espacios antes de ':' porque en un selector ('a :hover') cambian el significado
+_re_css_espacios = re.compile(r'\s*([{};,>])\s*|(:)\s+')
+_re_accept_encoding = re.compile(r'\s*([^\s;,]+)\s*(?:;\s*q=([0-9.]+))?')
+
+
+# ----------------------
+# Minificación
+# ----------------------
+def _minificar_css(css):
+    css = _re_css_comentarios.sub('', css)
+    css = _re_espacios.sub(' ', css)
+    return _re_css_espacios.sub(lambda m: m.group(1) or m.group(2), css).replace(';}', '}').strip()
+
+
+def _minificar_etiqueta(etiqueta):
+    # Espacios fuera de las comillas de los atributos
+    etiqueta = _re_espacios_tag.sub(lambda m: m.group(1) or ' ', etiqueta)
+    return etiqueta[:-2] + '>' if etiqueta.endswith(' >') else etiqueta
+
+
+def _minificar_bloque(bloque):
+    bajo = bloque[:9].lower()
+    if bajo.startswith('<!--'):
+        # Se conservan los comentarios condicionales de IE
+        return bloque if bloque.startswith('<!--[if') else ''
+    if bajo.startswith(('<pre', '<textarea', '<script')):
+        return bloque
+    if bajo.startswith('<style'):
+        apertura, _, resto = bloque.partition('>')
+        css, _, cierre = resto.rpartition('</')
+        return f'{_minificar_etiqueta(apertura + ">")}{_minificar_css(css)}</{cierre}'
+    return _minificar_etiqueta(bloque)
+
+
+def minificar_html(html):
+    """Quita espacios y comentarios que no cambian cómo se ve la página.
+
+    Cada tramo de espacios del texto queda en un solo espacio (entre elementos
+    en línea el espacio sí importa). `<pre>`, `<textarea>` y `<script>` no se tocan.
+    """
+    partes = []
+    posicion = 0
+    for m in _re_bloques.finditer(html):
+        texto = html[posicion:m.start()]
+        if texto:
+            partes.append(_re_espacios.sub(' ', texto))
+        partes.append(_minificar_bloque(m.group(0)))
+        posicion = m.end()
+    partes.append(_re_espacios.sub(' ', html[posicion:]))
+    return ''.join(partes).strip()
+
+
+# ----------------------
+# Compresión
+# ----------------------
+def codificaciones_disponibles():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def elegir_codificacion(accept_encoding):
+    """Devuelve 'br', 'gzip' o None según lo que acepta el cliente (respeta q=0)."""
+    aceptadas = {}
+    for m in _re_accept_encoding.finditer(accept_encoding or ''):
+        try:
+            aceptadas[m.group(1).lower()] = float(m.group(2) or 1)
+        except ValueError:
+            continue
+    comodin = aceptadas.get('*', 0)
+    candidatas = [
+        (aceptadas.get(codificacion, comodin), codificacion)
+        for codificacion in codificaciones_disponibles()
+    ]
+    # A igual q, el orden de codificaciones_disponibles() (Brotli primero)
+    q, codificacion = max(candidatas, key=lambda c: c[0])
+    return codificacion if q > 0 else None
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=CALIDAD_BROTLI)
+    compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)  # 31 = formato gzip
+    return compresor.compress(datos) + compresor.flush()
+
+
+def _compresor_streaming(codificacion):
+    """(comprimir_bloque, terminar): cada bloque sale completo, sin esperar al siguiente."""
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=CALIDAD_BROTLI)
+        return (lambda bloque: compresor.process(bloque) + compresor.flush()), compresor.finish
+    compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)
+    return (
+        lambda bloque: compresor.compress(bloque) + compresor.flush(zlib.Z_SYNC_FLUSH),
+        compresor.flush,
+    )
+
+
+def comprimir_secuencia(bloques, codificacion):
+    comprimir_bloque, terminar = _compresor_streaming(codificacion)
+    for bloque in bloques:
+        datos = comprimir_bloque(bloque)
+        if datos:
+            yield datos
+    yield terminar()
+
+
+async def comprimir_secuencia_async(bloques, codificacion):
+    comprimir_bloque, terminar = _compresor_streaming(codificacion)
+    async for bloque in bloques:
+        datos = comprimir_bloque(bloque)
+        if datos:
+            yield datos
+    yield terminar()
+
+
+class CompresionMiddleware:
+    """Minifica el HTML y comprime la respuesta. Va primero en MIDDLEWARE.
+
+    Los tokens CSRF ya salen enmascarados distinto en cada respuesta, lo que
+    evita que se puedan adivinar midiendo el tamaño comprimido (BREACH).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.procesar(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.procesar(request, await self.get_response(request))
+
+    def procesar(self, request, response):
+        tipo = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if (
+            tipo not in TIPOS_COMPRIMIBLES
+            or response.has_header('Content-Encoding')
+            or request.method == 'HEAD'
+        ):
+            return response
+
+        if not response.streaming and tipo == 'text/html' and getattr(settings, 'MINIFICAR_HTML', True):
+            html = minificar_html(response.content.decode(response.charset))
+            response.content = html.encode(response.charset)
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # Aunque esta respuesta no se comprima, la siguiente al mismo URL puede hacerlo
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codificacion = elegir_codificacion(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if codificacion is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = comprimir_secuencia_async(response.streaming_content, codificacion)
+            else:
+                response.streaming_content = comprimir_secuencia(response.streaming_content, codificacion)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < getattr(settings, 'COMPRESION_MINIMO', 860):
+                return response
+            comprimido = comprimir(response.content, codificacion)
+            if len(comprimido) >= len(response.content):
+                return response
+            response.content = comprimido
+            response.headers['Content-Length'] = str(len(comprimido))
+
+        # El contenido cambió: un ETag fuerte ya no lo describe byte a byte
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = codificacion
+        return response
@@ -0,0 +1,272 @@
+"""Datos sintéticos en volumen para reproducir en local problemas de producción.
+
+Todo sale de un `numpy.random.Generator` sembrado: con la misma semilla sobre la
+misma base se generan exactamente las mismas filas (las fechas de los pedidos
+se cuentan hacia atrás desde el momento de la corrida). Los ids se calculan de
+antemano (a partir del máximo actual de cada tabla) para poder enlazar las
+claves foráneas sin leer nada de vuelta.
+
+La popularidad de productos y clientes sigue una ley de Zipf (unos pocos se
+llevan la mayoría de las ventas), y géneros y tipos se reparten con pesos
+parecidos a los de una tienda real.
+
+Catálogo, usuarios y carritos se insertan con `bulk_create` por lotes. Crear
+los `User` así no dispara `post_save`, así que los perfiles `Usuario` se crean
+aparte en otro `bulk_create`. Pedidos y líneas de pedido van con
+`executemany` sobre las columnas del modelo: `bulk_create` pisaría `fecha`
+(`auto_now_add`) con la hora actual, y en SQLite parte cada INSERT en lotes de
+999 parámetros (142 líneas), lo que lleva 1.000.000 de líneas a casi un minuto.
+"""
+from datetime import timezone as dt_timezone
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    Artista, Cart, CartItem, DetallePedido, Pedido, Producto, Usuario,
+)
+from .instantanea import marcar_vencida
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+# Pesos aproximados de una tienda de discos; el orden sigue a GENEROS_CHOICES y TIPO_CHOICES
+PESOS_GENERO = {
+    'pop': 22, 'rock': 16, 'hip-hop': 12, 'electrónica': 7, 'indie': 7,
+    'jazz': 4, 'clásica': 3, 'reggaeton': 11, 'k-pop': 6, 'latino': 12,
+}
+PESOS_TIPO = {'vinilo': 35, 'cd': 50, 'casete': 15}
+# Rango de precio (centavos) por tipo
+PRECIOS_TIPO = {'vinilo': (35000, 120000), 'cd': (15000, 50000), 'casete': (9000, 25000)}
+
+ZIPF_PRODUCTOS = 1.0
+ZIPF_USUARIOS = 0.8
+CLAVE_SINTETICA = 'sintetico-axolotl'
+
+PALABRAS = [
+    'Ajolote', 'Luna', 'Marea', 'Neón', 'Cometa', 'Eco', 'Jardín', 'Volcán', 'Niebla',
+    'Satélite', 'Cristal', 'Desierto', 'Tormenta', 'Colibrí', 'Aurora', 'Laguna',
+    'Fuego', 'Sombra', 'Océano', 'Ciudad', 'Noche', 'Verano', 'Espejo', 'Río',
+]
+ADJETIVOS = [
+    'Eléctricos', 'Dorados', 'Salvajes', 'Lentos', 'Perdidos', 'Azules', 'Nocturnos',
+    'Infinitos', 'Rotos', 'Brillantes', 'Lejanos', 'Tropicales',
+]
+
+
+def _ids_desde(modelo):
+    return (modelo.objects.aggregate(m=Max('pk'))['m'] or 0) + 1
+
+
+def _zipf(rng, n, s):
+    """Pesos acumulados de Zipf repartidos al azar entre los n elementos."""
+    pesos = 1.0 / np.arange(1, n + 1) ** s
+    rng.shuffle(pesos)
+    acumulados = np.cumsum(pesos)
+    return acumulados / acumulados[-1]
+
+
+def _elegir(rng, acumulados, cantidad):
+    # Muestreo por búsqueda binaria: mucho más rápido que rng.choice(p=...) repetido
+    return np.searchsorted(acumulados, rng.random(cantidad), side='right')
+
+
+def _categorias(rng, pesos, cantidad):
+    claves = list(pesos)
+    p = np.array([pesos[c] for c in claves], dtype=float)
+    return [claves[i] for i in rng.choice(len(claves), size=cantidad, p=p / p.sum())]
+
+
+def _nombres(rng, cantidad, plantilla):
+    palabras = rng.integers(0, len(PALABRAS), size=(cantidad, 2)).tolist()
+    adjetivos = rng.integers(0, len(ADJETIVOS), size=cantidad).tolist()
+    return [
+        plantilla.format(a=PALABRAS[p1], b=PALABRAS[p2], adj=ADJETIVOS[j])
+        for (p1, p2), j in zip(palabras, adjetivos)
+    ]
+
+
+def _en_lotes(iterable, lote):
+    iterador = iter(iterable)
+    while True:
+        bloque = list(islice(iterador, lote))
+        if not bloque:
+            return
+        yield bloque
+
+
+def _crear(modelo, objetos, lote):
+    for bloque in _en_lotes(objetos, lote):
+        modelo.objects.bulk_create(bloque)
+
+
+def _insertar(modelo, campos, filas, lote):
+    """INSERT con executemany sobre las columnas de los campos (ids incluidos)."""
+    qn = connection.ops.quote_name
+    columnas = [modelo._meta.get_field(c).column for c in campos]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        qn(modelo._meta.db_table),
+        ', '.join(qn(c) for c in columnas),
+        ', '.join(['%s'] * len(columnas)),
+    )
+    with connection.cursor() as cursor:
+        for bloque in _en_lotes(filas, lote):
+            cursor.executemany(sql, bloque)
+
+
+def _fechas_texto(segundos, hasta):
+    """Segundos antes de `hasta` -> texto 'AAAA-MM-DD HH:MM:SS' en UTC, como lo guarda el ORM."""
+    base = np.datetime64(hasta.astimezone(dt_timezone.utc).replace(tzinfo=None, microsecond=0), 's')
+    texto = np.datetime_as_string(base - segundos.astype('timedelta64[s]'), unit='s')
+    return [t.replace('T', ' ') for t in texto.tolist()]
+
+
+def generar(artistas=500, productos=5000, usuarios=2000, pedidos=20000, lineas_media=2.5,
+            carritos=0.2, dias=730, semilla=1, lote=5000, avisar=None):
+    """Inserta el volumen pedido y devuelve un dict con las filas creadas por tabla.
+
+    `lineas_media` es el promedio de líneas por pedido y `carritos` la fracción de
+    usuarios que queda con un carrito abierto. `avisar(texto)` recibe el avance.
+    """
+    if np is None:
+        raise RuntimeError('El generador de datos necesita numpy (pip install numpy).')
+    if artistas < 1 or productos < 1 or usuarios < 1:
+        raise ValueError('Hacen falta al menos un artista, un producto y un usuario.')
+    avisar = avisar or (lambda texto: None)
+    rng = np.random.default_rng(semilla)
+    ahora = timezone.now()
+    creadas = {}
+
+    with transaction.atomic():
+        # --- Catálogo ---
+        artista_0 = _ids_desde(Artista)
+        nombres = _nombres(rng, artistas, 'Los {adj} de {a}')
+        _crear(Artista, (
+            Artista(id=artista_0 + i, nombre_artista=nombre,
+                    descripcion=f'Artista sintético #{artista_0 + i}.')
+            for i, nombre in enumerate(nombres)
+        ), lote)
+        creadas['artistas'] = artistas
+        avisar(f'Artistas: {artistas}')
+
+        producto_0 = _ids_desde(Producto)
+        # Los artistas también tienen popularidad desigual: unos pocos con discografía larga
+        artista_de = (artista_0 + _elegir(rng, _zipf(rng, artistas, 0.7), productos)).tolist()
+        generos = _categorias(rng, PESOS_GENERO, productos)
+        tipos = _categorias(rng, PESOS_TIPO, productos)
+        rangos = np.array([PRECIOS_TIPO[t] for t in tipos])
+        # Precios terminados en .99, en centavos
+        precios = rng.integers(rangos[:, 0], rangos[:, 1]) // 100 * 100 - 1
+        precio_texto = [f'{c / 100:.2f}' for c in precios.tolist()]
+        stocks = rng.integers(0, 200, size=productos).tolist()
+        novedades = (rng.random(productos) < 0.05).tolist()
+        nombres = _nombres(rng, productos, '{a} {b}')
+        _crear(Producto, (
+            Producto(
+                id=producto_0 + i, artista_id=artista_de[i], nombre_producto=nombres[i],
+                genero=generos[i], tipo=tipos[i], stock=stocks[i], precio=precio_texto[i],
+                novedad=novedades[i], descripcion=f'{nombres[i]}, {generos[i]} en {tipos[i]}.',
+            )
+            for i in range(productos)
+        ), lote)
+        creadas['productos'] = productos
+        # bulk_create no dispara las señales que vencen la instantánea
+        marcar_vencida()
+        avisar(f'Productos: {productos}')
+
+        # --- Usuarios (sin la señal post_save: el perfil se crea aquí) ---
+        user_0 = _ids_desde(User)
+        usuario_0 = _ids_desde(Usuario)
+        clave = make_password(CLAVE_SINTETICA)  # un solo hash para todos
+        _crear(User, (
+            User(id=user_0 + i, username=f'sintetico{user_0 + i}', password=clave,
+                 email=f'sintetico{user_0 + i}@axolotl.test', date_joined=ahora)
+            for i in range(usuarios)
+        ), lote)
+        _crear(Usuario, (
+            Usuario(id=usuario_0 + i, user_id=user_0 + i, nombre=f'sintetico{user_0 + i}',
+                    email=f'sintetico{user_0 + i}@axolotl.test')
+            for i in range(usuarios)
+        ), lote)
+        creadas['usuarios'] = usuarios
+        avisar(f'Usuarios: {usuarios}')
+
+        popularidad = _zipf(rng, productos, ZIPF_PRODUCTOS)
+
+        # --- Carritos abiertos ---
+        con_carrito = np.flatnonzero(rng.random(usuarios) < carritos)
+        cart_0 = _ids_desde(Cart)
+        _crear(Cart, (
+            Cart(id=cart_0 + i, usuario_id=usuario_0 + int(u)) for i, u in enumerate(con_carrito)
+        ), lote)
+        items_por_carrito = 1 + rng.poisson(1.0, size=len(con_carrito))
+        carrito_de = np.repeat(np.arange(len(con_carrito)), items_por_carrito)
+        producto_item = _elegir(rng, popularidad, len(carrito_de))
+        # Un producto aparece una sola vez por carrito
+        _, unicos = np.unique(carrito_de * productos + producto_item, return_index=True)
+        _crear(CartItem, (
+            CartItem(cart_id=cart_0 + int(c), producto_id=producto_0 + int(p),
+                     cantidad=1 + int(n))
+            for c, p, n in zip(carrito_de[unicos], producto_item[unicos],
+                               rng.poisson(0.3, size=len(unicos)))
+        ), lote)
+        creadas['carritos'] = len(con_carrito)
+        creadas['items_carrito'] = len(unicos)
+        avisar(f'Carritos: {len(con_carrito)} ({len(unicos)} ítems)')
+
+        # --- Pedidos y líneas, en orden cronológico para que los ids crezcan con la fecha ---
+        if pedidos:
+            pedido_0 = _ids_desde(Pedido)
+            detalle_0 = _ids_desde(DetallePedido)
+            cliente = usuario_0 + _elegir(rng, _zipf(rng, usuarios, ZIPF_USUARIOS), pedidos)
+            hace = np.sort(rng.integers(0, dias * 86400, size=pedidos))[::-1]
+            fecha_pedido = _fechas_texto(hace, ahora)
+
+            lineas = 1 + rng.poisson(max(lineas_media - 1, 0), size=pedidos)
+            total_lineas = int(lineas.sum())
+            pedido_de = np.repeat(np.arange(pedidos), lineas)
+            producto_linea = _elegir(rng, popularidad, total_lineas)
+            cantidad = rng.geometric(0.7, size=total_lineas)
+            precio_linea = precios[producto_linea]
+            total_linea = precio_linea * cantidad
+
+            unidades = np.bincount(pedido_de, weights=cantidad, minlength=pedidos).astype(np.int64)
+            total_pedido = np.bincount(pedido_de, weights=total_linea, minlength=pedidos)
+
+            _insertar(Pedido, ['id', 'usuario', 'cantidad_producto', 'total', 'fecha'], zip(
+                range(pedido_0, pedido_0 + pedidos), cliente.tolist(), unidades.tolist(),
+                (total_pedido / 100).round(2).tolist(), fecha_pedido,
+            ), lote * 10)
+            avisar(f'Pedidos: {pedidos}')
+
+            _insertar(DetallePedido, [
+                'id', 'pedido', 'usuario', 'producto', 'cantidad_producto', 'precio', 'fecha', 'total',
+            ], zip(
+                range(detalle_0, detalle_0 + total_lineas),
+                (pedido_0 + pedido_de).tolist(),
+                cliente[pedido_de].tolist(),
+                (producto_0 + producto_linea).tolist(),
+                cantidad.tolist(),
+                (precio_linea / 100).tolist(),
+                (fecha_pedido[i] for i in pedido_de.tolist()),
+                (total_linea / 100).tolist(),
+            ), lote * 10)
+            creadas['pedidos'] = pedidos
+            creadas['lineas'] = total_lineas
+            avisar(f'Líneas de pedido: {total_lineas}')
+
+        # Con ids explícitos, las secuencias (PostgreSQL) quedan atrás; en SQLite no hace nada
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Artista, Producto, User, Usuario, Cart, CartItem, Pedido, DetallePedido]
+            ):
+                cursor.execute(sql)
+
+    return creadas
@@ -0,0 +1,128 @@
+"""Lecturas del catálogo en réplicas de solo lectura.
+
+Sólo las vistas de la tienda listadas en `settings.REPLICA_VISTAS` leen de las
+réplicas (`settings.DATABASE_REPLICAS`); todo lo demás, y todas las escrituras,
+van a `default`. Una sesión que ya escribió algo (carrito, checkout, perfil)
+queda pegada a la primaria para no ver datos atrasados de la réplica. Las
+respuestas en streaming (listados.py) siguen leyendo de la réplica mientras se
+envía el cuerpo, que se genera después de que la vista devolvió.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Cookie de sesión del navegador (sin escritura en django_session, así el carrito
+# anónimo sigue sin estado en el servidor).
+COOKIE_PRIMARIA = 'axolotl_primaria'
+
+_leer_de_replica = ContextVar('leer_de_replica', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        # Sesiones, usuarios y permisos siempre desde la primaria.
+        if replicas and model._meta.app_label == 'app_Axolotl' and _leer_de_replica.get():
+            return random.choice(replicas)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y primaria tienen los mismos datos.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas se copian de la primaria (python manage.py sincronizar_replicas).
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    # Soporta vistas async (p. ej. el stream de eventos) sin obligar a Django a
+    # pasar cada conexión por un hilo.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _leer_de_replica.set(False)
+        try:
+            response = self.get_response(request)
+            replica = _leer_de_replica.get()
+        finally:
+            _leer_de_replica.reset(token)
+        return self._fijar_primaria(request, self._cuerpo_en_replica(response, replica))
+
+    async def __acall__(self, request):
+        token = _leer_de_replica.set(False)
+        try:
+            response = await self.get_response(request)
+            replica = _leer_de_replica.get()
+        finally:
+            _leer_de_replica.reset(token)
+        return self._fijar_primaria(request, self._cuerpo_en_replica(response, replica))
+
+    def _cuerpo_en_replica(self, response, replica):
+        # El servidor consume el cuerpo fuera de este contexto: cada parte se
+        # genera con la marca puesta para que sus consultas vayan a la réplica.
+        if replica and response.streaming:
+            if response.is_async:
+                response.streaming_content = _partes_async(response.streaming_content)
+            else:
+                response.streaming_content = _partes(response.streaming_content)
+        return response
+
+    def _fijar_primaria(self, request, response):
+        if (
+            getattr(settings, 'DATABASE_REPLICAS', [])
+            and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and COOKIE_PRIMARIA not in request.COOKIES
+        ):
+            response.set_cookie(COOKIE_PRIMARIA, '1', httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if (
+            match is not None
+            and match.url_name in getattr(settings, 'REPLICA_VISTAS', ())
+            and request.method in ('GET', 'HEAD')
+            and COOKIE_PRIMARIA not in request.COOKIES
+        ):
+            _leer_de_replica.set(True)
+        return None
+
+
+def _partes(contenido):
+    iterador = iter(contenido)
+    while True:
+        token = _leer_de_replica.set(True)
+        try:
+            parte = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _leer_de_replica.reset(token)
+        yield parte
+
+
+async def _partes_async(contenido):
+    iterador = aiter(contenido)
+    while True:
+        token = _leer_de_replica.set(True)
+        try:
+            parte = await anext(iterador)
+        except StopAsyncIteration:
+            return
+        finally:
+            _leer_de_replica.reset(token)
+        yield parte
@@ -0,0 +1,112 @@
+"""Escritor único para las escrituras de la tienda (checkout y carrito).
+
+SQLite admite un solo escritor a la vez: con muchos compradores simultáneos
+cada request espera el lock por su cuenta y, al vencer el `timeout`, termina
+en "database is locked" y un error 500. Con `ESCRITOR_UNICO = True` las vistas
+no escriben: encolan un trabajo (una función sin acceso al request) y un solo
+hilo del proceso los ejecuta en transacciones de grupo, de hasta
+`ESCRITOR_LOTE` trabajos, devolviendo a cada request su resultado o su
+excepción. Los pedidos esperan en la cola en lugar de pelear por el lock.
+
+Cada trabajo corre en su propio savepoint: si uno falla (p. ej.
+`StockInsuficiente`) sólo se deshace ese, el resto del grupo se confirma.
+
+Con `ESCRITOR_UNICO = False` (por defecto) `ejecutar` corre el trabajo en el
+hilo del request dentro de `transaction.atomic()`, igual que antes.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class EscritorUnico:
+    def __init__(self, lote=20, cola_max=1000):
+        self.lote = lote
+        self._cola = queue.Queue(maxsize=cola_max)
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='escritor-unico', daemon=True)
+                self._hilo.start()
+
+    def enviar(self, trabajo, *args, **kwargs):
+        """Encola `trabajo(*args, **kwargs)` y devuelve un Future con su resultado."""
+        self._iniciar()
+        futuro = Future()
+        # Con la cola llena el request espera acá (contrapresión) en lugar de fallar
+        self._cola.put((futuro, trabajo, args, kwargs))
+        return futuro
+
+    def _tomar_grupo(self):
+        grupo = [self._cola.get()]
+        while len(grupo) < self.lote:
+            try:
+                grupo.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return grupo
+
+    def _bucle(self):
+        while True:
+            grupo = self._tomar_grupo()
+            close_old_connections()
+            try:
+                self._ejecutar_grupo(grupo)
+            except Exception:  # pragma: no cover - el hilo no debe morir
+                logger.exception('Error inesperado en el escritor único')
+
+    def _ejecutar_grupo(self, grupo):
+        resultados = []
+        try:
+            with transaction.atomic():
+                for futuro, trabajo, args, kwargs in grupo:
+                    if not futuro.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        with transaction.atomic():
+                            resultados.append((futuro, True, trabajo(*args, **kwargs)))
+                    except Exception as e:
+                        resultados.append((futuro, False, e))
+        except Exception as e:
+            # Falló el COMMIT del grupo: no se guardó nada, todos reciben el error
+            for futuro, _, _ in resultados:
+                futuro.set_exception(e)
+            return
+        # Recién después del COMMIT cada request sabe que su pedido quedó guardado
+        for futuro, ok, valor in resultados:
+            if ok:
+                futuro.set_result(valor)
+            else:
+                futuro.set_exception(valor)
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+
+def escritor():
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None:
+            _escritor = EscritorUnico(lote=getattr(settings, 'ESCRITOR_LOTE', 20))
+        return _escritor
+
+
+def ejecutar(trabajo, *args, **kwargs):
+    """Ejecuta un trabajo de escritura y devuelve su resultado (o levanta su excepción).
+
+    El trabajo no debe usar el request ni la sesión: sólo datos y modelos.
+    """
+    if not getattr(settings, 'ESCRITOR_UNICO', False):
+        with transaction.atomic():
+            return trabajo(*args, **kwargs)
+    return escritor().enviar(trabajo, *args, **kwargs).result()
@@ -0,0 +1,216 @@
+"""Exportación del catálogo público a HTML estático.
+
+Las páginas de la tienda que sólo leen el catálogo se renderizan como las vería
+un visitante sin sesión y se escriben en `settings.EXPORTACION_ESTATICA_ROOT`,
+para que nginx las sirva sin pasar por Django (ver OPTIMIZACION.md).
+
+Cada página se identifica con una clave ('catalogo', 'genero:pop',
+'artista:3', ...). Los cambios en `Producto`/`Artista` y los movimientos del
+libro de stock (las tarjetas muestran el disponible) anotan las claves
+afectadas en un archivo de pendientes y `python manage.py exportar_estaticos`
+sólo vuelve a generar esas.
+
+El token CSRF y el contador del carrito no pueden ir en el HTML compartido: el
+script `estatico.js` los pide a `estado_visitante` al cargar la página.
+"""
+import os
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from django.http import Http404
+from django.templatetags.static import static
+from django.urls import resolve, reverse
+
+from .compresion import comprimir, minificar_html
+from .models import Artista, Producto
+
+ARCHIVO_PENDIENTES = '.pendientes'
+SCRIPT_VISITANTE = '<script src="{src}" data-url="{url}" defer></script>'
+
+
+def directorio():
+    return Path(getattr(settings, 'EXPORTACION_ESTATICA_ROOT', settings.BASE_DIR / 'estatico'))
+
+
+def exportacion_activa():
+    """Hay algo que mantener al día sólo después de la primera exportación."""
+    return directorio().is_dir()
+
+
+# ----------------------
+# Páginas
+# ----------------------
+def pagina(clave):
+    """Devuelve (url, archivo relativo) de la página `clave`."""
+    tipo, _, valor = clave.partition(':')
+    if tipo in ('catalogo', 'lista', 'novedades'):
+        return reverse(f'{tipo}_frontend'), f'{tipo}/index.html'
+    if tipo in ('genero', 'tipo'):
+        url = reverse(f'{tipo}_frontend')
+        if not valor:
+            return url, f'{tipo}/index.html'
+        return f'{url}?{urlencode({tipo: valor})}', f'{tipo}/{quote(valor, safe="")}.html'
+    if tipo == 'comprar':
+        return reverse('comprar_artista', args=[int(valor)]), f'comprar/{valor}/index.html'
+    if tipo == 'artista':
+        return reverse('artista_detalle', args=[int(valor)]), f'artista/{valor}/index.html'
+    raise ValueError(f'Página desconocida: {clave}')
+
+
+def todas_las_paginas():
+    claves = {'catalogo', 'lista', 'novedades', 'genero:', 'tipo:'}
+    claves.update(f'genero:{g}' for g, _ in Producto.GENEROS_CHOICES)
+    claves.update(f'tipo:{t}' for t, _ in Producto.TIPO_CHOICES)
+    for artista_id in Artista.objects.values_list('id', flat=True):
+        claves.add(f'artista:{artista_id}')
+        claves.add(f'comprar:{artista_id}')
+    return claves
+
+
+def paginas_de_producto(genero, tipo, artista_id):
+    return {
+        'catalogo', 'novedades', 'genero:', 'tipo:',
+        f'genero:{genero}', f'tipo:{tipo}', f'artista:{artista_id}', f'comprar:{artista_id}',
+    }
+
+
+def paginas_de_productos(productos):
+    """Claves afectadas por un queryset de productos (para cambios con update()/delete())."""
+    claves = set()
+    for fila in productos.values_list('genero', 'tipo', 'artista_id').distinct():
+        claves |= paginas_de_producto(*fila)
+    return claves
+
+
+# ----------------------
+# Pendientes
+# ----------------------
+def marcar_pendientes(claves):
+    """Anota páginas para regenerar. Es un append de pocas líneas, sin tocar la BD.
+
+    No hace nada hasta que se exportó por primera vez.
+    """
+    if not claves or not exportacion_activa():
+        return
+    with open(directorio() / ARCHIVO_PENDIENTES, 'a', encoding='utf-8') as f:
+        f.write(''.join(f'{clave}\n' for clave in claves))
+
+
+def stock_cambiado(producto_ids):
+    """Marca las páginas de `producto_ids` cuando se confirme un movimiento de stock.
+
+    Una venta o un ajuste cambia el disponible sin guardar `Producto`, así que
+    no pasa por las señales de abajo.
+    """
+    if not exportacion_activa():
+        return
+    producto_ids = list(producto_ids)
+    transaction.on_commit(
+        lambda: marcar_pendientes(paginas_de_productos(Producto.objects.filter(id__in=producto_ids)))
+    )
+
+
+def tomar_pendientes():
+    """Devuelve y vacía las claves pendientes."""
+    ruta = directorio() / ARCHIVO_PENDIENTES
+    procesando = ruta.with_suffix('.procesando')
+    try:
+        # Renombrar primero: lo que se marque mientras tanto va a un archivo nuevo
+        os.replace(ruta, procesando)
+    except FileNotFoundError:
+        return set()
+    with open(procesando, encoding='utf-8') as f:
+        claves = {linea.strip() for linea in f if linea.strip()}
+    procesando.unlink()
+    return claves
+
+
+def _paginas_guardadas(producto):
+    return (producto.__dict__.get('genero'), producto.__dict__.get('tipo'), producto.__dict__.get('artista_id'))
+
+
+# Recordar género/tipo/artista al cargar: si cambian hay que regenerar también las páginas viejas
+@receiver(post_init, sender=Producto)
+def recordar_paginas_producto(sender, instance, **kwargs):
+    instance._paginas_estaticas = _paginas_guardadas(instance)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def producto_cambiado(sender, instance, **kwargs):
+    if not exportacion_activa():
+        return
+    claves = set()
+    for genero, tipo, artista_id in {instance._paginas_estaticas, _paginas_guardadas(instance)}:
+        if artista_id is not None:
+            claves |= paginas_de_producto(genero, tipo, artista_id)
+    marcar_pendientes(claves)
+    instance._paginas_estaticas = _paginas_guardadas(instance)
+
+
+@receiver(post_save, sender=Artista)
+@receiver(post_delete, sender=Artista)
+def artista_cambiado(sender, instance, **kwargs):
+    marcar_pendientes({'lista', 'catalogo', f'artista:{instance.id}', f'comprar:{instance.id}'})
+
+
+# ----------------------
+# Render
+# ----------------------
+def _request_anonimo(url):
+    from django.test import RequestFactory
+
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    request.session = {}
+    request._messages = FallbackStorage(request)
+    return request
+
+
+def renderizar(clave):
+    """Renderiza una página y la escribe en disco. Devuelve (clave, estado)."""
+    url, relativo = pagina(clave)
+    archivo = directorio() / relativo
+    request = _request_anonimo(url)
+    match = resolve(request.path_info)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        response = None
+    if response is None or response.status_code != 200:
+        # La página ya no existe (artista borrado, etc.): que la sirva Django
+        archivo.unlink(missing_ok=True)
+        archivo.with_name(f'{archivo.name}.gz').unlink(missing_ok=True)
+        return clave, 'borrada'
+
+    contenido = b''.join(response) if response.streaming else response.content
+    html = contenido.decode(response.charset)
+    script = SCRIPT_VISITANTE.format(src=static('estatico.js'), url=reverse('estado_visitante'))
+    html = minificar_html(html.replace('</body>', f'{script}</body>', 1))
+
+    archivo.parent.mkdir(parents=True, exist_ok=True)
+    contenido = html.encode('utf-8')
+    copias = [
+        # Comprimida al lado para `gzip_static on;` en nginx
+        (archivo.with_name(f'{archivo.name}.gz'), comprimir(contenido, 'gzip')),
+        (archivo, contenido),
+    ]
+    for destino, datos in copias:
+        temporal = destino.with_name(f'.{destino.name}.tmp')
+        temporal.write_bytes(datos)
+        os.replace(temporal, destino)  # nginx nunca ve un archivo a medio escribir
+    return clave, 'ok'
+
+
+def iniciar_proceso():
+    """Inicializador de los procesos hijos (necesario con 'spawn', p. ej. en Windows)."""
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_AxolotlMusic.settings')
+    django.setup()
@@ -0,0 +1,301 @@
+"""Prueba de estrés del checkout: muchos compradores a la vez sobre un producto con poco stock.
+
+Cada comprador usa su propio `Client` de pruebas contra las vistas reales
+(`add_to_cart` y `crear_pedido_publico`, con middleware incluido) y la
+concurrencia es real: `procesos` procesos con `hilos` hilos cada uno, o sólo
+hilos con `procesos=0`. Los datos (un artista, el producto y los compradores)
+se crean con una etiqueta propia en la base configurada y se borran al final.
+
+Hay tres recorridos por comprador:
+    carrito   con sesión: agrega al carrito (Cart en BD) y paga el carrito
+    directo   con sesión y carrito vacío: compra de un producto (`producto_id`)
+    invitado  sin sesión: carrito en la cookie y pago con un email nuevo
+
+Al terminar se comprueba que no se vendió de más: unidades vendidas contra el
+stock inicial, disponible negativo, disponible que no cuadra con lo vendido, y
+`Producto.stock` después de compactar el libro (un recorte tipo `max(0, ...)`
+o el CHECK de `PositiveIntegerField` aparecen ahí).
+"""
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, connections
+from django.db.models import Sum
+from django.test import Client, override_settings
+
+from .models import Artista, CartItem, DetallePedido, Producto, Usuario
+from .stock import compactar_movimientos, stock_disponible
+
+MODOS = ('carrito', 'directo', 'invitado')
+# Loggers que durante la prueba sólo repetirían lo que ya cuenta el resumen
+SILENCIADOS = ('django.request', 'app_Axolotl.registro_sql')
+DOMINIO = 'estres.local'
+
+# Resultados de cada operación
+OK = 'ok'
+SIN_STOCK = 'sin_stock'
+BLOQUEO = 'bloqueo'
+ERROR = 'error'
+
+
+def _es_bloqueo(exc):
+    return isinstance(exc, OperationalError) and 'locked' in str(exc)
+
+
+class _ContarBloqueos(logging.Handler):
+    """Anota por hilo los "database is locked" que las vistas registran y se tragan.
+
+    El test client corre la vista en el mismo hilo que hace el POST, así que el
+    hilo sirve para saber a qué respuesta pertenece el error.
+    """
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.hilos = set()
+
+    def emit(self, record):
+        if record.exc_info and _es_bloqueo(record.exc_info[1]):
+            self.hilos.add(threading.get_ident())
+
+    def tomar(self):
+        try:
+            self.hilos.remove(threading.get_ident())
+            return True
+        except KeyError:
+            return False
+
+
+def preparar(etiqueta, stock, compradores, modos):
+    """Crea el producto y los compradores; devuelve (producto_id, tareas)."""
+    artista = Artista.objects.create(nombre_artista=f'Estrés {etiqueta}', descripcion='Prueba de estrés.')
+    producto = Producto.objects.create(
+        artista=artista, nombre_producto=f'Estrés {etiqueta}', genero='rock', tipo='vinilo',
+        descripcion='Prueba de estrés.', stock=stock, precio='100.00',
+    )
+    tareas = []
+    for i in range(compradores):
+        nombre = f'{etiqueta}_{i}'
+        tareas.append({'modo': modos[i % len(modos)], 'username': nombre, 'email': f'{nombre}@{DOMINIO}'})
+
+    # Los compradores con sesión se crean en bloque; bulk_create no dispara post_save
+    con_sesion = [t for t in tareas if t['modo'] != 'invitado']
+    sin_clave = make_password(None)
+    users = User.objects.bulk_create([
+        User(username=t['username'], email=t['email'], password=sin_clave) for t in con_sesion
+    ])
+    Usuario.objects.bulk_create([
+        Usuario(user_id=user.id, nombre=user.username, email=user.email) for user in users
+    ])
+    return producto.id, tareas
+
+
+def _post(client, url, datos):
+    inicio = time.perf_counter()
+    respuesta = client.post(url, datos)
+    return respuesta, time.perf_counter() - inicio
+
+
+def _clasificar(respuesta, conteo):
+    """OK / SIN_STOCK / BLOQUEO / ERROR a partir de la respuesta de la vista."""
+    if respuesta.status_code >= 500:
+        exc_info = getattr(respuesta, 'exc_info', None)
+        return BLOQUEO if exc_info and _es_bloqueo(exc_info[1]) else ERROR
+    if conteo.tomar():
+        return BLOQUEO
+    # Sólo los mensajes de este request, no los que venían en la cookie del anterior
+    textos = [str(m) for m in getattr(respuesta.wsgi_request._messages, '_queued_messages', [])]
+    if any('Error' in t for t in textos):
+        return ERROR
+    if 'gracias' in respuesta.get('Location', '') or any('agregado' in t for t in textos):
+        return OK
+    return SIN_STOCK
+
+
+def _iniciar_sesion(tarea):
+    client = Client(raise_request_exception=False)
+    if tarea['modo'] != 'invitado':
+        client.force_login(User.objects.get(username=tarea['username']))
+    return client
+
+
+def _comprar(client, tarea, producto_id, cantidad, conteo, medidas):
+    """Recorre el checkout de un comprador agregando (operación, resultado, segundos) a `medidas`."""
+    checkout = {'nombre': tarea['username'], 'email': tarea['email'], 'direccion': 'Calle 1', 'metodo': 'tarjeta'}
+    if tarea['modo'] == 'directo':
+        checkout.update(producto_id=producto_id, cantidad=cantidad)
+    else:
+        respuesta, segundos = _post(client, f'/cart/add/{producto_id}/', {'cantidad': cantidad, 'next': '/cart/'})
+        resultado = _clasificar(respuesta, conteo)
+        medidas.append(('carrito', resultado, segundos))
+        if resultado != OK:
+            return
+
+    respuesta, segundos = _post(client, '/crear_pedido_publico/', checkout)
+    medidas.append(('checkout', _clasificar(respuesta, conteo), segundos))
+
+
+def correr_hilos(tareas, producto_id, cantidad, hilos, ajustes, timeout_bd=None):
+    """Corre las tareas en `hilos` hilos del proceso actual; devuelve (medidas, segundos)."""
+    if timeout_bd is not None:
+        # Vale para las conexiones que abran los hilos desde ahora
+        connections.settings[DEFAULT_DB_ALIAS].setdefault('OPTIONS', {})['timeout'] = timeout_bd
+    conteo = _ContarBloqueos()
+    logger = logging.getLogger('app_Axolotl.views')
+    logger.addHandler(conteo)
+    # Los errores se cuentan en el resumen; sin esto cada uno imprime su traceback
+    logger.propagate = False
+    for nombre in SILENCIADOS:
+        logging.getLogger(nombre).disabled = True
+    hilos = max(1, min(hilos, len(tareas)))
+    # Todos los hilos arrancan a la vez para que el primer golpe sea simultáneo;
+    # el tiempo se mide desde ahí hasta la última compra (sin logins ni logouts)
+    marcas = {'fin': []}
+    salida = threading.Barrier(hilos, action=lambda: marcas.update(inicio=time.perf_counter()))
+
+    def sesion(medidas, funcion, *args):
+        # Login y logout no se miden, pero si fallan se cuentan
+        try:
+            return funcion(*args)
+        except Exception as e:
+            medidas.append(('sesion', BLOQUEO if _es_bloqueo(e) else ERROR, 0.0))
+            return None
+
+    def trabajador(parte):
+        medidas = []
+        try:
+            clientes = [(sesion(medidas, _iniciar_sesion, tarea), tarea) for tarea in parte]
+            salida.wait()
+            for client, tarea in clientes:
+                if client is not None:
+                    _comprar(client, tarea, producto_id, cantidad, conteo, medidas)
+            marcas['fin'].append(time.perf_counter())
+            for client, _ in clientes:
+                if client is not None:
+                    sesion(medidas, client.logout)  # borra la sesión de la base
+            return medidas
+        finally:
+            connections.close_all()
+
+    try:
+        with override_settings(**ajustes), ThreadPoolExecutor(max_workers=hilos) as pool:
+            futuros = [pool.submit(trabajador, tareas[i::hilos]) for i in range(hilos)]
+            medidas = [m for futuro in futuros for m in futuro.result()]
+    finally:
+        logger.removeHandler(conteo)
+        logger.propagate = True
+        for nombre in SILENCIADOS:
+            logging.getLogger(nombre).disabled = False
+    return medidas, max(marcas['fin']) - marcas['inicio']
+
+
+def _proceso(*args):
+    # Con el arranque 'spawn' (Windows, macOS) el proceso hijo empieza sin Django
+    import django
+    django.setup()
+    return correr_hilos(*args)
+
+
+def correr(tareas, producto_id, cantidad=1, hilos=8, procesos=0, ajustes=None, timeout_bd=None):
+    """Corre todos los compradores y devuelve (medidas, segundos de reloj).
+
+    Los segundos no incluyen el arranque de los procesos ni los logins: son los
+    del proceso que más tardó desde que sus hilos empezaron a comprar.
+
+    `ajustes` se aplican con `override_settings` en cada proceso (p. ej.
+    `ESCRITOR_UNICO`); `timeout_bd` cambia cuánto espera SQLite el lock.
+    """
+    ajustes = {'ALLOWED_HOSTS': ['testserver'], **(ajustes or {})}
+    if not procesos:
+        return correr_hilos(tareas, producto_id, cantidad, hilos, ajustes, timeout_bd)
+
+    # Las conexiones abiertas no deben heredarse en los procesos hijos
+    connections.close_all()
+    partes = [tareas[i::procesos] for i in range(procesos)]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = [
+            pool.submit(_proceso, parte, producto_id, cantidad, hilos, ajustes, timeout_bd)
+            for parte in partes if parte
+        ]
+        resultados = [futuro.result() for futuro in futuros]
+    return [m for medidas, _ in resultados for m in medidas], max(s for _, s in resultados)
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+
+def resumir(medidas, segundos):
+    """Por operación: conteo de resultados, latencias y operaciones por segundo."""
+    por_operacion = defaultdict(list)
+    for operacion, resultado, duracion in medidas:
+        por_operacion[operacion].append((resultado, duracion))
+    resumen = {}
+    for operacion, filas in por_operacion.items():
+        latencias = sorted(d for _, d in filas)
+        resumen[operacion] = {
+            'resultados': Counter(r for r, _ in filas),
+            'por_segundo': len(filas) / segundos if segundos else 0.0,
+            **{f'p{p}': percentil(latencias, p) for p in (50, 95, 99)},
+            'max': latencias[-1],
+        }
+    return resumen
+
+
+def verificar(producto_id, stock_inicial, pedidos_ok):
+    """Busca sobreventas; devuelve (datos, problemas), con `problemas` vacío si todo cuadra."""
+    lineas = DetallePedido.objects.filter(producto_id=producto_id)
+    vendidas = lineas.aggregate(u=Sum('cantidad_producto'))['u'] or 0
+    datos = {
+        'stock_inicial': stock_inicial,
+        'vendidas': vendidas,
+        'pedidos_bd': lineas.count(),
+        'pedidos_ok': pedidos_ok,
+        'disponible': stock_disponible([producto_id]).get(producto_id, 0),
+        'max_en_carrito': max(
+            CartItem.objects.filter(producto_id=producto_id).values_list('cantidad', flat=True), default=0,
+        ),
+    }
+    problemas = []
+    if vendidas > stock_inicial:
+        problemas.append(f'Sobreventa: {vendidas} unidades vendidas con stock {stock_inicial}.')
+    if datos['disponible'] < 0:
+        problemas.append(f'Stock disponible negativo: {datos["disponible"]}.')
+    if datos['disponible'] != stock_inicial - vendidas:
+        problemas.append(
+            f'El disponible ({datos["disponible"]}) no cuadra con lo vendido '
+            f'({stock_inicial} - {vendidas}): hay ventas sin movimiento o movimientos sin venta.'
+        )
+    if datos['pedidos_bd'] != pedidos_ok:
+        problemas.append(
+            f'Pedidos en la base ({datos["pedidos_bd"]}) distintos de los confirmados al comprador ({pedidos_ok}).'
+        )
+    if datos['max_en_carrito'] > stock_inicial:
+        problemas.append(f'Un carrito quedó con {datos["max_en_carrito"]} unidades, más que el stock.')
+
+    # Al compactar, un disponible negativo no entra en el PositiveIntegerField o se recortaría a 0
+    try:
+        compactar_movimientos([producto_id])
+        datos['stock_compactado'] = Producto.objects.values_list('stock', flat=True).get(id=producto_id)
+        if datos['stock_compactado'] != stock_inicial - vendidas:
+            problemas.append(
+                f'Producto.stock quedó en {datos["stock_compactado"]} al compactar '
+                f'(debería ser {stock_inicial - vendidas}): el stock se recortó.'
+            )
+    except IntegrityError as e:
+        datos['stock_compactado'] = None
+        problemas.append(f'No se pudo compactar el stock (quedaría negativo): {e}')
+    return datos, problemas
+
+
+def limpiar(etiqueta):
+    """Borra lo creado por la prueba (pedidos y movimientos caen en cascada)."""
+    User.objects.filter(username__startswith=f'{etiqueta}_').delete()
+    Usuario.objects.filter(email__startswith=f'{etiqueta}_', email__endswith=f'@{DOMINIO}').delete()
+    Artista.objects.filter(nombre_artista=f'Estrés {etiqueta}').delete()
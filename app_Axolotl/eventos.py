@@ -0,0 +1,125 @@
+"""Cambios de stock y precio en vivo (Server-Sent Events).
+
+`comprar.html` y `cart.html` abren un `EventSource` a `eventos_stock` con los ids
+de los productos que muestran. Cada conexión es una cola de asyncio registrada
+en el difusor del proceso, así que un worker ASGI mantiene miles de conexiones
+sin un hilo por cliente.
+
+El difusor se alimenta desde el guardado de `Producto` y desde el libro de
+stock (ventas, ajustes), siempre después de confirmar la transacción. Es un
+difusor en memoria: sólo ve los cambios hechos en el mismo proceso, por eso la
+tienda se sirve con un solo worker ASGI (ver OPTIMIZACION.md).
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Producto
+
+LATIDO_SEGUNDOS = 20
+MAX_PRODUCTOS = 200
+
+
+class Difusor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = {}  # cola -> (loop, ids)
+
+    def suscribir(self, producto_ids):
+        cola = asyncio.Queue(maxsize=100)
+        with self._lock:
+            self._suscripciones[cola] = (asyncio.get_running_loop(), frozenset(producto_ids))
+        return cola
+
+    def cancelar(self, cola):
+        with self._lock:
+            self._suscripciones.pop(cola, None)
+
+    def interesados(self, producto_ids):
+        """Ids de `producto_ids` que alguna conexión está mirando."""
+        with self._lock:
+            suscripciones = list(self._suscripciones.values())
+        mirados = set()
+        for _, ids in suscripciones:
+            mirados |= ids
+        return mirados.intersection(producto_ids)
+
+    def publicar(self, eventos):
+        """Entrega `eventos` ({'id': ..., ...}) a las conexiones interesadas.
+
+        Se puede llamar desde cualquier hilo: cada entrega se agenda en el loop
+        de su conexión.
+        """
+        with self._lock:
+            suscripciones = list(self._suscripciones.items())
+        for cola, (loop, ids) in suscripciones:
+            for evento in eventos:
+                if evento['id'] in ids:
+                    loop.call_soon_threadsafe(self._entregar, cola, evento)
+
+    @staticmethod
+    def _entregar(cola, evento):
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta; cada evento trae el estado completo del producto
+            pass
+
+
+difusor = Difusor()
+
+
+def estado_productos(producto_ids):
+    from .stock import anotar_stock_disponible
+
+    productos = anotar_stock_disponible(Producto.objects.filter(id__in=producto_ids))
+    return [
+        {'id': producto_id, 'precio': str(precio), 'stock': disponible}
+        for producto_id, precio, disponible in productos.values_list('id', 'precio', 'stock_disponible')
+    ]
+
+
+def _publicar(producto_ids):
+    interesados = difusor.interesados(producto_ids)
+    if interesados:
+        difusor.publicar(estado_productos(interesados))
+
+
+def notificar_productos(producto_ids):
+    """Publica stock y precio de `producto_ids` al confirmarse la transacción actual.
+
+    Sin conexiones abiertas para esos productos no hace ninguna consulta.
+    """
+    producto_ids = list(producto_ids)
+    transaction.on_commit(lambda: _publicar(producto_ids))
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, **kwargs):
+    notificar_productos([instance.id])
+
+
+def _evento(datos):
+    return f'data: {json.dumps(datos)}\n\n'
+
+
+async def flujo_eventos(producto_ids):
+    """Generador SSE: estado inicial y después cada cambio, con latidos para proxies."""
+    cola = difusor.suscribir(producto_ids)
+    try:
+        for datos in await sync_to_async(estado_productos)(producto_ids):
+            yield _evento(datos)
+        while True:
+            try:
+                datos = await asyncio.wait_for(cola.get(), LATIDO_SEGUNDOS)
+            except asyncio.TimeoutError:
+                yield ': latido\n\n'
+                continue
+            yield _evento(datos)
+    finally:
+        difusor.cancelar(cola)
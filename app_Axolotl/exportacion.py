@@ -0,0 +1,344 @@
+"""Exportación columnar de ventas y catálogo para análisis fuera de línea.
+
+Las consultas pesadas de los analistas sobre `db.sqlite3` retienen el lock de
+lectura y frenan el checkout. `python manage.py exportar_columnas` copia
+`Pedido`, `DetallePedido` (con sus archivos), `Producto` y `Artista` a
+`EXPORTACION_COLUMNAR_ROOT`, una columna por campo:
+
+- Pedidos y líneas de pedido van en una partición por mes (UTC), leída con una
+  consulta corta por mes y tabla (de una réplica si hay). Un mes que ya terminó
+  se escribe una sola vez; el mes en curso se vuelve a escribir en cada corrida
+  hasta que termina. `--todo` reescribe todo (p. ej. tras corregir pedidos viejos).
+- Productos y artistas son una sola partición ('actual') que se reescribe cuando
+  cambia su firma (filas y último `actualizado`).
+
+Con pyarrow instalado se escribe Parquet comprimido con zstd. Si no, `.npz` de
+NumPy sin comprimir: un miembro comprimido del zip no se puede mapear en
+memoria. `manifiesto.json` lleva las particiones escritas y si están completas.
+
+Para analizar, sin tocar la base:
+
+    from app_Axolotl.exportacion import cargar, particiones
+    detalles = cargar('detalles', desde='2024-01', hasta='2024-06', columnas=['producto_id', 'total'])
+    for mes, pedidos in particiones('pedidos'):  # sin copiar: arreglos mapeados
+        ...
+
+NumPy es obligatorio para este módulo (como en analitica.py); pyarrow, opcional.
+"""
+import json
+import os
+import struct
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import CharField, Count, F, FloatField, Max, Min, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import (
+    Artista, DetallePedido, DetallePedidoArchivado, Pedido, PedidoArchivado, Producto,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = pq = None
+
+MANIFIESTO = 'manifiesto.json'
+PARTICION_FIJA = 'actual'
+# Un pedido que se está guardando justo al cambiar de mes todavía puede aparecer
+MARGEN_CIERRE = timedelta(minutes=5)
+# Fecha como texto 'AAAA-MM-DD HH:MM:SS[.ffffff]': NumPy la convierte de una vez
+FECHA = ('U26', 'datetime64[us]')
+
+
+def _fecha(campo):
+    return Cast(campo, CharField())
+
+
+def _decimal(campo):
+    return Cast(campo, FloatField())
+
+
+def _texto(modelo, campo):
+    return f'U{modelo._meta.get_field(campo).max_length}'
+
+
+# (nombre, campo o expresión, dtype)
+COLUMNAS_PEDIDOS = [
+    ('id', 'id', 'i8'),
+    ('usuario_id', 'usuario_id', 'i8'),
+    ('cantidad_producto', 'cantidad_producto', 'i8'),
+    ('total', _decimal('total'), 'f8'),
+    ('fecha', _fecha('fecha'), FECHA),
+]
+COLUMNAS_DETALLES = [
+    ('id', 'id', 'i8'),
+    ('pedido_id', 'pedido_id', 'i8'),
+    ('usuario_id', 'usuario_id', 'i8'),
+    # En el archivo el producto puede haberse borrado: -1
+    ('producto_id', Coalesce(F('producto_id'), Value(-1)), 'i8'),
+    ('cantidad_producto', 'cantidad_producto', 'i8'),
+    ('precio', _decimal('precio'), 'f8'),
+    ('total', _decimal('total'), 'f8'),
+    ('fecha', _fecha('fecha'), FECHA),
+]
+COLUMNAS_PRODUCTOS = [
+    ('id', 'id', 'i8'),
+    ('artista_id', 'artista_id', 'i8'),
+    ('nombre_producto', 'nombre_producto', _texto(Producto, 'nombre_producto')),
+    ('genero', 'genero', _texto(Producto, 'genero')),
+    ('tipo', 'tipo', _texto(Producto, 'tipo')),
+    ('precio', _decimal('precio'), 'f8'),
+    ('stock', 'stock', 'i8'),
+    ('novedad', 'novedad', '?'),
+    ('actualizado', _fecha('actualizado'), FECHA),
+]
+COLUMNAS_ARTISTAS = [
+    ('id', 'id', 'i8'),
+    ('nombre_artista', 'nombre_artista', _texto(Artista, 'nombre_artista')),
+    ('actualizado', _fecha('actualizado'), FECHA),
+]
+
+# tabla: ([(modelo, archivado)], columnas)
+TABLAS_MENSUALES = {
+    'pedidos': ([(Pedido, False), (PedidoArchivado, True)], COLUMNAS_PEDIDOS),
+    'detalles': ([(DetallePedido, False), (DetallePedidoArchivado, True)], COLUMNAS_DETALLES),
+}
+TABLAS_FIJAS = {
+    'productos': (Producto, COLUMNAS_PRODUCTOS),
+    'artistas': (Artista, COLUMNAS_ARTISTAS),
+}
+
+
+def directorio():
+    return Path(getattr(settings, 'EXPORTACION_COLUMNAR_ROOT', settings.BASE_DIR / 'columnar'))
+
+
+def formato_disponible():
+    return 'parquet' if pq is not None else 'npz'
+
+
+def alias_lectura():
+    """Una réplica si hay (ver db_router.py): la exportación no debe competir con la tienda."""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+    return replicas[0] if replicas else 'default'
+
+
+def leer_manifiesto(raiz=None):
+    try:
+        return json.loads(((raiz or directorio()) / MANIFIESTO).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+# ----------------------
+# Lectura de la base
+# ----------------------
+def _tipo_lectura(tipo):
+    return tipo[0] if isinstance(tipo, tuple) else tipo
+
+
+def _leer(queryset, columnas, chunk_size):
+    anotaciones = {f'_{nombre}': expr for nombre, expr, _ in columnas if not isinstance(expr, str)}
+    campos = [expr if isinstance(expr, str) else f'_{nombre}' for nombre, expr, _ in columnas]
+    filas = queryset.order_by().annotate(**anotaciones).values_list(*campos).iterator(chunk_size=chunk_size)
+    return np.fromiter(filas, dtype=[(nombre, _tipo_lectura(tipo)) for nombre, _, tipo in columnas])
+
+
+def _separar(datos, columnas):
+    """Arreglo estructurado -> {columna: arreglo contiguo}."""
+    resultado = {}
+    for nombre, _, tipo in columnas:
+        columna = datos[nombre]
+        resultado[nombre] = columna.astype(tipo[1]) if isinstance(tipo, tuple) else np.ascontiguousarray(columna)
+    return resultado
+
+
+def _meses(fuentes, alias):
+    """(inicio, fin) de cada mes UTC entre la primera y la última fecha de las fuentes."""
+    extremos = [
+        modelo.objects.using(alias).aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        for modelo, _ in fuentes
+    ]
+    primeras = [e['primera'] for e in extremos if e['primera']]
+    if not primeras:
+        return
+    primera = min(primeras).astimezone(dt_timezone.utc)
+    ultima = max(e['ultima'] for e in extremos if e['ultima'])
+    inicio = datetime(primera.year, primera.month, 1, tzinfo=dt_timezone.utc)
+    while inicio <= ultima:
+        fin = datetime(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+        yield inicio, fin
+        inicio = fin
+
+
+def _leer_mes(fuentes, columnas, alias, inicio, fin, chunk_size):
+    partes = []
+    archivado = []
+    for modelo, es_archivo in fuentes:
+        filas = _leer(
+            modelo.objects.using(alias).filter(fecha__gte=inicio, fecha__lt=fin), columnas, chunk_size,
+        )
+        partes.append(filas)
+        archivado.append(np.full(len(filas), es_archivo))
+    datos = np.concatenate(partes)
+    orden = np.argsort(datos['id'], kind='stable')
+    resultado = _separar(datos[orden], columnas)
+    resultado['archivado'] = np.concatenate(archivado)[orden]
+    return resultado
+
+
+def _firma(modelo, alias):
+    datos = modelo.objects.using(alias).aggregate(filas=Count('id'), ultimo=Max('actualizado'))
+    return f"{datos['filas']}|{datos['ultimo'].isoformat() if datos['ultimo'] else ''}"
+
+
+# ----------------------
+# Escritura
+# ----------------------
+def _escribir(carpeta, particion, columnas, formato):
+    """Escribe la partición y borra la del otro formato si había. Devuelve el nombre del archivo."""
+    carpeta.mkdir(parents=True, exist_ok=True)
+    nombre = f'{particion}.{formato}'
+    temporal = carpeta / f'.{nombre}.tmp'
+    if formato == 'parquet':
+        tabla = pa.table({columna: pa.array(valores) for columna, valores in columnas.items()})
+        pq.write_table(tabla, temporal, compression='zstd')
+    else:
+        with open(temporal, 'wb') as archivo:
+            np.savez(archivo, **columnas)
+    os.replace(temporal, carpeta / nombre)
+    for otro in ('parquet', 'npz'):
+        if otro != formato:
+            (carpeta / f'{particion}.{otro}').unlink(missing_ok=True)
+    return nombre
+
+
+def exportar(alias=None, formato=None, todo=False, chunk_size=20000):
+    """Escribe las particiones nuevas o incompletas. Devuelve [(tabla, partición, filas)]."""
+    if np is None:
+        raise RuntimeError('La exportación columnar necesita numpy (pip install numpy).')
+    alias = alias or alias_lectura()
+    formato = formato or formato_disponible()
+    if formato == 'parquet' and pq is None:
+        raise RuntimeError('Para Parquet hace falta pyarrow (pip install pyarrow).')
+    raiz = directorio()
+    manifiesto = {} if todo else leer_manifiesto(raiz)
+    tablas = manifiesto.setdefault('tablas', {})
+    # Lo que se lea de aquí en adelante puede ser de un mes todavía abierto
+    ahora = timezone.now()
+    escritas = []
+
+    for tabla, (fuentes, columnas) in TABLAS_MENSUALES.items():
+        guardadas = tablas.setdefault(tabla, {})
+        for inicio, fin in _meses(fuentes, alias):
+            particion = f'{inicio:%Y-%m}'
+            previa = guardadas.get(particion)
+            if previa and previa['completa'] and (raiz / tabla / previa['archivo']).exists():
+                continue
+            datos = _leer_mes(fuentes, columnas, alias, inicio, fin, chunk_size)
+            guardadas[particion] = {
+                'archivo': _escribir(raiz / tabla, particion, datos, formato),
+                'filas': len(datos['id']),
+                'completa': fin + MARGEN_CIERRE <= ahora,
+            }
+            escritas.append((tabla, particion, len(datos['id'])))
+
+    for tabla, (modelo, columnas) in TABLAS_FIJAS.items():
+        firma = _firma(modelo, alias)
+        previa = tablas.get(tabla, {}).get(PARTICION_FIJA)
+        if previa and previa.get('firma') == firma and (raiz / tabla / previa['archivo']).exists():
+            continue
+        filas = _leer(modelo.objects.using(alias), columnas, chunk_size)
+        datos = _separar(filas[np.argsort(filas['id'])], columnas)
+        tablas[tabla] = {PARTICION_FIJA: {
+            'archivo': _escribir(raiz / tabla, PARTICION_FIJA, datos, formato),
+            'filas': len(datos['id']),
+            'firma': firma,
+        }}
+        escritas.append((tabla, PARTICION_FIJA, len(datos['id'])))
+
+    manifiesto['generado'] = ahora.isoformat()
+    temporal = raiz / f'.{MANIFIESTO}.tmp'
+    temporal.write_text(json.dumps(manifiesto, indent=1), encoding='utf-8')
+    os.replace(temporal, raiz / MANIFIESTO)
+    return escritas
+
+
+# ----------------------
+# Carga para análisis
+# ----------------------
+def _mapear_npz(ruta, columnas=None):
+    """Columnas de un .npz sin comprimir como np.memmap sobre el mismo archivo."""
+    resultado = {}
+    with zipfile.ZipFile(ruta) as zip_, open(ruta, 'rb') as archivo:
+        for info in zip_.infolist():
+            nombre = info.filename.removesuffix('.npy')
+            if columnas is not None and nombre not in columnas:
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zip_.open(info) as miembro:
+                    resultado[nombre] = np.load(miembro)
+                continue
+            # Cabecera local del zip: 30 bytes + nombre + extra; después empieza el .npy
+            archivo.seek(info.header_offset)
+            largo_nombre, largo_extra = struct.unpack('<HH', archivo.read(30)[26:30])
+            archivo.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+            version = np.lib.format.read_magic(archivo)
+            if version == (1, 0):
+                forma, fortran, tipo = np.lib.format.read_array_header_1_0(archivo)
+            else:
+                forma, fortran, tipo = np.lib.format.read_array_header_2_0(archivo)
+            if not np.prod(forma):
+                resultado[nombre] = np.empty(forma, dtype=tipo)
+                continue
+            resultado[nombre] = np.memmap(
+                ruta, dtype=tipo, mode='r', offset=archivo.tell(), shape=forma, order='F' if fortran else 'C',
+            )
+    return resultado
+
+
+def _leer_particion(ruta, columnas=None):
+    if ruta.suffix == '.parquet':
+        if pq is None:
+            raise RuntimeError(f'{ruta.name} es Parquet: hace falta pyarrow para leerlo.')
+        tabla = pq.read_table(ruta, columns=columnas, memory_map=True)
+        return {nombre: tabla.column(nombre).to_numpy() for nombre in tabla.column_names}
+    return _mapear_npz(ruta, columnas)
+
+
+def particiones(tabla, desde=None, hasta=None, columnas=None, raiz=None):
+    """Genera (partición, {columna: arreglo}) de `tabla`, de 'AAAA-MM' `desde` a `hasta` inclusive.
+
+    Los arreglos de un .npz están mapeados sobre el archivo: no se copian a memoria.
+    """
+    raiz = raiz or directorio()
+    guardadas = leer_manifiesto(raiz).get('tablas', {}).get(tabla, {})
+    for particion in sorted(guardadas):
+        if particion != PARTICION_FIJA and (
+            (desde and particion < desde) or (hasta and particion > hasta)
+        ):
+            continue
+        yield particion, _leer_particion(raiz / tabla / guardadas[particion]['archivo'], columnas)
+
+
+def cargar(tabla, desde=None, hasta=None, columnas=None, raiz=None):
+    """Todas las particiones pedidas unidas en {columna: arreglo}.
+
+    Unirlas copia los datos; para recorrer meses sin copiar usar `particiones`.
+    """
+    partes = [datos for _, datos in particiones(tabla, desde, hasta, columnas, raiz)]
+    if not partes:
+        return {}
+    if len(partes) == 1:
+        return partes[0]
+    return {nombre: np.concatenate([parte[nombre] for parte in partes]) for nombre in partes[0]}
@@ -0,0 +1,519 @@
+"""Instantánea del catálogo compartida por los workers a través de un archivo mapeado.
+
+Cada listado de la tienda (catálogo, género, tipo, comprar) creaba una instancia
+de `Producto` y otra de `Artista` por fila, en cada request y en cada worker.
+`python manage.py generar_instantanea` escribe el catálogo en un archivo
+binario de sólo lectura:
+
+- columnas como arreglos de NumPy (ids, precio en centavos, stock, novedad, y
+  para los textos su índice en la tabla de textos);
+- una tabla de textos (offsets + bytes UTF-8, cada texto distinto una vez);
+- los órdenes que usan las páginas ya calculados (por nombre y el del catálogo).
+
+Cada worker lo abre con `mmap`: las páginas del archivo están una sola vez en
+la caché del sistema operativo para todos los procesos. Las vistas recorren
+las filas con accesores de `__slots__` (`ProductoInstantanea`) que leen las
+columnas al pedir cada atributo; no se instancia nada del ORM.
+
+El comando escribe cada versión como `catalogo-<generación>.bin` y después
+reemplaza de forma atómica el puntero `actual`. Los workers miran la fecha del
+puntero en cada request y, si cambió, abren la generación nueva; la anterior se
+libera cuando termina el último request que la usaba. Sin instantánea (o sin
+NumPy) las vistas leen del ORM como siempre.
+
+Guardar, crear o borrar un producto o un artista (señales, y a mano en los
+`update()` masivos) deja la marca `vencida` al confirmarse la transacción.
+Mientras exista, `catalogo()` devuelve None y las páginas leen del ORM; la
+siguiente generación la borra si no se volvió a marcar mientras leía.
+
+El disponible cambia con cada venta y no está en la instantánea: al recorrer
+una `Seleccion` se pide con los movimientos (`stock.stock_disponible`) en una
+consulta por bloque de filas, y queda en `stock_disponible` de cada fila.
+"""
+import json
+import mmap
+import os
+import threading
+import uuid
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Artista, Producto
+from .stock import stock_disponible
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depende del entorno
+    np = None
+
+PUNTERO = 'actual'
+VENCIDA = 'vencida'
+MAGIA = b'AXCAT01\n'
+ALINEACION = 8
+GENERACIONES_GUARDADAS = 2
+BLOQUE_DISPONIBLE = 500
+TIPOS = dict(Producto.TIPO_CHOICES)
+GENEROS = dict(Producto.GENEROS_CHOICES)
+
+
+def directorio():
+    return Path(getattr(settings, 'INSTANTANEA_CATALOGO_ROOT', settings.BASE_DIR / 'instantanea'))
+
+
+def nombre_archivo(generacion):
+    return f'catalogo-{generacion}.bin'
+
+
+def leer_puntero():
+    try:
+        return json.loads((directorio() / PUNTERO).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+# ----------------------
+# Invalidación
+# ----------------------
+def marcar_vencida():
+    """Deja de usar la instantánea en todos los workers cuando se confirme la transacción."""
+    transaction.on_commit(_escribir_vencida)
+
+
+def _escribir_vencida():
+    destino = directorio()
+    if not (destino / PUNTERO).exists():
+        return
+    # Un contenido distinto en cada marca: generar() sabe si la volvieron a marcar
+    temporal = destino / f'.{VENCIDA}.{uuid.uuid4().hex}.tmp'
+    temporal.write_text(uuid.uuid4().hex, encoding='utf-8')
+    os.replace(temporal, destino / VENCIDA)
+
+
+def _leer_vencida():
+    try:
+        return (directorio() / VENCIDA).read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+
+def _quitar_vencida(vista):
+    """Borra la marca si sigue siendo `vista`, la que había antes de leer el catálogo."""
+    if vista is None:
+        return
+    ruta = directorio() / VENCIDA
+    revisando = ruta.with_name(f'.{VENCIDA}.revisando')
+    try:
+        os.replace(ruta, revisando)
+    except FileNotFoundError:
+        return
+    if revisando.read_text(encoding='utf-8') == vista:
+        revisando.unlink()
+    else:
+        # Se marcó otra vez mientras se leía: queda vencida hasta la próxima pasada
+        os.replace(revisando, ruta)
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Artista)
+@receiver(post_delete, sender=Artista)
+def catalogo_cambiado(sender, instance, **kwargs):
+    marcar_vencida()
+
+
+# ----------------------
+# Escritura (comando generar_instantanea)
+# ----------------------
+class _Textos:
+    """Tabla de textos: cada texto distinto se guarda una vez. -1 es 'sin valor'."""
+
+    def __init__(self):
+        self.indices = {}
+        self.partes = []
+        self.offsets = [0]
+
+    def agregar(self, texto):
+        if texto is None:
+            return -1
+        indice = self.indices.get(texto)
+        if indice is None:
+            datos = texto.encode('utf-8')
+            indice = self.indices[texto] = len(self.partes)
+            self.partes.append(datos)
+            self.offsets.append(self.offsets[-1] + len(datos))
+        return indice
+
+
+def firma_catalogo():
+    productos = Producto.objects.aggregate(filas=Count('id'), ultimo=Max('actualizado'))
+    artistas = Artista.objects.aggregate(filas=Count('id'), ultimo=Max('actualizado'))
+    return '|'.join(
+        f"{datos['filas']}|{datos['ultimo'].isoformat() if datos['ultimo'] else ''}"
+        for datos in (productos, artistas)
+    )
+
+
+def _columnas_catalogo():
+    """Lee el catálogo con values_list (tuplas, sin instancias) y arma las columnas."""
+    textos = _Textos()
+    artistas = list(Artista.objects.order_by('id').values_list('id', 'nombre_artista', 'foto'))
+    fila_artista = {artista_id: fila for fila, (artista_id, _, _) in enumerate(artistas)}
+    productos = list(
+        Producto.objects.order_by('id').values_list(
+            'id', 'artista_id', 'nombre_producto', 'descripcion', 'genero', 'tipo', 'precio', 'stock',
+            'novedad', 'img',
+        )
+    )
+
+    columnas = {
+        'artista_id': np.array([a[0] for a in artistas], dtype='i8'),
+        'artista_nombre': np.array([textos.agregar(a[1]) for a in artistas], dtype='i4'),
+        'artista_foto': np.array([textos.agregar(a[2] or None) for a in artistas], dtype='i4'),
+        'producto_id': np.array([p[0] for p in productos], dtype='i8'),
+        'producto_artista': np.array([fila_artista[p[1]] for p in productos], dtype='i4'),
+        'producto_nombre': np.array([textos.agregar(p[2]) for p in productos], dtype='i4'),
+        'producto_descripcion': np.array([textos.agregar(p[3]) for p in productos], dtype='i4'),
+        'producto_genero': np.array([textos.agregar(p[4]) for p in productos], dtype='i4'),
+        'producto_tipo': np.array([textos.agregar(p[5]) for p in productos], dtype='i4'),
+        # decimal_places=2: el precio exacto en centavos
+        'producto_precio': np.array([int(p[6].scaleb(2)) for p in productos], dtype='i8'),
+        'producto_stock': np.array([p[7] for p in productos], dtype='i8'),
+        'producto_novedad': np.array([p[8] for p in productos], dtype='?'),
+        'producto_img': np.array([textos.agregar(p[9] or None) for p in productos], dtype='i4'),
+    }
+    # Los mismos órdenes que los order_by() de las vistas, con el id como desempate.
+    # El orden de str en Python es el de los bytes UTF-8, como el BINARY de SQLite.
+    filas = range(len(productos))
+    columnas['orden_nombre'] = np.array(
+        sorted(filas, key=lambda f: (productos[f][2], productos[f][0])), dtype='i4',
+    )
+    columnas['orden_catalogo'] = np.array(
+        sorted(filas, key=lambda f: (
+            productos[f][4], productos[f][5], artistas[fila_artista[productos[f][1]]][1], productos[f][2],
+            productos[f][0],
+        )),
+        dtype='i4',
+    )
+    columnas['textos_offsets'] = np.array(textos.offsets, dtype='i8')
+    columnas['textos'] = np.frombuffer(b''.join(textos.partes), dtype='u1')
+    return columnas
+
+
+def _escribir_archivo(ruta, columnas, generacion):
+    cabecera = {'generacion': generacion, 'columnas': {}}
+    posicion = 0
+    for nombre, arreglo in columnas.items():
+        cabecera['columnas'][nombre] = [posicion, arreglo.dtype.str, len(arreglo)]
+        posicion += -(-arreglo.nbytes // ALINEACION) * ALINEACION
+    texto = json.dumps(cabecera).encode('utf-8')
+    inicio = -(-(len(MAGIA) + 8 + len(texto)) // ALINEACION) * ALINEACION
+
+    temporal = ruta.with_name(f'.{ruta.name}.tmp')
+    with open(temporal, 'wb') as archivo:
+        archivo.write(MAGIA)
+        archivo.write(len(texto).to_bytes(8, 'little'))
+        archivo.write(texto)
+        archivo.write(b'\0' * (inicio - archivo.tell()))
+        for nombre, arreglo in columnas.items():
+            archivo.write(arreglo.tobytes())
+            archivo.write(b'\0' * (-arreglo.nbytes % ALINEACION))
+    os.replace(temporal, ruta)
+
+
+def generar(forzar=False):
+    """Escribe una generación nueva si el catálogo cambió. Devuelve su número o None."""
+    if np is None:
+        raise RuntimeError('La instantánea del catálogo necesita numpy (pip install numpy).')
+    destino = directorio()
+    destino.mkdir(parents=True, exist_ok=True)
+    puntero = leer_puntero()
+    vencida = _leer_vencida()
+    # La firma se toma antes de leer: un cambio durante la lectura se ve en la siguiente pasada
+    firma = firma_catalogo()
+    if not forzar and puntero.get('firma') == firma and (destino / nombre_archivo(puntero['generacion'])).exists():
+        _quitar_vencida(vencida)
+        return None
+
+    generacion = puntero.get('generacion', 0) + 1
+    _escribir_archivo(destino / nombre_archivo(generacion), _columnas_catalogo(), generacion)
+    temporal = destino / f'.{PUNTERO}.tmp'
+    temporal.write_text(json.dumps({'generacion': generacion, 'firma': firma}), encoding='utf-8')
+    os.replace(temporal, destino / PUNTERO)
+    _quitar_vencida(vencida)
+
+    # Los workers que todavía usan la generación anterior la tienen abierta: se deja una
+    for vieja in destino.glob('catalogo-*.bin'):
+        numero = vieja.stem.rpartition('-')[2]
+        if numero.isdigit() and int(numero) <= generacion - GENERACIONES_GUARDADAS:
+            try:
+                vieja.unlink()
+            except OSError:
+                # Windows no deja borrar un archivo mapeado; se borra en otra pasada
+                pass
+    return generacion
+
+
+# ----------------------
+# Lectura en los workers
+# ----------------------
+class ArchivoInstantanea:
+    """Lo que las plantillas usan de un ImageField: `if img` e `img.url`."""
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
+class ArtistaInstantanea:
+    __slots__ = ('_catalogo', '_fila')
+
+    def __init__(self, catalogo, fila):
+        self._catalogo = catalogo
+        self._fila = fila
+
+    @property
+    def id(self):
+        return int(self._catalogo.artista_id[self._fila])
+
+    pk = id
+
+    @property
+    def nombre_artista(self):
+        return self._catalogo.texto(self._catalogo.artista_nombre[self._fila])
+
+    @property
+    def foto(self):
+        return self._catalogo.archivo(self._catalogo.artista_foto[self._fila])
+
+    def __str__(self):
+        return self.nombre_artista
+
+
+class ProductoInstantanea:
+    """Fila de la instantánea con los atributos de `Producto` que usan las plantillas."""
+    __slots__ = ('_catalogo', '_fila', 'stock_disponible')
+
+    def __init__(self, catalogo, fila):
+        self._catalogo = catalogo
+        self._fila = fila
+
+    @property
+    def id(self):
+        return int(self._catalogo.producto_id[self._fila])
+
+    pk = id
+
+    @property
+    def artista_id(self):
+        return int(self._catalogo.artista_id[self._catalogo.producto_artista[self._fila]])
+
+    @property
+    def artista(self):
+        return ArtistaInstantanea(self._catalogo, int(self._catalogo.producto_artista[self._fila]))
+
+    @property
+    def nombre_producto(self):
+        return self._catalogo.texto(self._catalogo.producto_nombre[self._fila])
+
+    @property
+    def descripcion(self):
+        return self._catalogo.texto(self._catalogo.producto_descripcion[self._fila])
+
+    @property
+    def genero(self):
+        return self._catalogo.texto(self._catalogo.producto_genero[self._fila])
+
+    @property
+    def tipo(self):
+        return self._catalogo.texto(self._catalogo.producto_tipo[self._fila])
+
+    @property
+    def precio(self):
+        return Decimal(int(self._catalogo.producto_precio[self._fila])).scaleb(-2)
+
+    @property
+    def stock(self):
+        return int(self._catalogo.producto_stock[self._fila])
+
+    @property
+    def novedad(self):
+        return bool(self._catalogo.producto_novedad[self._fila])
+
+    @property
+    def img(self):
+        return self._catalogo.archivo(self._catalogo.producto_img[self._fila])
+
+    def get_tipo_display(self):
+        tipo = self.tipo
+        return TIPOS.get(tipo, tipo)
+
+    def get_genero_display(self):
+        genero = self.genero
+        return GENEROS.get(genero, genero)
+
+    def __str__(self):
+        return f"{self.nombre_producto} - ${self.precio}"
+
+
+def _con_disponible(productos):
+    disponibles = stock_disponible([p.id for p in productos])
+    for p in productos:
+        p.stock_disponible = disponibles.get(p.id, p.stock)
+    return productos
+
+
+class Seleccion:
+    """Secuencia de filas de productos; reemplaza al queryset en las plantillas."""
+    __slots__ = ('_catalogo', '_filas')
+
+    def __init__(self, catalogo, filas):
+        self._catalogo = catalogo
+        self._filas = filas
+
+    def __len__(self):
+        return len(self._filas)
+
+    def __bool__(self):
+        return len(self._filas) > 0
+
+    def __iter__(self):
+        catalogo = self._catalogo
+        filas = self._filas.tolist()
+        for desde in range(0, len(filas), BLOQUE_DISPONIBLE):
+            productos = [ProductoInstantanea(catalogo, fila) for fila in filas[desde:desde + BLOQUE_DISPONIBLE]]
+            _con_disponible(productos)
+            yield from productos
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return Seleccion(self._catalogo, self._filas[indice])
+        return _con_disponible([ProductoInstantanea(self._catalogo, int(self._filas[indice]))])[0]
+
+    def count(self):
+        return len(self._filas)
+
+    def iterator(self, chunk_size=None):
+        # Misma interfaz que el queryset para listados.iterar()
+        return iter(self)
+
+    def ids(self):
+        return self._catalogo.producto_id[self._filas].tolist()
+
+    def con_genero(self, genero):
+        return self._filtrar('producto_genero', genero)
+
+    def con_tipo(self, tipo):
+        return self._filtrar('producto_tipo', tipo)
+
+    def _filtrar(self, nombre_columna, valor):
+        # Como __iexact: se comparan los pocos textos distintos y después los índices
+        columna = getattr(self._catalogo, nombre_columna)
+        textos = self._catalogo.textos_iguales(nombre_columna, valor)
+        return Seleccion(self._catalogo, self._filas[np.isin(columna[self._filas], textos)])
+
+
+class Catalogo:
+    """Una generación de la instantánea abierta con mmap (sólo lectura)."""
+
+    def __init__(self, ruta):
+        with open(ruta, 'rb') as archivo:
+            self._mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mapa[:len(MAGIA)] != MAGIA:
+            raise ValueError(f'{ruta} no es una instantánea del catálogo')
+        largo = int.from_bytes(self._mapa[len(MAGIA):len(MAGIA) + 8], 'little')
+        cabecera = json.loads(self._mapa[len(MAGIA) + 8:len(MAGIA) + 8 + largo])
+        inicio = -(-(len(MAGIA) + 8 + largo) // ALINEACION) * ALINEACION
+        self.generacion = cabecera['generacion']
+        # Cada columna es una vista sobre el mapa: nada se copia a la memoria del proceso
+        for nombre, (posicion, tipo, cantidad) in cabecera['columnas'].items():
+            setattr(self, nombre, np.frombuffer(self._mapa, dtype=tipo, count=cantidad, offset=inicio + posicion))
+        self._inicio_textos = inicio + cabecera['columnas']['textos'][0]
+        self._iguales = {}
+
+    def texto(self, indice):
+        indice = int(indice)
+        if indice < 0:
+            return ''
+        desde = self._inicio_textos + int(self.textos_offsets[indice])
+        hasta = self._inicio_textos + int(self.textos_offsets[indice + 1])
+        return self._mapa[desde:hasta].decode('utf-8')
+
+    def archivo(self, indice):
+        return ArchivoInstantanea(self.texto(indice)) if indice >= 0 else None
+
+    def textos_iguales(self, nombre_columna, valor):
+        """Índices de los textos de la columna iguales a `valor` sin distinguir mayúsculas."""
+        clave = (nombre_columna, valor.lower())
+        if clave not in self._iguales:
+            distintos = np.unique(getattr(self, nombre_columna)).tolist()
+            self._iguales[clave] = np.array(
+                [i for i in distintos if self.texto(i).lower() == clave[1]], dtype='i4',
+            )
+        return self._iguales[clave]
+
+    def por_nombre(self):
+        return Seleccion(self, self.orden_nombre)
+
+    def ordenado_catalogo(self):
+        return Seleccion(self, self.orden_catalogo)
+
+    def artista(self, artista_id):
+        fila = int(np.searchsorted(self.artista_id, artista_id))
+        if fila < len(self.artista_id) and self.artista_id[fila] == artista_id:
+            return ArtistaInstantanea(self, fila)
+        return None
+
+    def productos_de(self, artista):
+        # En orden de id, como el queryset sin order_by()
+        return Seleccion(self, np.flatnonzero(self.producto_artista == artista._fila).astype('i4'))
+
+
+_cargado = None  # (fecha del puntero, Catalogo)
+_cargando = threading.Lock()
+
+
+def catalogo():
+    """La generación vigente para este proceso, o None si no hay instantánea o está vencida."""
+    global _cargado
+    if np is None or not getattr(settings, 'INSTANTANEA_CATALOGO', True):
+        return None
+    if (directorio() / VENCIDA).exists():
+        return None
+    try:
+        marca = os.stat(directorio() / PUNTERO).st_mtime_ns
+    except OSError:
+        return None
+    cargado = _cargado
+    if cargado is not None and cargado[0] == marca:
+        return cargado[1]
+    with _cargando:
+        if _cargado is None or _cargado[0] != marca:
+            generacion = leer_puntero().get('generacion')
+            try:
+                if _cargado is not None and _cargado[1].generacion == generacion:
+                    nuevo = _cargado[1]
+                else:
+                    nuevo = Catalogo(directorio() / nombre_archivo(generacion))
+            except (OSError, ValueError):
+                # Puntero a medio cambiar o archivo ya borrado: seguir con lo que había
+                return _cargado[1] if _cargado is not None else None
+            # Reemplazo atómico: los requests en curso siguen con la generación que tomaron
+            _cargado = (marca, nuevo)
+    return _cargado[1]
@@ -0,0 +1,84 @@
+"""Identidad de los clientes que compran sin cuenta.
+
+- Con email: se reutiliza el `Usuario` de ese email (único) o se crea uno.
+- Sin email: se reconoce al invitado por una cookie firmada del dispositivo con
+  el id de su `Usuario`; si no la trae se crea uno con un email de marcador
+  `anon_<uuid>@local`, que no necesita contar filas ni puede chocar entre pedidos
+  simultáneos.
+
+Los datos del invitado sólo se escriben cuando cambian, así que un cliente que
+repite compra no genera escrituras extra en `Usuario`. La cookie se lee en el
+request (`invitado_de_cookie`) y el perfil se resuelve dentro del trabajo que
+escribe el pedido, así que `resolver_invitado` no usa el request.
+"""
+import uuid
+
+from django.db import IntegrityError, transaction
+
+from .models import Usuario
+
+COOKIE_NAME = 'invitado_axolotl'
+COOKIE_SALT = 'app_Axolotl.invitados'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 365  # 1 año
+
+
+def email_invitado():
+    return f'anon_{uuid.uuid4().hex}@local'
+
+
+def actualizar_datos(usuario, **campos):
+    """Copia los valores no vacíos de `campos` y guarda sólo los que cambiaron."""
+    cambiados = []
+    for campo, valor in campos.items():
+        if valor and getattr(usuario, campo) != valor:
+            setattr(usuario, campo, valor)
+            cambiados.append(campo)
+    if cambiados:
+        usuario.save(update_fields=cambiados)
+    return usuario
+
+
+def invitado_de_cookie(request):
+    """Id del perfil de invitado que guarda la cookie del dispositivo, o None."""
+    usuario_id = request.get_signed_cookie(
+        COOKIE_NAME, default=None, salt=COOKIE_SALT, max_age=COOKIE_MAX_AGE
+    )
+    try:
+        return int(usuario_id) if usuario_id is not None else None
+    except ValueError:
+        return None
+
+
+def resolver_invitado(invitado_id=None, nombre='', email='', direccion=''):
+    """Devuelve el `Usuario` al que se asigna el pedido de un visitante sin sesión.
+
+    `invitado_id` es el de la cookie (ver `invitado_de_cookie`).
+    """
+    if email:
+        usuario = Usuario.objects.filter(email=email).first()
+        if usuario is None:
+            try:
+                with transaction.atomic():
+                    return Usuario.objects.create(nombre=nombre or email, email=email, direccion=direccion)
+            except IntegrityError:
+                # Otro pedido simultáneo creó el mismo email
+                usuario = Usuario.objects.get(email=email)
+        return actualizar_datos(usuario, nombre=nombre, direccion=direccion)
+
+    # Sólo perfiles de invitado: la cookie nunca da acceso a una cuenta registrada
+    usuario = Usuario.objects.filter(id=invitado_id, user__isnull=True).first() if invitado_id else None
+    if usuario is not None:
+        return actualizar_datos(usuario, nombre=nombre, direccion=direccion)
+    return Usuario.objects.create(
+        nombre=nombre or 'Cliente anónimo', email=email_invitado(), direccion=direccion
+    )
+
+
+def recordar_invitado(response, usuario):
+    """Guarda en el dispositivo la identidad del invitado para su próxima compra."""
+    if usuario.user_id is None:
+        response.set_signed_cookie(
+            COOKIE_NAME, str(usuario.id), salt=COOKIE_SALT,
+            max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+        )
+    return response
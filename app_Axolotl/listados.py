@@ -0,0 +1,96 @@
+"""Listados grandes del catálogo enviados en streaming.
+
+Con pocos productos `catalogo_frontend` y `tipo_frontend` renderizan la página
+entera como siempre. Desde `LISTADO_STREAMING_DESDE` productos la página se
+envía por partes: primero la cabecera (la plantilla renderizada con
+`streaming=True`, que en lugar del listado deja la marca `<!--listado-->`),
+después las tarjetas de a `LISTADO_LOTE` mientras se leen de la BD, y al
+final el pie. Ni la lista de productos ni el HTML completo quedan en memoria y
+el primer byte sale sin esperar al último producto.
+
+Los productos no se leen con `.iterator()`: en SQLite el cursor quedaría
+abierto entre lotes mientras el cliente descarga, con el lock de lectura
+tomado, y los checkouts no podrían confirmar. Se leen primero los ids en el
+orden del listado y después cada lote completo por `pk__in`, cerrando la
+consulta antes de enviar nada.
+"""
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+
+from .compresion import minificar_html
+
+MARCA_LISTADO = '<!--listado-->'
+
+
+def usar_streaming(total):
+    return total >= getattr(settings, 'LISTADO_STREAMING_DESDE', 300)
+
+
+def lotes(productos, tamano=None):
+    """Agrupa un iterable en listas de `tamano` elementos."""
+    tamano = tamano or getattr(settings, 'LISTADO_LOTE', 60)
+    productos = iter(productos)
+    while True:
+        lote = list(islice(productos, tamano))
+        if not lote:
+            return
+        yield lote
+
+
+def iterar(queryset):
+    """Recorre `queryset` en su orden sin dejar un cursor abierto entre lotes."""
+    tamano = getattr(settings, 'LISTADO_LOTE', 60) * 4
+    if not isinstance(queryset, QuerySet):
+        # Selección de la instantánea: se lee del mmap, no hay cursor de la BD
+        return queryset.iterator(chunk_size=tamano)
+    return _por_lotes_de_ids(queryset, tamano)
+
+
+def _por_lotes_de_ids(queryset, tamano):
+    ids = list(queryset.values_list('pk', flat=True))
+    for i in range(0, len(ids), tamano):
+        bloque = ids[i:i + tamano]
+        por_id = {p.pk: p for p in queryset.filter(pk__in=bloque)}
+        for pk in bloque:
+            if pk in por_id:  # borrado entre las dos consultas
+                yield por_id[pk]
+
+
+def respuesta_streaming(request, plantilla, context, fragmentos):
+    """StreamingHttpResponse con la página `plantilla` y el listado en partes.
+
+    `fragmentos` produce pares (plantilla parcial, contexto extra) y se consume
+    recién mientras se envía la respuesta.
+    """
+    # El token y los mensajes se resuelven ahora: la cookie CSRF se agrega a la
+    # respuesta antes de que se empiece a enviar el cuerpo
+    get_token(request)
+    pagina = render_to_string(plantilla, {**context, 'streaming': True}, request)
+    inicio, _, fin = pagina.partition(MARCA_LISTADO)
+
+    def contenido():
+        yield inicio
+        for parcial, extra in fragmentos:
+            yield get_template(parcial).render({**context, **extra}, request)
+        yield fin
+
+    partes = contenido()
+    if getattr(settings, 'MINIFICAR_HTML', True):
+        # Cada parte es HTML completo (se corta entre etiquetas), se puede minificar sola
+        partes = (minificar_html(parte) for parte in partes)
+    return StreamingHttpResponse(partes, content_type='text/html; charset=utf-8')
+
+
+def secciones_por_grupo(productos, clave, plantilla, nombre_grupo):
+    """Fragmentos para un listado agrupado (p. ej. por género) ya ordenado por `clave`."""
+    for grupo, productos_grupo in groupby(productos, key=clave):
+        abrir = True
+        for lote in lotes(productos_grupo):
+            yield plantilla, {nombre_grupo: grupo, 'productos': lote, 'abrir': abrir, 'cerrar': False}
+            abrir = False
+        yield plantilla, {nombre_grupo: grupo, 'productos': [], 'abrir': False, 'cerrar': True}
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_Axolotl.estaticos import marcar_pendientes
+from app_Axolotl.mas_vendidos import (
+    paginas_afectadas, reconstruir, recalcular_rankings, sumar_ventas_nuevas,
+)
+
+
+class Command(BaseCommand):
+    help = 'Suma las líneas de pedido nuevas y actualiza los rankings de más vendidos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=int, default=0,
+            help='Repetir cada N segundos (0 = una sola pasada).',
+        )
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help='Volver a sumar todas las líneas de la ventana (tras editar o borrar pedidos).',
+        )
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            reconstruir()
+        cada = options['cada']
+        while True:
+            inicio = time.perf_counter()
+            lineas = sumar_ventas_nuevas()
+            filas = recalcular_rankings()
+            marcar_pendientes(paginas_afectadas())
+            self.stdout.write(
+                f'Líneas nuevas: {lineas}, filas de ranking: {filas} ({time.perf_counter() - inicio:.2f}s)'
+            )
+            if not cada:
+                break
+            time.sleep(cada)
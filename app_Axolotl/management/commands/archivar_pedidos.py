@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from app_Axolotl.archivo import archivar_pedidos, fecha_corte
+
+
+class Command(BaseCommand):
+    help = 'Mueve los pedidos más viejos que la ventana de retención a las tablas de archivo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias', type=int, default=None,
+            help='Antigüedad mínima en días (por defecto settings.ARCHIVO_PEDIDOS_DIAS).',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Pedidos por transacción.',
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0,
+            help='Segundos de espera entre lotes.',
+        )
+
+    def handle(self, *args, **options):
+        corte = fecha_corte(options['dias'])
+        archivados = archivar_pedidos(corte, lote=options['lote'], pausa=options['pausa'])
+        self.stdout.write(f'Pedidos archivados (anteriores a {corte:%d/%m/%Y}): {archivados}')
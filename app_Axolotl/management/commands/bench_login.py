@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = 'Mide logins por segundo y consultas por login contra login_frontend (no deja datos).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=20)
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument(
+            '--hasher-real', action='store_true',
+            help='Usar el hasher de contraseñas configurado (por defecto MD5 para medir sólo el resto del camino).',
+        )
+
+    def handle(self, *args, **options):
+        ajustes = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['hasher_real']:
+            ajustes['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+        with override_settings(**ajustes), transaction.atomic():
+            nombres = [f'bench_login_{i}' for i in range(options['usuarios'])]
+            for nombre in nombres:
+                User.objects.create_user(nombre, f'{nombre}@bench.local', 'bench-clave')
+
+            client = Client()
+            total = options['logins']
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = time.perf_counter()
+                for i in range(total):
+                    client.post('/login/', {'username': nombres[i % len(nombres)], 'password': 'bench-clave'})
+                    client.cookies.clear()
+                duracion = time.perf_counter() - inicio
+
+            # Deshacer los usuarios y sesiones de prueba
+            transaction.set_rollback(True)
+
+        escrituras = sum(
+            1 for q in consultas.captured_queries
+            if q['sql'].lstrip().upper().startswith(('UPDATE', 'INSERT', 'DELETE'))
+        )
+        self.stdout.write(f'Logins: {total} en {duracion:.2f}s ({total / duracion:.1f}/s)')
+        self.stdout.write(
+            f'Consultas por login: {len(consultas) / total:.1f} (escrituras: {escrituras / total:.1f})'
+        )
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Axolotl.analitica import calcular_segmentos, np
+
+
+class Command(BaseCommand):
+    help = 'Calcula los segmentos RFM y la retención por cohortes de los clientes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk', type=int, default=20000,
+            help='Filas leídas de la base por bloque.',
+        )
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('Este comando necesita numpy: pip install numpy')
+        inicio = time.perf_counter()
+        clientes = calcular_segmentos(chunk_size=options['chunk'])
+        self.stdout.write(f'Clientes segmentados: {clientes} ({time.perf_counter() - inicio:.1f}s)')
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app_Axolotl.stock import compactar_movimientos
+
+
+class Command(BaseCommand):
+    help = 'Compacta los movimientos de stock pendientes en Producto.stock.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=int, default=0,
+            help='Repetir cada N segundos (0 = una sola pasada).',
+        )
+
+    def handle(self, *args, **options):
+        cada = options['cada']
+        while True:
+            compactados = compactar_movimientos()
+            self.stdout.write(f'Movimientos compactados: {compactados}')
+            if not cada:
+                break
+            time.sleep(cada)
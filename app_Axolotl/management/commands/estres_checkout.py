@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Axolotl import estres
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de estrés del checkout: muchos compradores a la vez (hilos y procesos) '
+        'sobre un producto con poco stock, contra las vistas reales. Informa '
+        'rendimiento, latencias, bloqueos de la base y cualquier sobreventa.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compradores', type=int, default=200)
+        parser.add_argument('--stock', type=int, default=50, help='Stock inicial del producto.')
+        parser.add_argument('--cantidad', type=int, default=1, help='Unidades por comprador.')
+        parser.add_argument('--hilos', type=int, default=16, help='Hilos por proceso.')
+        parser.add_argument(
+            '--procesos', type=int, default=0,
+            help='Procesos con --hilos hilos cada uno (0 = sólo hilos en este proceso).',
+        )
+        parser.add_argument(
+            '--modos', default=','.join(estres.MODOS),
+            help='Recorridos a repartir entre los compradores: carrito, directo, invitado.',
+        )
+        parser.add_argument(
+            '--escritor-unico', action='store_true',
+            help='Probar con ESCRITOR_UNICO = True (un escritor por proceso).',
+        )
+        parser.add_argument(
+            '--timeout-bd', type=float, default=None,
+            help='Segundos que SQLite espera el lock (por defecto el de DATABASES).',
+        )
+        parser.add_argument('--conservar', action='store_true', help='No borrar los datos de la prueba.')
+        parser.add_argument('--forzar', action='store_true', help='Permitir correrlo con DEBUG = False.')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['forzar']:
+            raise CommandError('DEBUG está apagado: ¿es la base de producción? Usa --forzar si no lo es.')
+        modos = [m.strip() for m in options['modos'].split(',') if m.strip()]
+        desconocidos = set(modos) - set(estres.MODOS)
+        if not modos or desconocidos:
+            raise CommandError(f'Modos válidos: {", ".join(estres.MODOS)}')
+        if options['compradores'] < 1 or options['hilos'] < 1:
+            raise CommandError('Hace falta al menos un comprador y un hilo.')
+
+        etiqueta = f'estres{int(time.time())}'
+        producto_id, tareas = estres.preparar(etiqueta, options['stock'], options['compradores'], modos)
+        try:
+            medidas, segundos = estres.correr(
+                tareas, producto_id, cantidad=options['cantidad'], hilos=options['hilos'],
+                procesos=options['procesos'], timeout_bd=options['timeout_bd'],
+                ajustes={'ESCRITOR_UNICO': options['escritor_unico']},
+            )
+            datos, problemas = estres.verificar(
+                producto_id, options['stock'],
+                sum(1 for op, r, _ in medidas if op == 'checkout' and r == estres.OK),
+            )
+        finally:
+            if not options['conservar']:
+                estres.limpiar(etiqueta)
+
+        concurrencia = options['hilos'] * max(options['procesos'], 1)
+        self.stdout.write(
+            f'{len(tareas)} compradores ({", ".join(modos)}), {concurrencia} a la vez, '
+            f'stock {options["stock"]}, {segundos:.2f}s'
+        )
+        for operacion, r in estres.resumir(medidas, segundos).items():
+            resultados = ', '.join(f'{k}: {v}' for k, v in sorted(r['resultados'].items()))
+            if operacion == 'sesion':
+                self.stdout.write(f'  login/logout de los compradores (no medidos): {resultados}')
+                continue
+            self.stdout.write(
+                f'  {operacion:<9} {r["por_segundo"]:7.1f}/s  p50 {r["p50"] * 1000:.0f} ms  '
+                f'p95 {r["p95"] * 1000:.0f} ms  p99 {r["p99"] * 1000:.0f} ms  '
+                f'máx {r["max"] * 1000:.0f} ms  ({resultados})'
+            )
+        self.stdout.write(
+            f'Vendidas: {datos["vendidas"]} de {datos["stock_inicial"]}, disponible: {datos["disponible"]}, '
+            f'stock compactado: {datos["stock_compactado"]}, pedidos: {datos["pedidos_bd"]} '
+            f'(confirmados: {datos["pedidos_ok"]})'
+        )
+        if options['conservar']:
+            self.stdout.write(f'Datos conservados con la etiqueta {etiqueta} (producto {producto_id}).')
+        if problemas:
+            for problema in problemas:
+                self.stderr.write(problema)
+            raise CommandError(f'Se encontraron {len(problemas)} problemas de stock.')
+        self.stdout.write(self.style.SUCCESS('Sin sobreventa.'))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Axolotl.exportacion import alias_lectura, directorio, exportar, formato_disponible
+
+
+class Command(BaseCommand):
+    help = 'Exporta pedidos, líneas de pedido, productos y artistas a archivos columnares por mes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todo', action='store_true',
+            help='Reescribir todas las particiones (por defecto sólo las nuevas o del mes en curso).',
+        )
+        parser.add_argument(
+            '--formato', choices=['parquet', 'npz'], default=None,
+            help='Formato de los archivos (por defecto Parquet si pyarrow está instalado).',
+        )
+        parser.add_argument(
+            '--database', default=None,
+            help='Base de la que leer (por defecto la primera réplica, o default si no hay).',
+        )
+
+    def handle(self, *args, **options):
+        alias = options['database'] or alias_lectura()
+        formato = options['formato'] or formato_disponible()
+        inicio = time.perf_counter()
+        try:
+            escritas = exportar(alias=alias, formato=formato, todo=options['todo'])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        for tabla, particion, filas in escritas:
+            self.stdout.write(f'  {tabla}/{particion}: {filas} filas')
+        self.stdout.write(
+            f'Particiones escritas: {len(escritas)} ({formato}, desde {alias}) en {directorio()} '
+            f'({time.perf_counter() - inicio:.2f}s)'
+        )
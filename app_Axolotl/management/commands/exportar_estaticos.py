@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from app_Axolotl.estaticos import (
+    ARCHIVO_PENDIENTES, directorio, iniciar_proceso, pagina, renderizar,
+    todas_las_paginas, tomar_pendientes,
+)
+
+
+class Command(BaseCommand):
+    help = 'Renderiza las páginas públicas del catálogo a HTML estático para servirlas con nginx.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todo', action='store_true',
+            help='Regenerar todas las páginas (por defecto sólo las marcadas como pendientes).',
+        )
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help='Procesos en paralelo.',
+        )
+
+    def handle(self, *args, **options):
+        destino = directorio()
+        if options['todo'] or not destino.is_dir():
+            claves = todas_las_paginas()
+        else:
+            claves = tomar_pendientes()
+        if not claves:
+            self.stdout.write('No hay páginas pendientes.')
+            return
+        destino.mkdir(parents=True, exist_ok=True)
+
+        claves = sorted(claves)
+        if options['procesos'] > 1 and len(claves) > 1:
+            # Las conexiones abiertas no se pueden compartir con los procesos hijos
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['procesos'], initializer=iniciar_proceso) as pool:
+                resultados = list(pool.map(renderizar, claves, chunksize=8))
+        else:
+            resultados = [renderizar(clave) for clave in claves]
+
+        if options['todo']:
+            self._limpiar_huerfanas(destino, claves)
+
+        borradas = sum(1 for _, estado in resultados if estado == 'borrada')
+        self.stdout.write(f'Páginas generadas: {len(resultados) - borradas}, eliminadas: {borradas} en {destino}')
+
+    def _limpiar_huerfanas(self, destino, claves):
+        # Páginas de artistas que ya no existen o cambiaron de nombre
+        vigentes = {destino / pagina(clave)[1] for clave in claves}
+        for raiz, _, archivos in os.walk(destino):
+            for nombre in archivos:
+                ruta = destino.joinpath(raiz, nombre)
+                pagina_html = ruta.with_suffix('') if ruta.suffix == '.gz' else ruta
+                if pagina_html.suffix == '.html' and pagina_html not in vigentes and nombre != ARCHIVO_PENDIENTES:
+                    ruta.unlink()
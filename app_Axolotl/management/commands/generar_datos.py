@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Axolotl.datos_sinteticos import CLAVE_SINTETICA, generar, np
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera artistas, productos, usuarios, carritos y pedidos sintéticos en volumen '
+        '(deterministas a partir de --semilla) para medir con datos de tamaño real.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--artistas', type=int, default=500)
+        parser.add_argument('--productos', type=int, default=5000)
+        parser.add_argument('--usuarios', type=int, default=2000)
+        parser.add_argument('--pedidos', type=int, default=20000)
+        parser.add_argument(
+            '--lineas-media', type=float, default=2.5,
+            help='Promedio de líneas por pedido (400.000 pedidos con 2.5 dan ~1.000.000 de líneas).',
+        )
+        parser.add_argument(
+            '--carritos', type=float, default=0.2,
+            help='Fracción de usuarios con un carrito abierto.',
+        )
+        parser.add_argument(
+            '--dias', type=int, default=730,
+            help='Los pedidos se reparten en los últimos N días.',
+        )
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=5000, help='Objetos por bulk_create.')
+        parser.add_argument(
+            '--forzar', action='store_true',
+            help='Permitir correrlo con DEBUG = False.',
+        )
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('Este comando necesita numpy: pip install numpy')
+        if not settings.DEBUG and not options['forzar']:
+            raise CommandError('DEBUG está apagado: ¿es la base de producción? Usa --forzar si no lo es.')
+
+        inicio = time.perf_counter()
+
+        def avisar(texto):
+            self.stdout.write(f'  {texto} ({time.perf_counter() - inicio:.1f}s)')
+
+        try:
+            creadas = generar(
+                artistas=options['artistas'], productos=options['productos'],
+                usuarios=options['usuarios'], pedidos=options['pedidos'],
+                lineas_media=options['lineas_media'], carritos=options['carritos'],
+                dias=options['dias'], semilla=options['semilla'], lote=options['lote'],
+                avisar=avisar,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f'Filas creadas: {sum(creadas.values())} en {time.perf_counter() - inicio:.1f}s. '
+            f'Los usuarios entran con la contraseña "{CLAVE_SINTETICA}".'
+        )
+        self.stdout.write(
+            'Para poner al día lo derivado: actualizar_mas_vendidos --reconstruir, '
+            'generar_instantanea --forzar, generar_sitemap --todo.'
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Axolotl.instantanea import directorio, generar
+
+
+class Command(BaseCommand):
+    help = 'Escribe la instantánea del catálogo que los workers leen con mmap (si el catálogo cambió).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=int, default=0,
+            help='Revisar cada N segundos (0 = una sola pasada).',
+        )
+        parser.add_argument(
+            '--forzar', action='store_true',
+            help='Escribir una generación nueva aunque el catálogo no haya cambiado.',
+        )
+
+    def handle(self, *args, **options):
+        forzar = options['forzar']
+        while True:
+            inicio = time.perf_counter()
+            try:
+                generacion = generar(forzar=forzar)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            if generacion is None:
+                self.stdout.write('El catálogo no cambió.')
+            else:
+                self.stdout.write(
+                    f'Generación {generacion} escrita en {directorio()} ({time.perf_counter() - inicio:.2f}s)'
+                )
+            if not options['cada']:
+                break
+            forzar = False
+            time.sleep(options['cada'])
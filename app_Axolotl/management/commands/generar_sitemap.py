@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app_Axolotl.mapa_sitio import actualizar, directorio
+
+
+class Command(BaseCommand):
+    help = 'Reescribe los bloques del sitemap y del feed de productos que cambiaron.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default=getattr(settings, 'SITIO_URL', ''),
+            help='Raíz pública del sitio, p. ej. https://axolotlmusic.com (por defecto SITIO_URL).',
+        )
+        parser.add_argument(
+            '--todo', action='store_true',
+            help='Reescribir todos los bloques aunque su firma no haya cambiado.',
+        )
+
+    def handle(self, *args, **options):
+        base = options['url'].rstrip('/')
+        if not base:
+            raise CommandError('Falta la URL del sitio: usar --url o definir SITIO_URL.')
+        inicio = time.perf_counter()
+        escritos, borrados = actualizar(base, todo=options['todo'])
+        self.stdout.write(
+            f'Bloques escritos: {escritos}, borrados: {borrados} en {directorio()} '
+            f'({time.perf_counter() - inicio:.2f}s)'
+        )
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from app_Axolotl.compresion import codificaciones_disponibles, comprimir, minificar_html
+from app_Axolotl.models import Artista, Producto
+
+
+class Command(BaseCommand):
+    help = 'Mide bytes enviados y CPU de minificar/comprimir cada página de la tienda.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--url', action='append', default=[], help='URL extra a medir (se puede repetir).')
+
+    def _urls(self):
+        urls = [
+            reverse('index_frontend'),
+            reverse('catalogo_frontend'),
+            reverse('genero_frontend'),
+            reverse('tipo_frontend'),
+            reverse('lista_frontend'),
+            reverse('novedades_frontend'),
+            reverse('artistas_frontend'),
+            reverse('ver_carrito'),
+            reverse('estado_visitante'),
+        ]
+        genero = Producto.objects.values_list('genero', flat=True).first()
+        if genero:
+            urls.append(f"{reverse('genero_frontend')}?genero={genero}")
+        artista_id = Artista.objects.values_list('id', flat=True).first()
+        if artista_id:
+            urls.append(reverse('artista_detalle', args=[artista_id]))
+            urls.append(reverse('comprar_artista', args=[artista_id]))
+        return urls
+
+    def _cpu_ms(self, funcion, repeticiones):
+        inicio = time.process_time()
+        for _ in range(repeticiones):
+            resultado = funcion()
+        return resultado, (time.process_time() - inicio) * 1000 / repeticiones
+
+    def handle(self, *args, **options):
+        repeticiones = options['repeticiones']
+        codificaciones = codificaciones_disponibles()
+        client = Client()
+        producto = Producto.objects.values_list('id', flat=True).first()
+
+        encabezado = f"{'URL':<40} {'original':>9} {'minif.':>9} {'ms':>6}"
+        for codificacion in codificaciones:
+            encabezado += f" {codificacion:>9} {'ms':>6}"
+        self.stdout.write(encabezado)
+
+        # Respuesta sin minificar ni comprimir, tal como sale de la vista
+        with override_settings(ALLOWED_HOSTS=['testserver'], MINIFICAR_HTML=False):
+            if producto:
+                # Carrito de visitante con un producto, para que no salga vacío
+                client.post(reverse('add_to_cart', args=[producto]), {'cantidad': 1})
+            for url in self._urls() + options['url']:
+                response = client.get(url, HTTP_ACCEPT_ENCODING='identity')
+                if response.status_code != 200 or response.streaming:
+                    self.stdout.write(f'{url:<40} (omitida: {response.status_code})')
+                    continue
+                original = response.content
+                fila = f'{url[:40]:<40} {len(original):>9}'
+                if response['Content-Type'].startswith('text/html'):
+                    html = original.decode(response.charset)
+                    minificado, ms = self._cpu_ms(lambda: minificar_html(html), repeticiones)
+                    cuerpo = minificado.encode(response.charset)
+                    fila += f' {len(cuerpo):>9} {ms:>6.2f}'
+                else:
+                    cuerpo = original
+                    fila += f" {'-':>9} {'-':>6}"
+                for codificacion in codificaciones:
+                    comprimido, ms = self._cpu_ms(lambda: comprimir(cuerpo, codificacion), repeticiones)
+                    fila += f' {len(comprimido):>9} {ms:>6.2f}'
+                self.stdout.write(fila)
@@ -0,0 +1,41 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Copia la base primaria (SQLite) sobre las réplicas de solo lectura.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada', type=int, default=0,
+            help='Repetir cada N segundos (0 = una sola pasada).',
+        )
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No hay réplicas configuradas (variable AXOLOTL_REPLICAS).')
+        primaria = connections['default']
+        if primaria.vendor != 'sqlite':
+            raise CommandError('La copia local sólo sirve para SQLite; usa la replicación del motor.')
+
+        cada = options['cada']
+        while True:
+            primaria.ensure_connection()
+            for alias in replicas:
+                # La API de backup de SQLite copia página por página de forma consistente
+                # aunque la primaria siga recibiendo escrituras.
+                connections[alias].close()
+                destino = sqlite3.connect(settings.DATABASES[alias]['NAME'])
+                try:
+                    primaria.connection.backup(destino)
+                finally:
+                    destino.close()
+                self.stdout.write(f'Réplica {alias} sincronizada')
+            if not cada:
+                break
+            time.sleep(cada)
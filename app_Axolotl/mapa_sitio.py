@@ -0,0 +1,372 @@
+"""Sitemap y feed de productos generados por bloques y guardados en disco.
+
+Buscadores y comparadores de precios necesitan la lista completa de URLs de
+productos y artistas; recorrer las páginas de la tienda para armarla les
+cuesta mucho tiempo de los workers. En su lugar se publican:
+
+- `sitemap.xml`: índice con un sitemap por bloque (`sitemap-productos-3.xml`,
+  `sitemap-artistas-0.xml`).
+- `feed/productos.csv` y `feed/productos.xml`: el catálogo con precio y
+  disponibilidad, que se arma enviando los bloques de productos uno detrás de
+  otro.
+
+Los bloques son rangos fijos de `SITEMAP_BLOQUE` ids, así un producto nuevo o
+borrado sólo cambia su bloque. La firma de cada bloque (cantidad de filas y
+último `actualizado`, también el de los artistas relacionados) sale de una
+consulta agrupada por fuente; sólo se vuelven a escribir los bloques cuya firma
+cambió, leyendo las filas con `.iterator()`. Las vistas sirven los archivos y,
+si la última revisión tiene más de `SITEMAP_VIGENCIA` segundos, revisan las
+firmas antes; `python manage.py generar_sitemap` hace lo mismo desde cron.
+Una sola actualización corre a la vez (lock de archivo); si una vista la
+encuentra en curso sirve los archivos que ya hay en lugar de esperar.
+
+La disponibilidad del feed sale de `Producto.stock`, la cifra materializada:
+se pone al día al compactar los movimientos (`compactar_stock`).
+"""
+import csv
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, F, Max
+from django.urls import reverse
+
+from .models import Artista, Producto
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+ARCHIVO_ESTADO = 'estado.json'
+ARCHIVO_LOCK = '.actualizar.lock'
+INDICE = 'sitemap.xml'
+FUENTES = ('productos', 'artistas')
+FORMATOS_FEED = ('csv', 'xml')
+COLUMNAS_FEED = (
+    'id', 'titulo', 'artista', 'genero', 'tipo', 'precio', 'disponibilidad', 'url', 'imagen', 'actualizado',
+)
+NS_SITEMAP = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+LECTURA = 64 * 1024
+MARCA_ID = 987654321
+
+
+def directorio():
+    return Path(getattr(settings, 'SITEMAP_ROOT', settings.BASE_DIR / 'sitemap'))
+
+
+def tamano_bloque():
+    return getattr(settings, 'SITEMAP_BLOQUE', 5000)
+
+
+def url_base(request):
+    """Raíz absoluta de las URLs publicadas: `SITIO_URL` o el host del request."""
+    return (getattr(settings, 'SITIO_URL', '') or request.build_absolute_uri('/')).rstrip('/')
+
+
+def _fecha(valor):
+    return valor.isoformat(timespec='seconds') if valor else ''
+
+
+def _marca(valor):
+    # En la firma van los microsegundos: dos cambios en el mismo segundo deben notarse
+    return valor.isoformat() if valor else ''
+
+
+def _ultima(*fechas):
+    return max((f for f in fechas if f), default=None)
+
+
+def nombre_sitemap(fuente, bloque):
+    return f'sitemap-{fuente}-{bloque}.xml'
+
+
+def nombre_feed(formato, bloque):
+    return f'feed-productos-{bloque}.{formato}'
+
+
+def _archivos(fuente, bloque):
+    nombres = [nombre_sitemap(fuente, bloque)]
+    if fuente == 'productos':
+        nombres += [nombre_feed(formato, bloque) for formato in FORMATOS_FEED]
+    return [directorio() / nombre for nombre in nombres]
+
+
+# ----------------------
+# Firmas por bloque
+# ----------------------
+def _firmas(tamano):
+    """Devuelve {fuente: {bloque: (firma, lastmod)}} con una consulta por fuente."""
+    productos = (
+        Producto.objects.annotate(bloque=F('id') / tamano)
+        .values('bloque')
+        .annotate(filas=Count('id'), ultimo=Max('actualizado'), ultimo_artista=Max('artista__actualizado'))
+        .order_by('bloque')
+    )
+    artistas = (
+        Artista.objects.annotate(bloque=F('id') / tamano)
+        .values('bloque')
+        .annotate(
+            filas=Count('id', distinct=True), con_productos=Count('productos'),
+            ultimo=Max('actualizado'), ultimo_producto=Max('productos__actualizado'),
+        )
+        .order_by('bloque')
+    )
+    firmas = {fuente: {} for fuente in FUENTES}
+    for fila in productos:
+        firma = f"{fila['filas']}|{_marca(fila['ultimo'])}|{_marca(fila['ultimo_artista'])}"
+        firmas['productos'][fila['bloque']] = (firma, _fecha(_ultima(fila['ultimo'], fila['ultimo_artista'])))
+    for fila in artistas:
+        firma = f"{fila['filas']}|{fila['con_productos']}|{_marca(fila['ultimo'])}|{_marca(fila['ultimo_producto'])}"
+        firmas['artistas'][fila['bloque']] = (firma, _fecha(_ultima(fila['ultimo'], fila['ultimo_producto'])))
+    return firmas
+
+
+# ----------------------
+# Escritura de bloques
+# ----------------------
+class _Escritura:
+    """Archivo temporal que reemplaza al definitivo sólo si se escribió completo."""
+
+    def __init__(self, ruta, **opciones):
+        self.ruta = ruta
+        # Un temporal propio por escritura: dos escritores nunca comparten archivo
+        fd, nombre = tempfile.mkstemp(dir=ruta.parent, prefix=f'.{ruta.name}.', suffix='.tmp')
+        self.temporal = Path(nombre)
+        self.archivo = os.fdopen(fd, 'w', encoding='utf-8', **opciones)
+
+    def __enter__(self):
+        return self.archivo
+
+    def __exit__(self, tipo, *_):
+        self.archivo.close()
+        if tipo is None:
+            os.chmod(self.temporal, 0o644)  # mkstemp lo crea sólo legible por el dueño
+            os.replace(self.temporal, self.ruta)
+        else:
+            self.temporal.unlink(missing_ok=True)
+
+
+def _url_sitemap(loc, lastmod):
+    return f'<url><loc>{escape(loc)}</loc><lastmod>{lastmod}</lastmod></url>\n'
+
+
+def _urls(base, nombre):
+    """Función id -> URL absoluta con un solo reverse() por bloque, no uno por fila."""
+    prefijo, _, sufijo = reverse(nombre, args=[MARCA_ID]).partition(str(MARCA_ID))
+    return lambda objeto_id: f'{base}{prefijo}{objeto_id}{sufijo}'
+
+
+def _escribir_productos(bloque, tamano, base):
+    # Tuplas en lugar de instancias: en bloques de miles de filas es la mitad del tiempo
+    productos = (
+        Producto.objects.filter(id__gte=bloque * tamano, id__lt=(bloque + 1) * tamano)
+        .values_list(
+            'id', 'nombre_producto', 'artista__nombre_artista', 'genero', 'tipo', 'precio', 'stock', 'img',
+            'actualizado', 'artista__actualizado',
+        )
+        .order_by('id')
+    )
+    url_producto = _urls(base, 'finalizar_producto')
+    destino = directorio()
+    with (
+        _Escritura(destino / nombre_sitemap('productos', bloque)) as sitemap,
+        _Escritura(destino / nombre_feed('csv', bloque), newline='') as feed_csv,
+        _Escritura(destino / nombre_feed('xml', bloque)) as feed_xml,
+    ):
+        sitemap.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{NS_SITEMAP}">\n')
+        filas_csv = csv.writer(feed_csv)
+        for producto_id, nombre, artista, genero, tipo, precio, stock, img, cambio, cambio_artista in (
+            productos.iterator(chunk_size=1000)
+        ):
+            url = url_producto(producto_id)
+            actualizado = _fecha(_ultima(cambio, cambio_artista))
+            sitemap.write(_url_sitemap(url, actualizado))
+            valores = (
+                producto_id, nombre, artista, genero, tipo, precio,
+                'en_stock' if stock > 0 else 'agotado',
+                url,
+                base + default_storage.url(img) if img else '',
+                actualizado,
+            )
+            filas_csv.writerow(valores)
+            campos = ''.join(f'<{c}>{escape(str(v))}</{c}>' for c, v in zip(COLUMNAS_FEED[1:], valores[1:]))
+            feed_xml.write(f'<producto id="{producto_id}">{campos}</producto>\n')
+        sitemap.write('</urlset>\n')
+
+
+def _escribir_artistas(bloque, tamano, base):
+    artistas = (
+        Artista.objects.filter(id__gte=bloque * tamano, id__lt=(bloque + 1) * tamano)
+        .annotate(ultimo_producto=Max('productos__actualizado'))
+        .values_list('id', 'actualizado', 'ultimo_producto')
+        .order_by('id')
+    )
+    url_artista = _urls(base, 'artista_detalle')
+    url_comprar = _urls(base, 'comprar_artista')
+    with _Escritura(directorio() / nombre_sitemap('artistas', bloque)) as sitemap:
+        sitemap.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{NS_SITEMAP}">\n')
+        for artista_id, cambio, cambio_producto in artistas.iterator(chunk_size=1000):
+            lastmod = _fecha(_ultima(cambio, cambio_producto))
+            sitemap.write(_url_sitemap(url_artista(artista_id), lastmod))
+            sitemap.write(_url_sitemap(url_comprar(artista_id), lastmod))
+        sitemap.write('</urlset>\n')
+
+
+ESCRITORES = {'productos': _escribir_productos, 'artistas': _escribir_artistas}
+
+
+def _escribir_indice(bloques, base):
+    with _Escritura(directorio() / INDICE) as indice:
+        indice.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{NS_SITEMAP}">\n')
+        for fuente in FUENTES:
+            for bloque, (_, lastmod) in sorted(bloques[fuente].items()):
+                loc = base + reverse('sitemap_bloque', args=[fuente, bloque])
+                indice.write(f'<sitemap><loc>{escape(loc)}</loc><lastmod>{lastmod}</lastmod></sitemap>\n')
+        indice.write('</sitemapindex>\n')
+
+
+# ----------------------
+# Estado y actualización
+# ----------------------
+def leer_estado():
+    try:
+        return json.loads((directorio() / ARCHIVO_ESTADO).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def _tomar_lock(archivo, esperar):
+    if fcntl is not None:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | (0 if esperar else fcntl.LOCK_NB))
+        return
+    while True:  # pragma: no cover - Windows
+        try:
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            if not esperar:
+                raise BlockingIOError
+            time.sleep(0.1)
+
+
+@contextmanager
+def _exclusivo(esperar=True):
+    """Lock entre procesos e hilos sobre `ARCHIVO_LOCK`; sin esperar da False si está tomado."""
+    destino = directorio()
+    destino.mkdir(parents=True, exist_ok=True)
+    # El SO suelta el lock al cerrar el archivo, también si el proceso muere
+    with open(destino / ARCHIVO_LOCK, 'a+b') as archivo:
+        try:
+            _tomar_lock(archivo, esperar)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def actualizar(base, todo=False, esperar=True):
+    """Reescribe los bloques cuya firma cambió y el índice. Devuelve (escritos, borrados).
+
+    Con `esperar=False`, si otra actualización está en curso no hace nada y
+    devuelve None.
+    """
+    with _exclusivo(esperar) as tomado:
+        if not tomado:
+            return None
+        return _actualizar(base, todo)
+
+
+def _actualizar(base, todo):
+    destino = directorio()
+    tamano = tamano_bloque()
+    estado = leer_estado()
+    if todo or estado.get('url') != base or estado.get('bloque') != tamano:
+        estado = {}
+    # En JSON las claves de los bloques son texto
+    anteriores = {
+        fuente: {int(b): tuple(v) for b, v in estado.get('bloques', {}).get(fuente, {}).items()}
+        for fuente in FUENTES
+    }
+
+    firmas = _firmas(tamano)
+    escritos = borrados = 0
+    for fuente in FUENTES:
+        for bloque, (firma, _) in firmas[fuente].items():
+            previo = anteriores[fuente].get(bloque)
+            if previo is None or previo[0] != firma or not all(a.exists() for a in _archivos(fuente, bloque)):
+                ESCRITORES[fuente](bloque, tamano, base)
+                escritos += 1
+        for bloque in anteriores[fuente].keys() - firmas[fuente].keys():
+            for archivo in _archivos(fuente, bloque):
+                archivo.unlink(missing_ok=True)
+            borrados += 1
+
+    if escritos or borrados or not (destino / INDICE).exists():
+        _escribir_indice(firmas, base)
+    nuevo = {
+        'url': base,
+        'bloque': tamano,
+        'bloques': {fuente: {str(b): list(v) for b, v in firmas[fuente].items()} for fuente in FUENTES},
+    }
+    # Reescribirlo siempre: su fecha es la de la última revisión (ver `vencido`)
+    with _Escritura(destino / ARCHIVO_ESTADO) as archivo:
+        json.dump(nuevo, archivo)
+    return escritos, borrados
+
+
+def vencido():
+    try:
+        revisado = (directorio() / ARCHIVO_ESTADO).stat().st_mtime
+    except OSError:
+        return True
+    return time.time() - revisado > getattr(settings, 'SITEMAP_VIGENCIA', 300)
+
+
+def revisar(request):
+    """Llamado por las vistas antes de servir: actualiza si la última revisión es vieja.
+
+    Si ya hay otra actualización en curso se sirven los archivos actuales; sólo
+    se la espera cuando todavía no existe el índice.
+    """
+    if vencido():
+        actualizar(url_base(request), esperar=not (directorio() / INDICE).exists())
+
+
+# ----------------------
+# Lectura para las vistas
+# ----------------------
+def ruta_sitemap(fuente, bloque):
+    """Ruta del sitemap del bloque o FileNotFoundError."""
+    ruta = directorio() / nombre_sitemap(fuente, bloque)
+    if fuente not in FUENTES or not ruta.is_file():
+        raise FileNotFoundError(ruta)
+    return ruta
+
+
+def partes_feed(formato):
+    """Contenido del feed completo: cabecera, los bloques de productos en orden y cierre."""
+    bloques = sorted(int(b) for b in leer_estado().get('bloques', {}).get('productos', {}))
+    if formato == 'csv':
+        yield (','.join(COLUMNAS_FEED) + '\r\n').encode('utf-8')
+    else:
+        yield b'<?xml version="1.0" encoding="UTF-8"?>\n<productos>\n'
+    for bloque in bloques:
+        try:
+            archivo = open(directorio() / nombre_feed(formato, bloque), 'rb')
+        except FileNotFoundError:
+            # Bloque borrado por otra actualización mientras se enviaba
+            continue
+        with archivo:
+            while parte := archivo.read(LECTURA):
+                yield parte
+    if formato == 'xml':
+        yield b'</productos>\n'
@@ -0,0 +1,157 @@
+"""Rankings de más vendidos mantenidos de forma incremental.
+
+Ordenar por ventas en cada visita obligaría a agregar todo `DetallePedido`.
+En cambio `python manage.py actualizar_mas_vendidos` (programado, p. ej. cada
+5 minutos):
+
+1. Suma a `VentaDiaria` (unidades por producto y día) sólo las líneas de
+   pedido nuevas, las de id mayor al guardado en `AvanceProceso`. Con SQLite
+   las escrituras van de a una, así que los ids llegan en orden y ninguna
+   línea queda atrás de la marca.
+2. Borra los días que ya salieron de la ventana más larga y vuelve a armar
+   `RankingVentas`: los `MAS_VENDIDOS_TAMANO` primeros de cada ventana
+   (`MAS_VENDIDOS_VENTANAS`, 7 y 30 días), en general, por género y por tipo.
+   Se calcula sobre `VentaDiaria`, que tiene a lo sumo productos × días filas.
+
+Las páginas leen el ranking ya ordenado con una consulta sobre el índice de
+(ventana, alcance, clave, posición). Las líneas que se editan o borran después
+de sumadas no se restan: `--reconstruir` vuelve a sumar la ventana completa.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AvanceProceso, DetallePedido, Producto, RankingVentas, VentaDiaria
+
+PROCESO = 'mas_vendidos'
+
+
+def ventanas():
+    return tuple(getattr(settings, 'MAS_VENDIDOS_VENTANAS', (7, 30)))
+
+
+def tamano():
+    return getattr(settings, 'MAS_VENDIDOS_TAMANO', 12)
+
+
+def _primer_dia(ventana, hoy=None):
+    return (hoy or timezone.localdate()) - timedelta(days=ventana - 1)
+
+
+def _inicio(dia):
+    inicio = datetime.combine(dia, time.min)
+    return timezone.make_aware(inicio) if settings.USE_TZ else inicio
+
+
+# ----------------------
+# Lectura para las páginas
+# ----------------------
+def ranking(ventana, alcance=RankingVentas.ALCANCE_GENERAL, clave=''):
+    return (
+        RankingVentas.objects.filter(ventana=ventana, alcance=alcance, clave=clave)
+        .select_related('producto__artista')
+        .order_by('posicion')
+    )
+
+
+# ----------------------
+# Actualización
+# ----------------------
+def sumar_ventas_nuevas():
+    """Suma a `VentaDiaria` las líneas de pedido posteriores a la marca. Devuelve cuántas."""
+    with transaction.atomic():
+        avance, _ = AvanceProceso.objects.get_or_create(nombre=PROCESO)
+        nuevas = DetallePedido.objects.filter(id__gt=avance.ultimo_id)
+        hasta = nuevas.aggregate(maximo=Max('id'))['maximo']
+        if hasta is None:
+            return 0
+        nuevas = nuevas.filter(id__lte=hasta)
+        cantidad = nuevas.count()
+
+        # Las líneas más viejas que la ventana más larga no cuentan para nada
+        por_dia = (
+            nuevas.filter(fecha__gte=_inicio(_primer_dia(max(ventanas()))))
+            .annotate(dia=TruncDate('fecha'))
+            .values('producto_id', 'dia')
+            .annotate(unidades=Sum('cantidad_producto'))
+            .order_by()
+        )
+        sumas = {(fila['producto_id'], fila['dia']): fila['unidades'] for fila in por_dia}
+        if sumas:
+            guardadas = VentaDiaria.objects.filter(
+                producto_id__in={producto for producto, _ in sumas},
+                dia__in={dia for _, dia in sumas},
+            )
+            for venta in guardadas:
+                clave = (venta.producto_id, venta.dia)
+                if clave in sumas:
+                    sumas[clave] += venta.unidades
+            VentaDiaria.objects.bulk_create(
+                [VentaDiaria(producto_id=p, dia=d, unidades=u) for (p, d), u in sumas.items()],
+                update_conflicts=True,
+                unique_fields=['producto', 'dia'],
+                update_fields=['unidades'],
+                batch_size=500,
+            )
+        avance.ultimo_id = hasta
+        avance.save(update_fields=['ultimo_id', 'actualizado'])
+    return cantidad
+
+
+def recalcular_rankings():
+    """Rehace `RankingVentas` a partir de `VentaDiaria`. Devuelve las filas guardadas."""
+    hoy = timezone.localdate()
+    limite = tamano()
+    ahora = timezone.now()
+    filas = []
+    for ventana in ventanas():
+        vendidos = (
+            VentaDiaria.objects.filter(dia__gte=_primer_dia(ventana, hoy))
+            .values('producto_id', 'producto__genero', 'producto__tipo')
+            .annotate(total=Sum('unidades'))
+            .order_by('-total', 'producto_id')
+        )
+        grupos = defaultdict(list)
+        for fila in vendidos:
+            claves = [
+                (RankingVentas.ALCANCE_GENERAL, ''),
+                (RankingVentas.ALCANCE_GENERO, fila['producto__genero']),
+                (RankingVentas.ALCANCE_TIPO, fila['producto__tipo']),
+            ]
+            for clave in claves:
+                if len(grupos[clave]) < limite:
+                    grupos[clave].append(fila)
+        for (alcance, clave), productos in grupos.items():
+            filas.extend(
+                RankingVentas(
+                    ventana=ventana, alcance=alcance, clave=clave, posicion=posicion,
+                    producto_id=fila['producto_id'], unidades=fila['total'], calculado=ahora,
+                )
+                for posicion, fila in enumerate(productos, 1)
+            )
+    with transaction.atomic():
+        VentaDiaria.objects.filter(dia__lt=_primer_dia(max(ventanas()), hoy)).delete()
+        RankingVentas.objects.all().delete()
+        RankingVentas.objects.bulk_create(filas, batch_size=500)
+    return len(filas)
+
+
+def reconstruir():
+    """Olvida lo sumado y vuelve a leer todas las líneas dentro de la ventana."""
+    with transaction.atomic():
+        VentaDiaria.objects.all().delete()
+        AvanceProceso.objects.filter(nombre=PROCESO).update(ultimo_id=0)
+
+
+def paginas_afectadas():
+    """Páginas estáticas que muestran rankings (ver estaticos.py)."""
+    return (
+        {'genero:', 'tipo:'}
+        | {f'genero:{genero}' for genero, _ in Producto.GENEROS_CHOICES}
+        | {f'tipo:{tipo}' for tipo, _ in Producto.TIPO_CHOICES}
+    )
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Axolotl', '0003_alter_producto_genero_alter_producto_tipo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('reabastecimiento', 'Reabastecimiento'), ('ajuste', 'Ajuste manual')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('compactado', models.BooleanField(default=False)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='app_Axolotl.pedido')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='app_Axolotl.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'compactado'], name='movimiento_pendiente_idx')],
+            },
+        ),
+    ]
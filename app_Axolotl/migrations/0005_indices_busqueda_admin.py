@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Axolotl', '0004_stockmovement'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='nombre_producto',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='usuario',
+            name='nombre',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
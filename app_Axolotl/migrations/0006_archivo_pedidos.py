@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Axolotl', '0005_indices_busqueda_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('cantidad_producto', models.PositiveIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('archivado_en', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_archivados', to='app_Axolotl.usuario')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DetallePedidoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('nombre_producto', models.CharField(max_length=100)),
+                ('cantidad_producto', models.PositiveIntegerField()),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('fecha', models.DateTimeField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('producto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='detalles_archivados', to='app_Axolotl.producto')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles_pedido_archivados', to='app_Axolotl.usuario')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='app_Axolotl.pedidoarchivado')),
+            ],
+        ),
+    ]
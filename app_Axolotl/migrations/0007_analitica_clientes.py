@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Axolotl', '0006_archivo_pedidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohorteMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohorte', models.DateField()),
+                ('meses', models.PositiveSmallIntegerField()),
+                ('clientes', models.PositiveIntegerField()),
+                ('calculado', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['cohorte', 'meses'],
+                'unique_together': {('cohorte', 'meses')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SegmentoCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recencia_dias', models.PositiveIntegerField()),
+                ('frecuencia', models.PositiveIntegerField()),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('puntaje_r', models.PositiveSmallIntegerField()),
+                ('puntaje_f', models.PositiveSmallIntegerField()),
+                ('puntaje_m', models.PositiveSmallIntegerField()),
+                ('segmento', models.CharField(choices=[('campeones', 'Campeones'), ('leales', 'Leales'), ('nuevos', 'Nuevos'), ('en_riesgo', 'En riesgo'), ('perdidos', 'Perdidos'), ('ocasionales', 'Ocasionales')], db_index=True, max_length=20)),
+                ('calculado', models.DateTimeField()),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='segmento', to='app_Axolotl.usuario')),
+            ],
+        ),
+    ]
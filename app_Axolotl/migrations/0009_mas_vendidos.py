@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Axolotl', '0008_indices_admin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvanceProceso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingVentas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ventana', models.PositiveSmallIntegerField()),
+                ('alcance', models.CharField(choices=[('general', 'General'), ('genero', 'Género'), ('tipo', 'Tipo')], max_length=10)),
+                ('clave', models.CharField(blank=True, max_length=50)),
+                ('posicion', models.PositiveSmallIntegerField()),
+                ('unidades', models.PositiveIntegerField()),
+                ('calculado', models.DateTimeField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app_Axolotl.producto')),
+            ],
+            options={
+                'ordering': ['ventana', 'alcance', 'clave', 'posicion'],
+                'unique_together': {('ventana', 'alcance', 'clave', 'posicion')},
+            },
+        ),
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(db_index=True)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='app_Axolotl.producto')),
+            ],
+            options={
+                'unique_together': {('producto', 'dia')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Axolotl', '0009_mas_vendidos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artista',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
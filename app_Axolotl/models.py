@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.functions import Lower
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
 
 # ======================
@@ -9,40 +10,67 @@ from django.dispatch import receiver
 class Usuario(models.Model):
     # Vincula el perfil con el User de Django para usar autenticación estándar
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
-    nombre = models.CharField(max_length=100, blank=True)
+    nombre = models.CharField(max_length=100, blank=True, db_index=True)
     email = models.EmailField(unique=True)
     tel = models.CharField(max_length=15, blank=True)
     direccion = models.CharField(max_length=200, blank=True)
     codigo_postal = models.IntegerField(blank=True, null=True)
     profile_image = models.ImageField(upload_to='profiles/', blank=True, null=True)
 
+    class Meta:
+        # Búsqueda por prefijo sin distinguir mayúsculas (ver views._prefijo)
+        indexes = [
+            models.Index(Lower('nombre'), name='usuario_nombre_min_idx'),
+            models.Index(Lower('email'), name='usuario_email_min_idx'),
+        ]
+
     def __str__(self):
         return self.user.username if self.user else self.nombre or self.email
 
 
+def _datos_perfil(user):
+    # Se lee de __dict__ para no disparar una consulta si el campo viene diferido
+    return (user.__dict__.get('username'), user.__dict__.get('email'))
+
+
+# Recordar username/email tal como se cargaron para saber si cambiaron al guardar
+@receiver(post_init, sender=User)
+def recordar_datos_perfil(sender, instance, **kwargs):
+    instance._datos_perfil = _datos_perfil(instance)
+
+
 # Crear/actualizar perfil automáticamente al crear User
 @receiver(post_save, sender=User)
-def create_or_update_usuario(sender, instance, created, **kwargs):
+def create_or_update_usuario(sender, instance, created, update_fields=None, **kwargs):
     if created:
         Usuario.objects.create(user=instance, email=instance.email, nombre=instance.username)
     else:
+        # Guardados que no tocan username/email (p. ej. last_login en cada login) no escriben el perfil
+        if update_fields is not None and not {'username', 'email'} & set(update_fields):
+            return
+        if _datos_perfil(instance) == instance._datos_perfil:
+            return
         # Actualizar email/nombre si ya existe perfil
-        try:
-            perfil = instance.usuario
-            perfil.email = instance.email
-            perfil.nombre = instance.username
-            perfil.save()
-        except Usuario.DoesNotExist:
+        actualizados = Usuario.objects.filter(user=instance).update(
+            email=instance.email, nombre=instance.username
+        )
+        if not actualizados:
             Usuario.objects.create(user=instance, email=instance.email, nombre=instance.username)
+        elif instance._state.fields_cache.get('usuario') is not None:
+            # Mantener al día el perfil ya cargado en memoria
+            instance.usuario.email = instance.email
+            instance.usuario.nombre = instance.username
+    instance._datos_perfil = _datos_perfil(instance)
 
 
 # ======================
 # MODELO ARTISTA
 # ======================
 class Artista(models.Model):
-    nombre_artista = models.CharField(max_length=100)
+    nombre_artista = models.CharField(max_length=100, db_index=True)
     descripcion = models.TextField()
     foto = models.ImageField(upload_to='artistas_fotos/', blank=True, null=True) # Nuevo campo
+    actualizado = models.DateTimeField(auto_now=True)  # lastmod del sitemap
 
     def __str__(self):
         return self.nombre_artista
@@ -76,7 +104,7 @@ class Producto(models.Model):
         Artista, on_delete=models.CASCADE, related_name='productos'
     )  # Relación 1-N (un artista puede tener muchos productos)
 
-    nombre_producto = models.CharField(max_length=100)
+    nombre_producto = models.CharField(max_length=100, db_index=True)
     genero = models.CharField(max_length=50, choices=GENEROS_CHOICES)
     tipo = models.CharField(max_length=50, choices=TIPO_CHOICES)
     descripcion = models.TextField()
@@ -84,6 +112,13 @@ class Producto(models.Model):
     precio = models.DecimalField(max_digits=8, decimal_places=2)
     novedad = models.BooleanField(default=False)
     img = models.ImageField(upload_to='productos_img/', blank=True, null=True) # Nuevo campo
+    # auto_now no se aplica en update(): los cambios masivos lo ponen a mano
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(Lower('nombre_producto'), name='producto_nombre_min_idx'),
+        ]
 
     def __str__(self):
         return f"{self.nombre_producto} - ${self.precio}"
@@ -99,7 +134,7 @@ class Pedido(models.Model):
 
     cantidad_producto = models.PositiveIntegerField()
     total = models.DecimalField(max_digits=10, decimal_places=2)
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"Pedido #{self.id} - {self.usuario.nombre}"
@@ -121,7 +156,7 @@ class DetallePedido(models.Model):
 
     cantidad_producto = models.PositiveIntegerField()
     precio = models.DecimalField(max_digits=8, decimal_places=2)
-    fecha = models.DateTimeField(auto_now_add=True)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
     total = models.DecimalField(max_digits=10, decimal_places=2)
 
     def __str__(self):
@@ -149,4 +184,186 @@ class CartItem(models.Model):
         return self.cantidad * self.producto.precio
 
     def __str__(self):
-        return f"{self.cantidad} x {self.producto.nombre_producto}"
\ No newline at end of file
+        return f"{self.cantidad} x {self.producto.nombre_producto}"
+
+# ======================
+# LIBRO DE MOVIMIENTOS DE STOCK
+# ======================
+class StockMovement(models.Model):
+    # Cada venta/reabastecimiento/ajuste se agrega como una fila nueva en lugar de
+    # reescribir Producto.stock. `Producto.stock` es la cifra materializada y se
+    # actualiza al compactar los movimientos pendientes (ver app_Axolotl/stock.py).
+    TIPO_VENTA = 'venta'
+    TIPO_REABASTECIMIENTO = 'reabastecimiento'
+    TIPO_AJUSTE = 'ajuste'
+    TIPO_CHOICES = [
+        (TIPO_VENTA, 'Venta'),
+        (TIPO_REABASTECIMIENTO, 'Reabastecimiento'),
+        (TIPO_AJUSTE, 'Ajuste manual'),
+    ]
+
+    producto = models.ForeignKey(
+        Producto, on_delete=models.CASCADE, related_name='movimientos'
+    )
+    pedido = models.ForeignKey(
+        Pedido, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos'
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    cantidad = models.IntegerField()  # negativo para ventas, positivo para entradas
+    compactado = models.BooleanField(default=False)
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'compactado'], name='movimiento_pendiente_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} - {self.producto.nombre_producto}"
+
+
+# ======================
+# ARCHIVO DE PEDIDOS
+# ======================
+# Los pedidos más viejos que settings.ARCHIVO_PEDIDOS_DIAS se mueven aquí con el
+# comando `archivar_pedidos`, así Pedido/DetallePedido solo crecen dentro de la
+# ventana de retención. Se conserva el id original para que los enlaces y
+# referencias (#pedido) sigan siendo válidos.
+class PedidoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(
+        Usuario, on_delete=models.CASCADE, related_name='pedidos_archivados'
+    )
+    cantidad_producto = models.PositiveIntegerField()
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+    fecha = models.DateTimeField(db_index=True)
+    archivado_en = models.DateTimeField(auto_now_add=True)
+
+    archivado = True
+
+    def __str__(self):
+        return f"Pedido archivado #{self.id} - {self.usuario.nombre}"
+
+
+class DetallePedidoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    pedido = models.ForeignKey(
+        PedidoArchivado, on_delete=models.CASCADE, related_name='detalles'
+    )
+    usuario = models.ForeignKey(
+        Usuario, on_delete=models.CASCADE, related_name='detalles_pedido_archivados'
+    )
+    # El producto puede borrarse del catálogo años después; el nombre queda copiado.
+    producto = models.ForeignKey(
+        Producto, on_delete=models.SET_NULL, null=True, blank=True, related_name='detalles_archivados'
+    )
+    nombre_producto = models.CharField(max_length=100)
+
+    cantidad_producto = models.PositiveIntegerField()
+    precio = models.DecimalField(max_digits=8, decimal_places=2)
+    fecha = models.DateTimeField(db_index=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2)
+
+    archivado = True
+
+    def __str__(self):
+        return f"Detalle archivado #{self.id} - {self.nombre_producto} ({self.cantidad_producto})"
+
+
+# ======================
+# ANALÍTICA DE CLIENTES
+# ======================
+# Resultados precalculados por `python manage.py calcular_segmentos`
+# (ver app_Axolotl/analitica.py); el panel sólo los lee.
+class SegmentoCliente(models.Model):
+    SEGMENTO_CHOICES = [
+        ('campeones', 'Campeones'),
+        ('leales', 'Leales'),
+        ('nuevos', 'Nuevos'),
+        ('en_riesgo', 'En riesgo'),
+        ('perdidos', 'Perdidos'),
+        ('ocasionales', 'Ocasionales'),
+    ]
+
+    usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='segmento')
+    recencia_dias = models.PositiveIntegerField()
+    frecuencia = models.PositiveIntegerField()
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+    puntaje_r = models.PositiveSmallIntegerField()
+    puntaje_f = models.PositiveSmallIntegerField()
+    puntaje_m = models.PositiveSmallIntegerField()
+    segmento = models.CharField(max_length=20, choices=SEGMENTO_CHOICES, db_index=True)
+    calculado = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.usuario} - {self.get_segmento_display()} (RFM {self.puntaje_r}{self.puntaje_f}{self.puntaje_m})"
+
+
+class CohorteMensual(models.Model):
+    # Clientes de la cohorte (mes de su primera compra) que volvieron a comprar `meses` después
+    cohorte = models.DateField()
+    meses = models.PositiveSmallIntegerField()
+    clientes = models.PositiveIntegerField()
+    calculado = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('cohorte', 'meses')
+        ordering = ['cohorte', 'meses']
+
+    def __str__(self):
+        return f"Cohorte {self.cohorte:%m/%Y} +{self.meses}: {self.clientes}"
+
+
+# ======================
+# MÁS VENDIDOS
+# ======================
+# Mantenidos por `python manage.py actualizar_mas_vendidos` (ver
+# app_Axolotl/mas_vendidos.py): las páginas sólo leen `RankingVentas`.
+class VentaDiaria(models.Model):
+    # Unidades vendidas por producto y día, sólo de los días que cubren las ventanas
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='ventas_diarias')
+    dia = models.DateField(db_index=True)
+    unidades = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('producto', 'dia')
+
+    def __str__(self):
+        return f"{self.dia:%d/%m/%Y} {self.producto_id}: {self.unidades}"
+
+
+class RankingVentas(models.Model):
+    ALCANCE_GENERAL = 'general'
+    ALCANCE_GENERO = 'genero'
+    ALCANCE_TIPO = 'tipo'
+    ALCANCE_CHOICES = [
+        (ALCANCE_GENERAL, 'General'),
+        (ALCANCE_GENERO, 'Género'),
+        (ALCANCE_TIPO, 'Tipo'),
+    ]
+
+    ventana = models.PositiveSmallIntegerField()  # días
+    alcance = models.CharField(max_length=10, choices=ALCANCE_CHOICES)
+    clave = models.CharField(max_length=50, blank=True)  # el género o tipo; vacío en el general
+    posicion = models.PositiveSmallIntegerField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    unidades = models.PositiveIntegerField()
+    calculado = models.DateTimeField()
+
+    class Meta:
+        # El índice de la restricción es el que usan las páginas
+        unique_together = ('ventana', 'alcance', 'clave', 'posicion')
+        ordering = ['ventana', 'alcance', 'clave', 'posicion']
+
+    def __str__(self):
+        return f"{self.alcance} {self.clave} {self.ventana}d #{self.posicion}: {self.producto_id}"
+
+
+class AvanceProceso(models.Model):
+    # Hasta qué id de una tabla llegó un proceso incremental
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_id}"
@@ -0,0 +1,292 @@
+"""Perfilador por muestreo para requests puntuales.
+
+Un usuario staff activa el perfil de un request con `?perfilar=1` o el header
+`X-Perfilar: 1`; además `PERFILADOR_MUESTREO` (0..1) perfila esa fracción del
+tráfico. Mientras corre la vista (y el render de sus plantillas) un hilo aparte
+toma la pila del hilo del request cada `PERFILADOR_INTERVALO` segundos con
+`sys._current_frames()`; no se instrumenta ninguna función, así que el costo
+no depende de cuántas llamadas haga la vista.
+
+Cada perfil se guarda en `PERFILES_ROOT` como pilas colapsadas
+(`a;b;c 12`, el formato de flamegraph.pl y speedscope) más un `.json` con la
+URL, el nombre de la ruta y la duración. Se ven en `admin_panel/perfiles/`.
+
+Con el modo apagado el middleware sólo lee el querystring y los headers.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import django
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils import timezone
+
+RAIZ_DJANGO = os.path.dirname(os.path.dirname(os.path.abspath(django.__file__)))
+
+
+def directorio():
+    return Path(getattr(settings, 'PERFILES_ROOT', settings.BASE_DIR / 'perfiles'))
+
+
+# ----------------------
+# Muestreo
+# ----------------------
+def _etiqueta(frame):
+    codigo = frame.f_code
+    if codigo.co_name == 'render_annotated':
+        # Nodo de plantilla: mostrar plantilla y línea en lugar de la función de Django
+        nodo = frame.f_locals.get('self')
+        origen = getattr(nodo, 'origin', None)
+        token = getattr(nodo, 'token', None)
+        if origen is not None and token is not None:
+            return f'{{% {origen.template_name}:{token.lineno} %}}'
+    archivo = codigo.co_filename
+    if archivo.startswith(str(settings.BASE_DIR)):
+        archivo = os.path.relpath(archivo, settings.BASE_DIR)
+    elif archivo.startswith(RAIZ_DJANGO):
+        archivo = os.path.relpath(archivo, RAIZ_DJANGO)
+    else:
+        archivo = os.path.basename(archivo)
+    return f'{codigo.co_name} ({archivo}:{codigo.co_firstlineno})'
+
+
+def _pila(frame, hasta):
+    pila = []
+    while frame is not None and frame is not hasta:
+        pila.append(_etiqueta(frame))
+        frame = frame.f_back
+    # ';' separa niveles en el formato colapsado
+    return ';'.join(reversed(pila)).replace('\n', ' ')
+
+
+_perfiles_activos = 0
+_cambio_lock = threading.Lock()
+_cambio_original = None
+
+
+def _acortar_cambio_de_hilo(intervalo):
+    # Con el GIL el hilo muestreador sólo corre cada `sys.getswitchinterval()`
+    # (5 ms por defecto); mientras haya un perfil activo se acorta al intervalo
+    global _perfiles_activos, _cambio_original
+    with _cambio_lock:
+        if _perfiles_activos == 0:
+            _cambio_original = sys.getswitchinterval()
+            sys.setswitchinterval(min(_cambio_original, intervalo / 5))
+        _perfiles_activos += 1
+
+
+def _restaurar_cambio_de_hilo():
+    global _perfiles_activos
+    with _cambio_lock:
+        _perfiles_activos -= 1
+        if _perfiles_activos == 0:
+            sys.setswitchinterval(_cambio_original)
+
+
+class Muestreador(threading.Thread):
+    """Cuenta las pilas del hilo `hilo_id` por debajo del frame `base`."""
+
+    def __init__(self, hilo_id, base, intervalo):
+        super().__init__(name='perfilador', daemon=True)
+        self.hilo_id = hilo_id
+        self.base = base
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            frame = sys._current_frames().get(self.hilo_id)
+            # Una muestra tomada después de `detener` ya no es del request
+            if frame is not None and not self._parar.is_set():
+                self.pilas[_pila(frame, self.base)] += 1
+
+    def detener(self):
+        self._parar.set()
+        self.join()
+        return self.pilas
+
+
+# ----------------------
+# Almacenamiento
+# ----------------------
+def guardar(request, pilas, duracion, intervalo):
+    destino = directorio()
+    destino.mkdir(parents=True, exist_ok=True)
+    match = request.resolver_match
+    nombre_ruta = match.url_name if match else ''
+    perfil_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{random.randrange(16**6):06x}"
+    (destino / f'{perfil_id}.folded').write_text(
+        ''.join(f'{pila} {n}\n' for pila, n in pilas.most_common() if pila),
+        encoding='utf-8',
+    )
+    datos = {
+        'id': perfil_id,
+        'url': request.get_full_path(),
+        'ruta': nombre_ruta,
+        'metodo': request.method,
+        'usuario': request.user.get_username() if request.user.is_authenticated else '',
+        'fecha': timezone.now().isoformat(),
+        'ms': round(duracion * 1000, 1),
+        'muestras': sum(pilas.values()),
+        'intervalo_ms': intervalo * 1000,
+    }
+    (destino / f'{perfil_id}.json').write_text(json.dumps(datos), encoding='utf-8')
+    _podar(destino)
+    return perfil_id
+
+
+def _podar(destino):
+    maximo = getattr(settings, 'PERFILES_MAX', 200)
+    viejos = sorted(destino.glob('*.json'))[:-maximo]
+    for meta in viejos:
+        meta.unlink(missing_ok=True)
+        meta.with_suffix('.folded').unlink(missing_ok=True)
+
+
+def listar():
+    perfiles = []
+    for meta in sorted(directorio().glob('*.json'), reverse=True):
+        try:
+            perfiles.append(json.loads(meta.read_text(encoding='utf-8')))
+        except (OSError, ValueError):
+            continue
+    return perfiles
+
+
+def _ruta_perfil(perfil_id, sufijo):
+    # El id viene de la URL: no permitir salir del directorio
+    if not perfil_id.replace('-', '').isalnum():
+        raise FileNotFoundError(perfil_id)
+    return directorio() / f'{perfil_id}{sufijo}'
+
+
+def cargar(perfil_id):
+    """Devuelve (metadatos, texto colapsado) o levanta FileNotFoundError."""
+    meta = json.loads(_ruta_perfil(perfil_id, '.json').read_text(encoding='utf-8'))
+    return meta, _ruta_perfil(perfil_id, '.folded').read_text(encoding='utf-8')
+
+
+# ----------------------
+# Lectura para el panel
+# ----------------------
+def leer_colapsado(texto):
+    for linea in texto.splitlines():
+        pila, _, n = linea.rpartition(' ')
+        if pila and n.isdigit():
+            yield pila.split(';'), int(n)
+
+
+def resumen_funciones(texto, limite=30):
+    """Funciones con más muestras propias (arriba de la pila) y totales."""
+    propias, totales = Counter(), Counter()
+    for marcos, n in leer_colapsado(texto):
+        propias[marcos[-1]] += n
+        for marco in set(marcos):
+            totales[marco] += n
+    return [
+        {'funcion': funcion, 'propias': n, 'totales': totales[funcion]}
+        for funcion, n in propias.most_common(limite)
+    ]
+
+
+def bloques_flamegraph(texto, minimo=0.005):
+    """Rectángulos (nivel, inicio %, ancho %, etiqueta, muestras) para dibujar la gráfica.
+
+    Se omiten los bloques de menos de `minimo` del total para que la página no pese.
+    """
+    arbol = {}
+    total = 0
+    for marcos, n in leer_colapsado(texto):
+        total += n
+        nodo = arbol
+        for marco in marcos:
+            hijo = nodo.setdefault(marco, [0, {}])
+            hijo[0] += n
+            nodo = hijo[1]
+    if not total:
+        return [], 0
+
+    bloques = []
+    pendientes = [(arbol, 0, 0.0)]
+    while pendientes:
+        nodo, nivel, inicio = pendientes.pop()
+        for etiqueta, (muestras, hijos) in sorted(nodo.items()):
+            ancho = muestras / total
+            if ancho >= minimo:
+                bloques.append({
+                    'nivel': nivel,
+                    'inicio': round(inicio * 100, 3),
+                    'ancho': round(ancho * 100, 3),
+                    'etiqueta': etiqueta,
+                    'muestras': muestras,
+                    'tipo': _tipo_marco(etiqueta),
+                })
+                pendientes.append((hijos, nivel + 1, inicio))
+            inicio += ancho
+    return bloques, max((b['nivel'] for b in bloques), default=-1) + 1
+
+
+def _tipo_marco(etiqueta):
+    if etiqueta.startswith('{%'):
+        return 'plantilla'
+    if 'app_Axolotl' in etiqueta:
+        return 'app'
+    return 'django' if '(django' in etiqueta else 'otro'
+
+
+# ----------------------
+# Middleware
+# ----------------------
+class PerfiladorMiddleware:
+    """Va después de AuthenticationMiddleware (necesita `request.user`).
+
+    Las vistas async (el stream de eventos) pasan sin perfilar: no hay un hilo
+    fijo al que tomarle la pila.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _activar(self, request):
+        pedido = request.GET.get('perfilar') == '1' or request.headers.get('X-Perfilar') == '1'
+        if pedido:
+            from .views import is_staff_user
+
+            return request.user.is_authenticated and is_staff_user(request.user)
+        muestreo = getattr(settings, 'PERFILADOR_MUESTREO', 0)
+        return bool(muestreo) and random.random() < muestreo
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        if not self._activar(request):
+            return self.get_response(request)
+
+        intervalo = getattr(settings, 'PERFILADOR_INTERVALO', 0.005)
+        muestreador = Muestreador(threading.get_ident(), sys._getframe(), intervalo)
+        _acortar_cambio_de_hilo(intervalo)
+        inicio = time.perf_counter()
+        muestreador.start()
+        try:
+            response = self.get_response(request)
+            if hasattr(response, 'render') and callable(response.render):
+                # TemplateResponse: que el render quede dentro del perfil
+                response.render()
+        finally:
+            pilas = muestreador.detener()
+            duracion = time.perf_counter() - inicio
+            _restaurar_cambio_de_hilo()
+        perfil_id = guardar(request, pilas, duracion, intervalo)
+        response['X-Perfil'] = perfil_id
+        return response
@@ -0,0 +1,260 @@
+"""Registro de consultas SQL agrupadas por huella.
+
+Los problemas de la tienda casi nunca son una consulta lenta sino miles de
+consultas chicas e iguales (N+1): `genero.html` leyendo `item.artista`,
+`perfil.html` recorriendo `p.detalles`, etc. Con `REGISTRO_SQL = True` el
+middleware envuelve las conexiones durante cada request
+(`connection.execute_wrapper`) y anota de cada consulta:
+
+- la huella: el SQL sin literales (`WHERE id = ?`, `IN (...)`), así todas las
+  consultas de un mismo bucle cuentan juntas;
+- el origen: la línea de plantilla (`genero.html:40`) o de código de la app
+  (`app_Axolotl/views.py:212 genero_frontend`) más cercana a la consulta;
+- la duración.
+
+Al terminar el request se suman a las estadísticas del proceso (cantidad,
+tiempo total y p95 por huella y por origen) y, si una misma huella se repitió
+`REGISTRO_SQL_NMAS1` veces o más en el request, queda marcada como N+1. Las
+consultas de más de `REGISTRO_SQL_LENTA` segundos se avisan en el log.
+
+Las estadísticas son por proceso y se pierden al reiniciar; se ven en
+`admin_panel/sql/` y se descargan como JSON con `?formato=json`. No se
+registran las consultas del escritor único (corren en su propio hilo) ni las
+de las vistas async.
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+RAIZ_APP = os.path.dirname(os.path.abspath(__file__))
+# Middlewares de la app: envuelven a todo el request, no son el origen de nada
+NO_ORIGEN = {
+    os.path.join(RAIZ_APP, nombre)
+    for nombre in ('registro_sql.py', 'perfilador.py', 'db_router.py', 'compresion.py')
+}
+
+MUESTRAS_P95 = 500
+
+_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_FILAS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_ESPACIOS = re.compile(r'\s+')
+
+
+# ----------------------
+# Huellas y orígenes
+# ----------------------
+@lru_cache(maxsize=4096)
+def huella(sql):
+    """SQL normalizado: sin literales ni parámetros y con las listas colapsadas."""
+    texto = _TEXTO.sub('?', sql)
+    texto = texto.replace('%s', '?')
+    texto = _NUMERO.sub('?', texto)
+    texto = _LISTA.sub('(...)', texto)
+    texto = _FILAS.sub('(...), ...', texto)
+    return _ESPACIOS.sub(' ', texto).strip()
+
+
+def id_huella(texto):
+    return hashlib.md5(texto.encode()).hexdigest()[:12]
+
+
+def _origen():
+    frame = sys._getframe(1)
+    while frame is not None:
+        codigo = frame.f_code
+        if codigo.co_name == 'render_annotated':
+            nodo = frame.f_locals.get('self')
+            origen = getattr(nodo, 'origin', None)
+            token = getattr(nodo, 'token', None)
+            if origen is not None and token is not None:
+                return f'{origen.template_name or origen.name}:{token.lineno}'
+        archivo = codigo.co_filename
+        if archivo.startswith(RAIZ_APP) and archivo not in NO_ORIGEN:
+            return f'{os.path.relpath(archivo, settings.BASE_DIR)}:{frame.f_lineno} {codigo.co_name}'
+        frame = frame.f_back
+    return '(django)'
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+# ----------------------
+# Estadísticas del proceso
+# ----------------------
+class _Acumulado:
+    __slots__ = ('n', 'total', 'tiempos', 'detalle')
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.tiempos = deque(maxlen=MUESTRAS_P95)
+        self.detalle = Counter()
+
+    def agregar(self, duracion, clave):
+        self.n += 1
+        self.total += duracion
+        self.tiempos.append(duracion)
+        self.detalle[clave] += 1
+
+    def resumen(self):
+        return {
+            'n': self.n,
+            'total_ms': round(self.total * 1000, 2),
+            'promedio_ms': round(self.total * 1000 / self.n, 3) if self.n else 0,
+            'p95_ms': round(_percentil(self.tiempos, 0.95) * 1000, 3),
+        }
+
+
+class Estadisticas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.desde = timezone.now()
+            self.requests = 0
+            self.por_huella = {}
+            self.por_origen = {}
+            self.rafagas = {}
+
+    def sumar(self, consultas, url):
+        """Suma las consultas [(huella, duración, origen)] de un request."""
+        umbral = getattr(settings, 'REGISTRO_SQL_NMAS1', 10)
+        repetidas = Counter(h for h, _, _ in consultas)
+        with self._lock:
+            self.requests += 1
+            for texto, duracion, origen in consultas:
+                self.por_huella.setdefault(texto, _Acumulado()).agregar(duracion, origen)
+                self.por_origen.setdefault(origen, _Acumulado()).agregar(duracion, texto)
+            for texto, veces in repetidas.items():
+                if veces < umbral:
+                    continue
+                origen = Counter(o for h, _, o in consultas if h == texto).most_common(1)[0][0]
+                rafaga = self.rafagas.setdefault(texto, {'requests': 0, 'max_repeticiones': 0})
+                rafaga['requests'] += 1
+                rafaga['max_repeticiones'] = max(rafaga['max_repeticiones'], veces)
+                rafaga.update(origen=origen, ultima_url=url, ultima_fecha=timezone.now().isoformat())
+                logger.warning('Posible N+1: %d consultas iguales desde %s en %s: %s', veces, origen, url, texto)
+
+    def reporte(self, limite=50):
+        with self._lock:
+            huellas = sorted(self.por_huella.items(), key=lambda par: par[1].total, reverse=True)
+            origenes = sorted(self.por_origen.items(), key=lambda par: par[1].total, reverse=True)
+            return {
+                'desde': self.desde.isoformat(),
+                'requests': self.requests,
+                'consultas': sum(a.n for a in self.por_huella.values()),
+                'huellas': [
+                    {
+                        'id': id_huella(texto),
+                        'sql': texto,
+                        **acumulado.resumen(),
+                        'origenes': acumulado.detalle.most_common(5),
+                    }
+                    for texto, acumulado in huellas[:limite]
+                ],
+                'origenes': [
+                    {
+                        'origen': origen,
+                        **acumulado.resumen(),
+                        'huellas': [[id_huella(h), n] for h, n in acumulado.detalle.most_common(5)],
+                    }
+                    for origen, acumulado in origenes[:limite]
+                ],
+                'nmas1': sorted(
+                    ({'id': id_huella(texto), 'sql': texto, **rafaga} for texto, rafaga in self.rafagas.items()),
+                    key=lambda r: (r['requests'], r['max_repeticiones']),
+                    reverse=True,
+                ),
+            }
+
+
+estadisticas = Estadisticas()
+
+
+# ----------------------
+# Registro por request
+# ----------------------
+class ConsultasRequest:
+    """`execute_wrapper` que anota las consultas de un request."""
+
+    def __init__(self, request):
+        self.url = request.get_full_path()
+        self.consultas = []
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            origen = _origen()
+            self.consultas.append((huella(sql), duracion, origen))
+            if duracion >= getattr(settings, 'REGISTRO_SQL_LENTA', 0.1):
+                logger.warning('SQL lenta (%.0f ms) desde %s en %s: %s', duracion * 1000, origen, self.url, huella(sql))
+
+    @contextmanager
+    def activo(self):
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(self))
+            yield
+
+    def envolver(self, partes):
+        # Respuestas en streaming: las consultas ocurren mientras se envía el cuerpo
+        try:
+            with self.activo():
+                yield from partes
+        finally:
+            self.cerrar()
+
+    def cerrar(self):
+        estadisticas.sumar(self.consultas, self.url)
+
+
+class RegistroSQLMiddleware:
+    """Va primero después de la compresión, así cuenta también sesión y auth."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self) or not getattr(settings, 'REGISTRO_SQL', False):
+            return self.get_response(request)
+
+        consultas = ConsultasRequest(request)
+        with consultas.activo():
+            response = self.get_response(request)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            response.streaming_content = consultas.envolver(response.streaming_content)
+        else:
+            consultas.cerrar()
+        return response
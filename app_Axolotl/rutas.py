@@ -0,0 +1,64 @@
+"""Redirección de las URLs viejas por nombre a las rutas por id.
+
+Antes `comprar/?artista=<nombre>` y `finalizar/?artista=..&producto=..&precio=..`
+buscaban por texto. Los enlaces guardados siguen funcionando: cada nombre se
+resuelve una vez a su id y queda en la caché, así la redirección no vuelve a
+tocar la BD. Cualquier cambio en `Artista` o `Producto` invalida todas las
+entradas a la vez (se cambia la versión de las claves). Los nombres que no
+existen no se guardan: un artista nuevo se encuentra apenas se crea.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Artista, Producto
+
+CLAVE_VERSION = 'axolotl:rutas:version'
+DURACION = 60 * 60 * 24
+
+
+def _nueva_version():
+    # Nunca reutilizar una versión vieja aunque la caché haya perdido la clave
+    return time.time_ns()
+
+
+def _version():
+    return cache.get_or_set(CLAVE_VERSION, _nueva_version, None)
+
+
+def _clave(*partes):
+    texto = '\x00'.join(p.strip().lower() for p in partes)
+    return f'axolotl:rutas:{_version()}:{hashlib.md5(texto.encode()).hexdigest()}'
+
+
+def _resolver(clave, consulta):
+    valor = cache.get(clave)
+    if valor is None:
+        valor = consulta.values_list('id', flat=True).order_by('id').first()
+        if valor is not None:
+            cache.set(clave, valor, DURACION)
+    return valor
+
+
+def id_artista(nombre):
+    """Id del artista con ese nombre (sin distinguir mayúsculas) o None."""
+    return _resolver(_clave('artista', nombre), Artista.objects.filter(nombre_artista__iexact=nombre.strip()))
+
+
+def id_producto(nombre_producto, nombre_artista=''):
+    """Id del producto con ese nombre (y de ese artista, si se indica) o None."""
+    productos = Producto.objects.filter(nombre_producto__iexact=nombre_producto.strip())
+    if nombre_artista:
+        productos = productos.filter(artista__nombre_artista__iexact=nombre_artista.strip())
+    return _resolver(_clave('producto', nombre_producto, nombre_artista), productos)
+
+
+@receiver(post_save, sender=Artista)
+@receiver(post_delete, sender=Artista)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_rutas(sender, **kwargs):
+    cache.set(CLAVE_VERSION, _nueva_version(), None)
@@ -0,0 +1,130 @@
+"""Carrito para visitantes sin sesión iniciada.
+
+Las líneas se guardan en una cookie firmada ({producto_id: cantidad}), así que
+agregar o quitar productos no escribe nada en la base de datos. Al iniciar
+sesión el contenido se fusiona con `Cart`/`CartItem` de una sola vez y
+`crear_pedido_publico` puede cobrarlo directamente.
+"""
+import json
+
+from django.core import signing
+from django.db import transaction
+
+from .models import Cart, CartItem, Producto
+from .stock import anotar_stock_disponible
+
+COOKIE_NAME = 'carrito_axolotl'
+COOKIE_SALT = 'app_Axolotl.session_cart'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30  # 30 días
+
+
+class SessionCartItem:
+    """Línea del carrito de invitado con la misma interfaz que `CartItem` en las plantillas.
+
+    `id` es el id del producto, que es lo que usan las URLs de actualizar/eliminar
+    cuando el visitante no ha iniciado sesión.
+    """
+
+    def __init__(self, producto, cantidad):
+        self.id = producto.id
+        self.producto = producto
+        self.cantidad = cantidad
+        self.stock_disponible = getattr(producto, 'stock_disponible', producto.stock)
+
+    def subtotal(self):
+        return self.cantidad * self.producto.precio
+
+
+class SessionCart:
+    def __init__(self, request):
+        try:
+            datos = json.loads(request.get_signed_cookie(COOKIE_NAME, default='{}', salt=COOKIE_SALT))
+            self.lineas = {int(pid): int(cantidad) for pid, cantidad in datos.items() if int(cantidad) > 0}
+        except (signing.BadSignature, ValueError, TypeError, AttributeError):
+            self.lineas = {}
+        self.modificado = False
+
+    def __len__(self):
+        return len(self.lineas)
+
+    def __bool__(self):
+        return bool(self.lineas)
+
+    def cantidad(self, producto_id):
+        return self.lineas.get(producto_id, 0)
+
+    def fijar(self, producto_id, cantidad):
+        if cantidad > 0:
+            self.lineas[producto_id] = cantidad
+        else:
+            self.lineas.pop(producto_id, None)
+        self.modificado = True
+
+    def agregar(self, producto_id, cantidad):
+        self.fijar(producto_id, self.cantidad(producto_id) + cantidad)
+
+    def quitar(self, producto_id):
+        self.fijar(producto_id, 0)
+
+    def vaciar(self):
+        if self.lineas:
+            self.lineas = {}
+            self.modificado = True
+
+    def items(self):
+        """Líneas con su producto y stock disponible (una sola consulta)."""
+        if not self.lineas:
+            return []
+        productos = anotar_stock_disponible(
+            Producto.objects.select_related('artista').filter(id__in=self.lineas)
+        ).order_by('id')
+        return [SessionCartItem(p, self.lineas[p.id]) for p in productos]
+
+    def guardar(self, response):
+        """Escribe (o borra) la cookie en `response` si el carrito cambió."""
+        if not self.modificado:
+            return response
+        if self.lineas:
+            response.set_signed_cookie(
+                COOKIE_NAME, json.dumps(self.lineas), salt=COOKIE_SALT,
+                max_age=COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+            )
+        else:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
+
+    def fusionar(self, usuario):
+        """Pasa las líneas al `Cart` del usuario con un bulk_update + bulk_create y vacía la cookie.
+
+        Cada cantidad sumada se limita al stock disponible (sin bajar la que ya
+        estaba en el carrito). Devuelve [(producto, disponible), ...] de las
+        líneas que no entraron completas, para avisarle al usuario.
+        """
+        if not self.lineas:
+            return []
+        productos = {
+            p.id: p for p in anotar_stock_disponible(Producto.objects.filter(id__in=self.lineas)).order_by('id')
+        }
+        ajustados = []
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(usuario=usuario)
+            items = {i.producto_id: i for i in cart.items.filter(producto_id__in=productos)}
+            nuevos = []
+            for producto_id, cantidad in self.lineas.items():
+                producto = productos.get(producto_id)
+                if producto is None:
+                    continue
+                actual = items[producto_id].cantidad if producto_id in items else 0
+                total = min(actual + cantidad, max(producto.stock_disponible, actual))
+                if total < actual + cantidad:
+                    ajustados.append((producto, producto.stock_disponible))
+                if producto_id in items:
+                    items[producto_id].cantidad = total
+                elif total > 0:
+                    nuevos.append(CartItem(cart=cart, producto_id=producto_id, cantidad=total))
+            if items:
+                CartItem.objects.bulk_update(items.values(), ['cantidad'])
+            if nuevos:
+                CartItem.objects.bulk_create(nuevos)
+        self.vaciar()
+        return ajustados
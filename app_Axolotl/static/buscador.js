@@ -0,0 +1,61 @@
+/* Autocompletado para los formularios del panel (ver admin_panel/_buscador.html).
+   Consulta admin_panel/buscar/<modelo>/?q=...&pagina=N y guarda el id elegido en el campo oculto. */
+(function () {
+    function iniciar(caja) {
+        var texto = caja.querySelector('.buscador-texto');
+        var valor = caja.querySelector('.buscador-valor');
+        var lista = caja.querySelector('.buscador-resultados');
+        var espera = null;
+        var pagina = 1;
+
+        function opcion(etiqueta, alElegir) {
+            var div = document.createElement('div');
+            div.textContent = etiqueta;
+            div.style.padding = '8px 12px';
+            div.style.cursor = 'pointer';
+            div.addEventListener('mousedown', function (ev) { ev.preventDefault(); alElegir(); });
+            return div;
+        }
+
+        function buscar(agregar) {
+            var url = caja.dataset.url + '?q=' + encodeURIComponent(texto.value.trim()) + '&pagina=' + pagina;
+            fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+                .then(function (r) { return r.json(); })
+                .then(function (data) {
+                    if (!agregar) { lista.innerHTML = ''; }
+                    var mas = lista.querySelector('.buscador-mas');
+                    if (mas) { mas.remove(); }
+                    data.resultados.forEach(function (item) {
+                        lista.appendChild(opcion(item.texto, function () {
+                            valor.value = item.id;
+                            texto.value = item.texto;
+                            lista.style.display = 'none';
+                        }));
+                    });
+                    if (data.hay_mas) {
+                        var boton = opcion('Ver más…', function () { pagina += 1; buscar(true); });
+                        boton.className = 'buscador-mas';
+                        boton.style.color = '#c51a8d';
+                        lista.appendChild(boton);
+                    }
+                    if (!data.resultados.length && !agregar) {
+                        lista.appendChild(opcion('Sin resultados', function () {}));
+                    }
+                    lista.style.display = 'block';
+                });
+        }
+
+        texto.addEventListener('input', function () {
+            valor.value = '';
+            pagina = 1;
+            clearTimeout(espera);
+            espera = setTimeout(function () { buscar(false); }, 250);
+        });
+        texto.addEventListener('focus', function () { if (!valor.value) { buscar(false); } });
+        texto.addEventListener('blur', function () { lista.style.display = 'none'; });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('.buscador').forEach(iniciar);
+    });
+})();
@@ -0,0 +1,25 @@
+// Páginas exportadas con `exportar_estaticos`: el HTML es el mismo para todos los
+// visitantes, así que el token CSRF, el contador del carrito y los mensajes se
+// piden a Django al cargar la página.
+(function () {
+    var script = document.currentScript;
+    var url = (script && script.dataset.url) || '/visitante/';
+
+    fetch(url, { credentials: 'same-origin' })
+        .then(function (respuesta) { return respuesta.json(); })
+        .then(function (datos) {
+            document.querySelectorAll('input[name="csrfmiddlewaretoken"]').forEach(function (input) {
+                input.value = datos.csrf;
+            });
+            document.querySelectorAll('.nav-cart-count').forEach(function (contador) {
+                contador.textContent = datos.carrito;
+            });
+            datos.mensajes.forEach(function (mensaje) {
+                var aviso = document.createElement('div');
+                aviso.textContent = mensaje.texto;
+                aviso.style.cssText = 'padding: 12px 20px; text-align: center; color: #333; background: ' +
+                    (mensaje.nivel.indexOf('error') !== -1 ? '#ffcccc' : '#ccffcc') + ';';
+                document.body.insertBefore(aviso, document.body.firstChild);
+            });
+        });
+})();
@@ -0,0 +1,55 @@
+// Stock y precio en vivo para comprar.html y cart.html (ver app_Axolotl/eventos.py).
+// Cada elemento con data-producto-id se actualiza cuando llega un evento de su producto.
+(function () {
+    var script = document.currentScript;
+    var url = script && script.dataset.url;
+    var ids = [];
+    document.querySelectorAll('[data-producto-id]').forEach(function (nodo) {
+        if (ids.indexOf(nodo.dataset.productoId) === -1) { ids.push(nodo.dataset.productoId); }
+    });
+    if (!url || !ids.length || !window.EventSource) { return; }
+
+    function textoStock(stock) {
+        if (stock > 0) {
+            return '<p style="font-size:13px;color:#666;margin-top:6px;"><strong>Quedan:</strong> ' +
+                stock + ' unidad' + (stock !== 1 ? 'es' : '') + '</p>';
+        }
+        return '<p style="font-size:13px;color:#b00020;margin-top:6px;font-weight:700;">Fuera de stock</p>';
+    }
+
+    function recalcularTotal() {
+        var total = 0;
+        document.querySelectorAll('.cart-item-subtotal').forEach(function (nodo) {
+            total += parseFloat(nodo.textContent.replace('$', '')) || 0;
+        });
+        document.querySelectorAll('.cart-total').forEach(function (nodo) { nodo.textContent = '$' + total.toFixed(2); });
+    }
+
+    var fuente = new EventSource(url + '?ids=' + ids.join(','));
+    fuente.onmessage = function (evento) {
+        var datos = JSON.parse(evento.data);
+        var carritoCambio = false;
+        document.querySelectorAll('[data-producto-id="' + datos.id + '"]').forEach(function (nodo) {
+            nodo.querySelectorAll('.live-precio').forEach(function (precio) { precio.textContent = datos.precio; });
+            nodo.querySelectorAll('.live-stock').forEach(function (stock) { stock.innerHTML = textoStock(datos.stock); });
+            // Tarjetas de comprar.html: desactivar la compra si se agotó
+            nodo.querySelectorAll('.comprar-card-actions .buy-btn').forEach(function (boton) {
+                boton.classList.toggle('disabled', datos.stock <= 0);
+                boton.style.pointerEvents = datos.stock <= 0 ? 'none' : '';
+                if (boton.tagName === 'BUTTON') { boton.disabled = datos.stock <= 0; }
+            });
+            // Líneas de cart.html
+            var stock = nodo.querySelector('.cart-item-stock');
+            if (stock) {
+                var cantidad = parseInt(nodo.querySelector('.cart-item-qty').textContent, 10);
+                stock.textContent = datos.stock;
+                nodo.querySelector('.cart-item-aviso').textContent =
+                    cantidad > datos.stock ? '¡Cantidad superior al stock disponible!' : '';
+                nodo.querySelector('.cart-item-subtotal').textContent =
+                    '$' + (cantidad * parseFloat(datos.precio)).toFixed(2);
+                carritoCambio = true;
+            }
+        });
+        if (carritoCambio) { recalcularTotal(); }
+    };
+})();
@@ -0,0 +1,175 @@
+"""Libro de movimientos de stock.
+
+Las ventas, reabastecimientos y ajustes se registran como filas nuevas de
+`StockMovement` (un INSERT barato) en lugar de reescribir `Producto.stock`.
+`Producto.stock` queda como la cifra materializada y sólo se actualiza al
+compactar los movimientos pendientes (`python manage.py compactar_stock`).
+
+El stock disponible de un producto es siempre:
+    Producto.stock + suma de sus movimientos no compactados
+"""
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+
+from .estaticos import stock_cambiado
+from .eventos import notificar_productos
+from .models import Producto, StockMovement
+
+
+class StockInsuficiente(Exception):
+    """La venta dejaría el stock disponible de `producto` por debajo de cero."""
+
+    def __init__(self, producto, disponible):
+        self.producto = producto
+        self.disponible = disponible
+        if disponible <= 0:
+            mensaje = f'El producto "{producto.nombre_producto}" está fuera de stock.'
+        else:
+            mensaje = f'Solo quedan {disponible} unidades de "{producto.nombre_producto}" en stock.'
+        super().__init__(mensaje)
+
+
+def _pendiente(producto_ref):
+    """Subconsulta con la suma de movimientos sin compactar de un producto (0 si no hay)."""
+    pendientes = (
+        StockMovement.objects
+        .filter(producto_id=producto_ref, compactado=False)
+        .order_by()
+        .values('producto_id')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    return Coalesce(Subquery(pendientes, output_field=IntegerField()), Value(0))
+
+
+def anotar_stock_disponible(queryset, prefijo=''):
+    """Anota `stock_disponible` en un queryset.
+
+    `prefijo` es la ruta hasta el producto: '' para `Producto`, 'producto__' para
+    `CartItem` o `DetallePedido`.
+    """
+    return queryset.annotate(
+        stock_disponible=F(f'{prefijo}stock') + _pendiente(OuterRef(f'{prefijo}id'))
+    )
+
+
+def stock_disponible(producto_ids):
+    """Devuelve {producto_id: stock disponible} con una sola consulta."""
+    productos = anotar_stock_disponible(Producto.objects.filter(id__in=producto_ids))
+    return dict(productos.values_list('id', 'stock_disponible'))
+
+
+def registrar_venta(lineas, pedido=None):
+    """Agrega los movimientos de venta de `lineas` [(producto, cantidad), ...].
+
+    Se bloquean las filas de los productos vendidos (en orden de id, para que dos
+    ventas no se esperen en cruz), se insertan los movimientos y se verifica el
+    disponible; si algún producto queda en negativo se lanza `StockInsuficiente`
+    y la transacción (incluido el pedido del llamador) se revierte. Sin el
+    bloqueo, en bases con escritores concurrentes (PostgreSQL, MySQL) dos ventas
+    podrían ver cada una sólo su propio movimiento y sobrevender; sólo se
+    serializan las ventas de un mismo producto. En SQLite `select_for_update` no
+    hace nada y el lock de escritura de la base cumple ese papel.
+    """
+    cantidades = OrderedDict()
+    for producto, cantidad in lineas:
+        if producto.id in cantidades:
+            cantidades[producto.id][1] += cantidad
+        else:
+            cantidades[producto.id] = [producto, cantidad]
+
+    with transaction.atomic():
+        list(
+            Producto.objects.select_for_update()
+            .filter(id__in=sorted(cantidades)).order_by('id').values_list('id', flat=True)
+        )
+        StockMovement.objects.bulk_create([
+            StockMovement(producto=producto, pedido=pedido, tipo=StockMovement.TIPO_VENTA, cantidad=-cantidad)
+            for producto, cantidad in cantidades.values()
+        ])
+        disponibles = stock_disponible(list(cantidades))
+        for producto_id, (producto, cantidad) in cantidades.items():
+            restante = disponibles.get(producto_id, 0)
+            if restante < 0:
+                raise StockInsuficiente(producto, restante + cantidad)
+        notificar_productos(cantidades)
+        stock_cambiado(cantidades)
+
+
+def ajustar_stock(producto, cantidad, tipo=StockMovement.TIPO_AJUSTE):
+    """Agrega un movimiento de entrada/ajuste. `cantidad` puede ser negativa."""
+    if not cantidad:
+        return None
+    movimiento = StockMovement.objects.create(producto=producto, tipo=tipo, cantidad=cantidad)
+    notificar_productos([producto.id])
+    stock_cambiado([producto.id])
+    return movimiento
+
+
+def ajustar_stock_masivo(producto_ids, cantidad=None, fijar=None):
+    """Ajusta el stock de varios productos con un solo INSERT de movimientos.
+
+    Con `cantidad` suma (o resta) esa cantidad a cada producto; con `fijar` deja el
+    disponible de cada uno en ese valor. Si una resta dejaría algún producto en
+    negativo se lanza `StockInsuficiente` y no se aplica nada. Devuelve el número
+    de movimientos creados.
+    """
+    with transaction.atomic():
+        if fijar is not None:
+            deltas = {
+                producto_id: fijar - disponible
+                for producto_id, disponible in stock_disponible(producto_ids).items()
+            }
+        else:
+            existentes = Producto.objects.filter(id__in=producto_ids).values_list('id', flat=True)
+            deltas = {producto_id: cantidad for producto_id in existentes}
+
+        movimientos = StockMovement.objects.bulk_create([
+            StockMovement(
+                producto_id=producto_id,
+                tipo=StockMovement.TIPO_REABASTECIMIENTO if delta > 0 else StockMovement.TIPO_AJUSTE,
+                cantidad=delta,
+            )
+            for producto_id, delta in deltas.items()
+            if delta
+        ])
+
+        if cantidad is not None and cantidad < 0:
+            sin_stock = (
+                anotar_stock_disponible(Producto.objects.filter(id__in=producto_ids))
+                .filter(stock_disponible__lt=0)
+                .first()
+            )
+            if sin_stock is not None:
+                raise StockInsuficiente(sin_stock, sin_stock.stock_disponible - cantidad)
+        notificar_productos(deltas)
+        stock_cambiado(deltas)
+    return len(movimientos)
+
+
+def compactar_movimientos(producto_ids=None):
+    """Pasa los movimientos pendientes a `Producto.stock` y los marca como compactados.
+
+    Sólo se compacta hasta el último id visto al empezar, así los movimientos que
+    lleguen mientras tanto quedan para la siguiente pasada. Devuelve el número de
+    movimientos compactados.
+    """
+    pendientes = StockMovement.objects.filter(compactado=False)
+    if producto_ids is not None:
+        pendientes = pendientes.filter(producto_id__in=producto_ids)
+
+    with transaction.atomic():
+        ultimo_id = pendientes.aggregate(ultimo=Max('id'))['ultimo']
+        if ultimo_id is None:
+            return 0
+        lote = pendientes.filter(id__lte=ultimo_id)
+        deltas = lote.order_by().values('producto_id').annotate(delta=Sum('cantidad'))
+        for fila in deltas:
+            if fila['delta']:
+                Producto.objects.filter(id=fila['producto_id']).update(
+                    stock=F('stock') + fila['delta'], actualizado=Now()
+                )
+        return lote.update(compactado=True)
@@ -1,13 +1,16 @@
 from django import template
 from django.core.exceptions import ObjectDoesNotExist
 
+from ..session_cart import SessionCart
+
 register = template.Library()
 
 @register.simple_tag(takes_context=True)
 def get_cart_count(context, user):
     try:
         if not user.is_authenticated:
-            return 0
+            request = context.get('request')
+            return len(SessionCart(request)) if request is not None else 0
         perfil = user.usuario
         cart = getattr(perfil, 'cart', None)
         if cart is None:
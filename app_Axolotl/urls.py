@@ -6,10 +6,12 @@ from django.conf.urls.static import static
 urlpatterns = [
     # URLs del panel de administración
     path('admin_panel/', views.inicio_axolotlmusic, name='inicio_axolotlmusic'), # Home del panel
+    path('admin_panel/buscar/<str:modelo>/', views.buscar_admin, name='buscar_admin'), # Autocompletado de formularios
     
     # CRUD Productos (ya existentes)
     path('admin_panel/productos/agregar/', views.agregar_productos, name='agregar_productos'),
     path('admin_panel/productos/ver/', views.ver_productos, name='ver_productos'),
+    path('admin_panel/productos/acciones/', views.acciones_productos, name='acciones_productos'), # Acciones masivas
     path('admin_panel/productos/actualizar/<int:producto_id>/', views.actualizar_productos, name='actualizar_productos'),
     path('admin_panel/productos/borrar/<int:producto_id>/', views.borrar_productos, name='borrar_productos'),
 
@@ -21,6 +23,7 @@ urlpatterns = [
     
     # CRUD Clientes
     path('admin_panel/clientes/ver/', views.ver_clientes, name='ver_clientes'),
+    path('admin_panel/clientes/segmentos/', views.segmentos_clientes, name='segmentos_clientes'), # RFM y cohortes
     path('admin_panel/clientes/actualizar/<int:cliente_id>/', views.actualizar_cliente, name='actualizar_cliente'),
     path('admin_panel/clientes/borrar/<int:cliente_id>/', views.borrar_cliente, name='borrar_cliente'),
     
@@ -41,6 +44,11 @@ urlpatterns = [
     path('admin_panel/detalles_pedidos/agregar/', views.agregar_detalle_pedido, name='agregar_detalle_pedido'),
     path('admin_panel/detalles_pedidos/actualizar/<int:detalle_id>/', views.actualizar_detalle_pedido, name='actualizar_detalle_pedido'),
     path('admin_panel/detalles_pedidos/borrar/<int:detalle_id>/', views.borrar_detalle_pedido, name='borrar_detalle_pedido'),
+
+    # Diagnóstico
+    path('admin_panel/perfiles/', views.ver_perfiles, name='ver_perfiles'), # Perfiles por muestreo
+    path('admin_panel/perfiles/<str:perfil_id>/', views.ver_perfil, name='ver_perfil'),
+    path('admin_panel/sql/', views.ver_sql, name='ver_sql'), # Consultas por huella y N+1
     
     # URLs del Frontend de AxolotlMusic
     path('login/', views.login_frontend, name='root_login'), # Root -> login
@@ -51,18 +59,26 @@ urlpatterns = [
     path('artistas/', views.artistas_frontend, name='artistas_frontend'),
     path('artista/<int:artista_id>/', views.artista_detalle, name='artista_detalle'),
     path('lista/', views.lista_frontend, name='lista_frontend'),
-    path('comprar/', views.comprar_frontend, name='comprar_frontend'),
+    path('comprar/', views.comprar_frontend, name='comprar_frontend'), # URL vieja por nombre -> comprar_artista
+    path('comprar/<int:artista_id>/', views.comprar_artista, name='comprar_artista'),
     path('catalogo/', views.catalogo_frontend, name='catalogo_frontend'),
     path('genero/', views.genero_frontend, name='genero_frontend'),
     path('tipo/', views.tipo_frontend, name='tipo_frontend'),
     path('novedades/', views.novedades_frontend, name='novedades_frontend'),
     path('finalizar/', views.finalizar_frontend, name='finalizar_frontend'),
+    path('finalizar/<int:producto_id>/', views.finalizar_producto, name='finalizar_producto'),
     path('crear_pedido_publico/', views.crear_pedido_publico, name='crear_pedido_publico'),
     path('gracias/', views.gracias_frontend, name='gracias_frontend'),
+    path('eventos/stock/', views.eventos_stock, name='eventos_stock'), # SSE de stock y precio (ASGI)
+    path('visitante/', views.estado_visitante, name='estado_visitante'), # Datos por visitante para páginas estáticas
+    path('sitemap.xml', views.sitemap_indice, name='sitemap_indice'), # Índice de sitemaps por bloque
+    path('sitemap-<str:fuente>-<int:bloque>.xml', views.sitemap_bloque, name='sitemap_bloque'),
+    path('feed/productos.<str:formato>', views.feed_productos, name='feed_productos'), # CSV/XML para comparadores
     path('cart/add/<int:producto_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/', views.ver_carrito, name='ver_carrito'),
     path('cart/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
     path('cart/remove/<int:item_id>/', views.remove_cart_item, name='remove_cart_item'),
+    path('cart/batch/', views.update_cart_batch, name='update_cart_batch'),
     path('perfil/', views.perfil_usuario, name='perfil_usuario'),
     path('perfil/editar/', views.editar_perfil, name='editar_perfil'),
 
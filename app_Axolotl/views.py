@@ -1,3 +1,14 @@
+import json
+import logging
+import string
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import never_cache
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.contrib import messages
@@ -5,11 +16,37 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.db import OperationalError, transaction
-from .models import Producto, Artista, Usuario, Pedido, DetallePedido, Cart, CartItem
+from django.db.models import Avg, Case, Count, F, Q, Value, When
+from django.db.models.functions import Lower, Now, Round
+from .models import (
+    Producto, Artista, Usuario, Pedido, DetallePedido, Cart, CartItem,
+    PedidoArchivado, DetallePedidoArchivado, SegmentoCliente, CohorteMensual, RankingVentas,
+)
+from .archivo import combinar_con_archivo
+from .invitados import actualizar_datos, invitado_de_cookie, recordar_invitado, resolver_invitado
 from .forms import ArtistaForm, ProductoForm, UsuarioForm
+from .session_cart import SessionCart
+from .templatetags.cart_tags import get_cart_count
+from .estaticos import exportacion_activa, marcar_pendientes, paginas_de_productos
+from .escritor import ejecutar
+from .rutas import id_artista, id_producto
+from .mas_vendidos import ranking
+from .instantanea import catalogo as instantanea_catalogo, marcar_vencida
+from . import mapa_sitio
+from .perfilador import bloques_flamegraph, resumen_funciones
+from .perfilador import cargar as cargar_perfil, listar as listar_perfiles
+from .registro_sql import estadisticas as estadisticas_sql
+from .listados import iterar, lotes, respuesta_streaming, secciones_por_grupo, usar_streaming
+from .eventos import MAX_PRODUCTOS, estado_productos, flujo_eventos, notificar_productos
+from .stock import (
+    StockInsuficiente, ajustar_stock, ajustar_stock_masivo, anotar_stock_disponible,
+    registrar_venta, stock_disponible,
+)
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.forms import UserCreationForm
 
+logger = logging.getLogger(__name__)
+
 # Vista pública de detalle de artista
 def artista_detalle(request, artista_id):
     artista = get_object_or_404(Artista, id=artista_id)
@@ -68,10 +105,22 @@ def login_frontend(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             login(request, user)
+            # Pasar el carrito de invitado (cookie) al carrito del usuario
+            carrito = SessionCart(request)
+            if carrito:
+                try:
+                    ajustados = carrito.fusionar(user.usuario)
+                except Usuario.DoesNotExist:
+                    ajustados = []
+                for producto, disponible in ajustados:
+                    if disponible <= 0:
+                        messages.error(request, f'"{producto.nombre_producto}" está fuera de stock y no se pasó a tu carrito.')
+                    else:
+                        messages.error(request, f'Solo quedan {disponible} unidades de "{producto.nombre_producto}": se ajustó la cantidad en tu carrito.')
             # Si es staff, enviarlo al panel de administración
             if user.is_staff:
-                return redirect('inicio_axolotlmusic')
-            return redirect('index_frontend')
+                return carrito.guardar(redirect('inicio_axolotlmusic'))
+            return carrito.guardar(redirect('index_frontend'))
         else:
             messages.error(request, 'Usuario o contraseña incorrectos.')
             return redirect('login_frontend')
@@ -106,21 +155,93 @@ def _safe_clientes_list():
         ]
 
 
-def _safe_all_usuarios():
-    """Devuelve todos los usuarios de tipo `Usuario` o una lista basada en `User` como fallback."""
-    try:
-        return Usuario.objects.all()
-    except OperationalError:
-        users = User.objects.all().order_by('username')
-        return [
-            {'id': u.id, 'nombre': u.username, 'email': u.email or '', 'tel': ''}
-            for u in users
-        ]
+BUSQUEDA_POR_PAGINA = 20
+
+
+# LOWER() de SQLite sólo pasa a minúsculas las letras ASCII: el término se baja igual
+MINUSCULAS_ASCII = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _prefijo(queryset, campo, q):
+    """Filas cuyo `campo` empieza con `q` sin distinguir mayúsculas, por el índice de Lower(campo).
+
+    `__istartswith` es un LIKE, y SQLite sólo lo resuelve con un índice de
+    collation NOCASE: recorría la tabla entera. Un rango sobre Lower(campo)
+    (`>= q` y `< q + U+10FFFF`) es una búsqueda en el índice de esa expresión.
+    """
+    desde = q.translate(MINUSCULAS_ASCII)
+    return queryset.alias(**{f'{campo}_min': Lower(campo)}).filter(**{
+        f'{campo}_min__gte': desde,
+        f'{campo}_min__lt': desde + '\U0010ffff',
+    })
+
+
+def _busqueda_usuarios(q):
+    qs = Usuario.objects.order_by('nombre', 'id')
+    if q.isdigit():
+        return qs.filter(id=int(q))
+    if q:
+        # Nombre y email por separado: con un OR entre columnas SQLite no usa ningún índice
+        qs = qs.order_by()
+        qs = _prefijo(qs, 'nombre', q).union(_prefijo(qs, 'email', q)).order_by('nombre', 'id')
+    return qs
+
+
+def _busqueda_productos(q):
+    qs = Producto.objects.order_by('nombre_producto', 'id')
+    if q.isdigit():
+        return qs.filter(id=int(q))
+    if q:
+        # En el orden del mismo índice: se leen sólo las filas de la página
+        qs = _prefijo(qs, 'nombre_producto', q).order_by('nombre_producto_min', 'id')
+    return qs
+
+
+def _busqueda_pedidos(q):
+    qs = Pedido.objects.select_related('usuario').order_by('-id')
+    if q.isdigit():
+        return qs.filter(id=int(q))
+    if q:
+        qs = qs.filter(usuario__in=_prefijo(Usuario.objects.all(), 'nombre', q).values('id'))
+    return qs
+
+
+# modelo -> (consulta filtrada, texto de cada opción)
+BUSQUEDAS_ADMIN = {
+    'usuarios': (_busqueda_usuarios, lambda u: f'{u.nombre} ({u.email})'),
+    'productos': (_busqueda_productos, lambda p: f'{p.nombre_producto} - ${p.precio}'),
+    'pedidos': (_busqueda_pedidos, lambda p: f'Pedido #{p.id} - Cliente: {p.usuario.nombre}'),
+}
 
 
 # ----------------------
 # Panel de administración
 # ----------------------
+@login_required
+@user_passes_test(is_staff_user)
+def buscar_admin(request, modelo):
+    """Búsqueda paginada para los campos con autocompletado del panel.
+
+    Filtra por prefijo con un rango sobre el índice de Lower(columna) (ver
+    `_prefijo`), o por id si `q` es numérico, y lee una fila de más en lugar de
+    hacer COUNT para saber si hay otra página.
+    """
+    if modelo not in BUSQUEDAS_ADMIN:
+        return JsonResponse({'error': 'Modelo no soportado.'}, status=404)
+    consulta, texto = BUSQUEDAS_ADMIN[modelo]
+    try:
+        pagina = max(1, int(request.GET.get('pagina', 1)))
+    except ValueError:
+        pagina = 1
+    inicio = (pagina - 1) * BUSQUEDA_POR_PAGINA
+    filas = list(consulta(request.GET.get('q', '').strip())[inicio:inicio + BUSQUEDA_POR_PAGINA + 1])
+    return JsonResponse({
+        'resultados': [{'id': obj.id, 'texto': texto(obj)} for obj in filas[:BUSQUEDA_POR_PAGINA]],
+        'hay_mas': len(filas) > BUSQUEDA_POR_PAGINA,
+        'pagina': pagina,
+    })
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def inicio_axolotlmusic(request):
@@ -160,22 +281,88 @@ def agregar_productos(request):
 @login_required
 @user_passes_test(is_staff_user)
 def ver_productos(request):
-    productos = Producto.objects.select_related('artista').all().order_by('-id')
+    productos = anotar_stock_disponible(Producto.objects.select_related('artista').all()).order_by('-id')
     return render(request, 'admin_panel/productos_ver.html', {'productos': productos})
 
 
+@login_required
+@user_passes_test(is_staff_user)
+def acciones_productos(request):
+    """Acciones masivas sobre los productos marcados en `ver_productos`.
+
+    Cada acción es una sola sentencia sobre todos los productos (UPDATE/DELETE con
+    expresiones F, o un INSERT de movimientos para el stock) dentro de una transacción.
+    """
+    if request.method != 'POST':
+        return redirect('ver_productos')
+
+    ids = [int(i) for i in request.POST.getlist('productos') if i.isdigit()]
+    accion = request.POST.get('accion', '')
+    valor = request.POST.get('valor', '').strip()
+    if not ids:
+        messages.error(request, 'Selecciona al menos un producto.')
+        return redirect('ver_productos')
+
+    productos = Producto.objects.filter(id__in=ids)
+    # update()/delete() no disparan las señales de Producto: marcar las páginas a mano
+    if exportacion_activa():
+        marcar_pendientes(paginas_de_productos(productos))
+    try:
+        with transaction.atomic():
+            if accion == 'fijar_stock':
+                stock = int(valor)
+                if stock < 0:
+                    raise ValueError(valor)
+                ajustar_stock_masivo(ids, fijar=stock)
+                messages.success(request, f'Stock fijado en {stock} para {len(ids)} productos.')
+            elif accion == 'sumar_stock':
+                ajustar_stock_masivo(ids, cantidad=int(valor))
+                messages.success(request, f'Stock ajustado en {int(valor):+d} para {len(ids)} productos.')
+            elif accion == 'precio_porcentaje':
+                porcentaje = Decimal(valor)
+                if porcentaje <= -100:
+                    raise ValueError(valor)
+                factor = 1 + porcentaje / 100
+                actualizados = productos.update(precio=Round(F('precio') * factor, 2), actualizado=Now())
+                marcar_vencida()
+                notificar_productos(ids)
+                messages.success(request, f'Precio cambiado {porcentaje}% en {actualizados} productos.')
+            elif accion == 'novedad':
+                actualizados = productos.update(
+                    novedad=Case(When(novedad=True, then=Value(False)), default=Value(True)),
+                    actualizado=Now(),
+                )
+                marcar_vencida()
+                messages.success(request, f'Novedad cambiada en {actualizados} productos.')
+            elif accion == 'borrar':
+                productos.delete()
+                messages.success(request, f'{len(ids)} productos eliminados.')
+            else:
+                messages.error(request, 'Acción no válida.')
+    except (ValueError, InvalidOperation):
+        messages.error(request, f'Valor no válido para la acción: "{valor}".')
+    except StockInsuficiente as e:
+        messages.error(request, str(e))
+    return redirect('ver_productos')
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def actualizar_productos(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
+    producto = get_object_or_404(anotar_stock_disponible(Producto.objects.all()), id=producto_id)
+    disponible = producto.stock_disponible
     if request.method == 'POST':
         form = ProductoForm(request.POST, request.FILES, instance=producto)
         if form.is_valid():
-            form.save()
+            # El stock no se reescribe: la diferencia se registra como ajuste en el libro.
+            # `actualizado` (auto_now) sólo se guarda si está en update_fields.
+            producto = form.save(commit=False)
+            producto.save(update_fields=[f for f in form.fields if f != 'stock'] + ['actualizado'])
+            ajustar_stock(producto, form.cleaned_data['stock'] - disponible)
             messages.success(request, 'Producto actualizado correctamente.')
             return redirect('ver_productos')
     else:
-        form = ProductoForm(instance=producto)
+        form = ProductoForm(instance=producto, initial={'stock': disponible})
     return render(request, 'admin_panel/productos_actualizar.html', {'form': form, 'producto': producto})
 
 
@@ -222,6 +409,107 @@ def ver_clientes(request):
     return render(request, 'admin_panel/clientes_ver.html', {'clientes': clientes})
 
 
+@login_required
+@user_passes_test(is_staff_user)
+def segmentos_clientes(request):
+    """Segmentos RFM y retención por cohortes ya calculados por `calcular_segmentos`."""
+    nombres = dict(SegmentoCliente.SEGMENTO_CHOICES)
+    resumen = list(
+        SegmentoCliente.objects.values('segmento')
+        .annotate(
+            clientes=Count('id'),
+            monto_promedio=Avg('monto'),
+            frecuencia_promedio=Avg('frecuencia'),
+            recencia_promedio=Avg('recencia_dias'),
+        )
+        .order_by('-clientes')
+    )
+    for fila in resumen:
+        fila['nombre'] = nombres.get(fila['segmento'], fila['segmento'])
+
+    segmento = request.GET.get('segmento', '')
+    clientes = []
+    if segmento in nombres:
+        clientes = (
+            SegmentoCliente.objects.filter(segmento=segmento)
+            .select_related('usuario')
+            .order_by('-monto')[:50]
+        )
+
+    # Matriz de retención: % de la cohorte que volvió a comprar N meses después
+    meses_max = 12
+    cohortes = []
+    for celda in CohorteMensual.objects.filter(meses__lte=meses_max):
+        if not cohortes or cohortes[-1]['cohorte'] != celda.cohorte:
+            cohortes.append({'cohorte': celda.cohorte, 'clientes': 0, 'retencion': [None] * (meses_max + 1)})
+        fila = cohortes[-1]
+        if celda.meses == 0:
+            fila['clientes'] = celda.clientes
+        if fila['clientes']:
+            fila['retencion'][celda.meses] = round(100 * celda.clientes / fila['clientes'])
+
+    return render(request, 'admin_panel/segmentos_ver.html', {
+        'resumen': resumen,
+        'segmento': segmento,
+        'nombre_segmento': nombres.get(segmento, ''),
+        'clientes': clientes,
+        'cohortes': cohortes,
+        'meses': range(meses_max + 1),
+        'calculado': SegmentoCliente.objects.values_list('calculado', flat=True).first(),
+    })
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def ver_perfiles(request):
+    """Perfiles capturados con ?perfilar=1 o por muestreo (ver perfilador.py)."""
+    return render(request, 'admin_panel/perfiles_ver.html', {
+        'perfiles': listar_perfiles(),
+        'muestreo': getattr(settings, 'PERFILADOR_MUESTREO', 0),
+    })
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def ver_perfil(request, perfil_id):
+    try:
+        meta, colapsado = cargar_perfil(perfil_id)
+    except (FileNotFoundError, ValueError):
+        raise Http404('Perfil no encontrado')
+    if request.GET.get('formato') == 'colapsado':
+        # Para flamegraph.pl, speedscope, etc.
+        return HttpResponse(colapsado, content_type='text/plain; charset=utf-8', headers={
+            'Content-Disposition': f'attachment; filename="{perfil_id}.folded"',
+        })
+    bloques, niveles = bloques_flamegraph(colapsado)
+    return render(request, 'admin_panel/perfil_detalle.html', {
+        'perfil': meta,
+        'bloques': bloques,
+        'alto': niveles * 18,
+        'funciones': resumen_funciones(colapsado),
+    })
+
+
+@login_required
+@user_passes_test(is_staff_user)
+def ver_sql(request):
+    """Consultas SQL agrupadas por huella y origen (ver registro_sql.py)."""
+    if request.method == 'POST':
+        estadisticas_sql.reiniciar()
+        messages.success(request, 'Estadísticas SQL reiniciadas.')
+        return redirect('ver_sql')
+    reporte = estadisticas_sql.reporte()
+    if request.GET.get('formato') == 'json':
+        return JsonResponse(reporte, json_dumps_params={'indent': 2}, headers={
+            'Content-Disposition': 'attachment; filename="consultas_sql.json"',
+        })
+    return render(request, 'admin_panel/sql_ver.html', {
+        'reporte': reporte,
+        'activo': getattr(settings, 'REGISTRO_SQL', False),
+        'umbral_nmas1': getattr(settings, 'REGISTRO_SQL_NMAS1', 10),
+    })
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def actualizar_cliente(request, cliente_id):
@@ -340,7 +628,13 @@ def index_frontend(request):
     # Mostrar novedades y artistas como ejemplo
     novedades = Producto.objects.filter(novedad=True).order_by('-id')[:8]
     artistas = Artista.objects.all().order_by('nombre_artista')
-    return render(request, 'index_frontend.html', {'novedades': novedades, 'artistas': artistas})
+    return render(request, 'index_frontend.html', {
+        'novedades': novedades,
+        'artistas': artistas,
+        # Ranking precalculado por actualizar_mas_vendidos: una consulta por índice
+        'mas_vendidos': ranking(7),
+        'titulo_mas_vendidos': 'Lo que más se compró en los últimos 7 días',
+    })
 
 
 def artistas_frontend(request):
@@ -362,15 +656,34 @@ def lista_frontend(request):
 
 
 def comprar_frontend(request):
+    """URL vieja `comprar/?artista=<nombre>`: redirige a la página del artista por id."""
     artista_nombre = request.GET.get('artista')
     if not artista_nombre:
         return redirect('artistas_frontend')
 
-    artista_obj = get_object_or_404(Artista, nombre_artista=artista_nombre)
-    productos = Producto.objects.filter(artista=artista_obj)
-    vinilos = productos.filter(tipo__iexact='vinilo')
-    cds = productos.filter(tipo__iexact='cd')
-    cassettes = productos.filter(tipo__iexact='casete')
+    artista_id = id_artista(artista_nombre)
+    if artista_id is None:
+        raise Http404('Artista no encontrado')
+    return redirect('comprar_artista', artista_id=artista_id, permanent=True)
+
+
+def comprar_artista(request, artista_id):
+    instantanea = instantanea_catalogo()
+    if instantanea is not None:
+        artista_obj = instantanea.artista(artista_id)
+        if artista_obj is None:
+            raise Http404('Artista no encontrado')
+        # Al recorrerla, la selección pide el disponible con los movimientos
+        productos = list(instantanea.productos_de(artista_obj))
+        vinilos, cds, cassettes = (
+            [p for p in productos if p.tipo.lower() == tipo] for tipo in ('vinilo', 'cd', 'casete')
+        )
+    else:
+        artista_obj = get_object_or_404(Artista, id=artista_id)
+        productos = anotar_stock_disponible(Producto.objects.filter(artista=artista_obj))
+        vinilos = productos.filter(tipo__iexact='vinilo')
+        cds = productos.filter(tipo__iexact='cd')
+        cassettes = productos.filter(tipo__iexact='casete')
 
     context = {
         'artista': artista_obj,
@@ -383,22 +696,37 @@ def comprar_frontend(request):
 
 def genero_frontend(request):
     genero_param = request.GET.get('genero')
-    if not genero_param:
-        productos = Producto.objects.all().order_by('nombre_producto')
-        genero_nombre = "Todos los Géneros"
+    genero_nombre = genero_param or "Todos los Géneros"
+    instantanea = instantanea_catalogo()
+    if instantanea is not None:
+        # Filas de la instantánea compartida, sin instancias del ORM (ver instantanea.py)
+        productos = instantanea.por_nombre()
+        if genero_param:
+            productos = productos.con_genero(genero_param)
+        vinilos, cds, cassettes = (productos.con_tipo(tipo) for tipo in ('vinilo', 'cd', 'casete'))
     else:
-        productos = Producto.objects.filter(genero__iexact=genero_param).order_by('nombre_producto')
-        genero_nombre = genero_param
+        if not genero_param:
+            productos = Producto.objects.all().order_by('nombre_producto')
+        else:
+            productos = Producto.objects.filter(genero__iexact=genero_param).order_by('nombre_producto')
+        productos = anotar_stock_disponible(productos)
 
-    vinilos = productos.filter(tipo__iexact='vinilo')
-    cds = productos.filter(tipo__iexact='cd')
-    cassettes = productos.filter(tipo__iexact='casete')
+        vinilos = productos.filter(tipo__iexact='vinilo')
+        cds = productos.filter(tipo__iexact='cd')
+        cassettes = productos.filter(tipo__iexact='casete')
+
+    if genero_param:
+        mas_vendidos = ranking(30, RankingVentas.ALCANCE_GENERO, genero_param.lower())
+    else:
+        mas_vendidos = ranking(30)
 
     context = {
         'genero_nombre': genero_nombre,
         'vinilos': vinilos,
         'cds': cds,
         'cassettes': cassettes,
+        'mas_vendidos': mas_vendidos,
+        'titulo_mas_vendidos': 'Lo que más se compró en los últimos 30 días',
     }
     return render(request, 'genero.html', context)
 
@@ -408,24 +736,28 @@ def tipo_frontend(request):
     tipo_param = request.GET.get('tipo', 'Vinilo')
     
     # Filtrar por tipo
-    productos = Producto.objects.filter(tipo__iexact=tipo_param).order_by('nombre_producto')
-    
-    # Agrupar por artista
-    productos_por_artista = {}
-    for producto in productos:
-        artista_nombre = producto.artista.nombre_artista
-        if artista_nombre not in productos_por_artista:
-            productos_por_artista[artista_nombre] = []
-        productos_por_artista[artista_nombre].append(producto)
-    
-    tipo_nombre = tipo_param.capitalize()
-    
+    instantanea = instantanea_catalogo()
+    if instantanea is not None:
+        productos = instantanea.por_nombre().con_tipo(tipo_param)
+    else:
+        productos = anotar_stock_disponible(
+            Producto.objects.select_related('artista').filter(tipo__iexact=tipo_param)
+        ).order_by('nombre_producto')
+    total_productos = productos.count()
+
     context = {
-        'tipo_nombre': tipo_nombre,
+        'tipo_nombre': tipo_param.capitalize(),
         'tipo_param': tipo_param,
-        'productos_por_artista': productos_por_artista,
-        'todos_productos': productos,
+        'total_productos': total_productos,
+        'mas_vendidos': ranking(30, RankingVentas.ALCANCE_TIPO, tipo_param.lower()),
+        'titulo_mas_vendidos': 'Lo que más se compró en los últimos 30 días',
     }
+    # Catálogo grande: se envía de a lotes mientras se lee (ver listados.py)
+    if usar_streaming(total_productos):
+        fragmentos = (('tipo_tarjetas.html', {'productos': lote}) for lote in lotes(iterar(productos)))
+        return respuesta_streaming(request, 'tipo.html', context, fragmentos)
+
+    context['todos_productos'] = list(productos)
     return render(request, 'tipo.html', context)
 
 
@@ -439,21 +771,49 @@ def catalogo_frontend(request):
     Diseño pensado como catálogo musical con estilo rosa/negro/blanco y referencias a ajolotes.
     """
     # Ordenar por género -> tipo -> artista -> nombre para agrupar por géneros
-    productos_qs = Producto.objects.select_related('artista').all().order_by('genero', 'tipo', 'artista__nombre_artista', 'nombre_producto')
+    instantanea = instantanea_catalogo()
+    if instantanea is not None:
+        productos_qs = instantanea.ordenado_catalogo()
+    else:
+        productos_qs = anotar_stock_disponible(Producto.objects.select_related('artista').all()).order_by(
+            'genero', 'tipo', 'artista__nombre_artista', 'nombre_producto',
+        )
+    total_productos = productos_qs.count()
+
+    def genero_de(p):
+        return p.genero or 'Sin género'
+
+    # Catálogo grande: se envía por secciones de género mientras se lee (ver listados.py)
+    if usar_streaming(total_productos):
+        fragmentos = secciones_por_grupo(iterar(productos_qs), genero_de, 'catalogo_seccion.html', 'genero')
+        return respuesta_streaming(request, 'catalogo.html', {'total_productos': total_productos}, fragmentos)
 
     # Agrupar por género manteniendo el orden
     productos_por_genero = {}
     for p in productos_qs:
-        genero = p.genero or 'Sin género'
-        productos_por_genero.setdefault(genero, []).append(p)
+        productos_por_genero.setdefault(genero_de(p), []).append(p)
 
-    return render(request, 'catalogo.html', {'productos_por_genero': productos_por_genero, 'productos': productos_qs})
+    return render(request, 'catalogo.html', {'productos_por_genero': productos_por_genero, 'total_productos': total_productos})
 
 
 def finalizar_frontend(request):
-    artista_nombre = request.GET.get('artista')
+    """Checkout del carrito. Las URLs viejas con `?producto=<nombre>` redirigen a `finalizar_producto`."""
     producto_nombre = request.GET.get('producto')
-    precio = request.GET.get('precio')
+    if producto_nombre:
+        producto_id = id_producto(producto_nombre, request.GET.get('artista', ''))
+        if producto_id is None:
+            raise Http404('Producto no encontrado')
+        return redirect('finalizar_producto', producto_id=producto_id, permanent=True)
+    return render(request, 'finalizar.html', _resumen_carrito(request))
+
+
+def finalizar_producto(request, producto_id):
+    """Compra directa de un producto: nombre y precio salen de la BD, no de la URL."""
+    producto = get_object_or_404(Producto.objects.select_related('artista'), id=producto_id)
+    return render(request, 'finalizar.html', {**_resumen_carrito(request), 'producto': producto})
+
+
+def _resumen_carrito(request):
     # Si el usuario está autenticado, intentar obtener su carrito para pasar totales reales
     cart_total = None
     cart_quantity = None
@@ -469,16 +829,74 @@ def finalizar_frontend(request):
                 cart_total = sum(i.subtotal() for i in items)
         except Exception:
             pass
+    else:
+        items = SessionCart(request).items()
+        if items:
+            cart_exists = True
+            cart_quantity = sum(i.cantidad for i in items)
+            cart_total = sum(i.subtotal() for i in items)
 
-    context = {
-        'artista': artista_nombre,
-        'producto': producto_nombre,
-        'precio': precio,
+    return {
         'cart_total': cart_total,
         'cart_quantity': cart_quantity,
         'cart_exists': cart_exists,
     }
-    return render(request, 'finalizar.html', context)
+
+
+async def eventos_stock(request):
+    """Stream SSE con el stock y precio de los productos `?ids=1,2,3` (ver eventos.py)."""
+    ids = [int(i) for i in request.GET.get('ids', '').split(',') if i.strip().isdigit()][:MAX_PRODUCTOS]
+    if not ids:
+        return JsonResponse({'error': 'Indica los productos con ?ids='}, status=400)
+
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI una conexión abierta ocuparía un hilo: se manda el estado y el
+        # navegador vuelve a preguntar pasado `retry` (sondeo).
+        datos = await sync_to_async(estado_productos)(ids)
+        cuerpo = 'retry: 15000\n\n' + ''.join(f'data: {json.dumps(d)}\n\n' for d in datos)
+        return HttpResponse(cuerpo, content_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    return StreamingHttpResponse(
+        flujo_eventos(ids),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@never_cache
+def estado_visitante(request):
+    """Datos propios del visitante que no pueden ir en las páginas exportadas
+    (ver estaticos.py): token CSRF, artículos en el carrito y mensajes pendientes."""
+    return JsonResponse({
+        'csrf': get_token(request),
+        'carrito': get_cart_count({'request': request}, request.user),
+        'mensajes': [{'nivel': m.tags, 'texto': str(m)} for m in messages.get_messages(request)],
+    })
+
+
+# ----------------------
+# Sitemap y feed de productos (ver mapa_sitio.py)
+# ----------------------
+def sitemap_indice(request):
+    mapa_sitio.revisar(request)
+    return FileResponse(open(mapa_sitio.directorio() / mapa_sitio.INDICE, 'rb'), content_type='application/xml')
+
+
+def sitemap_bloque(request, fuente, bloque):
+    mapa_sitio.revisar(request)
+    try:
+        ruta = mapa_sitio.ruta_sitemap(fuente, bloque)
+    except FileNotFoundError:
+        raise Http404('Sitemap inexistente')
+    return FileResponse(open(ruta, 'rb'), content_type='application/xml')
+
+
+def feed_productos(request, formato):
+    if formato not in mapa_sitio.FORMATOS_FEED:
+        raise Http404('Formato no soportado')
+    mapa_sitio.revisar(request)
+    tipo = 'text/csv; charset=utf-8' if formato == 'csv' else 'application/xml'
+    return StreamingHttpResponse(mapa_sitio.partes_feed(formato), content_type=tipo)
 
 
 def gracias_frontend(request):
@@ -504,7 +922,7 @@ def gracias_frontend(request):
 
 def crear_pedido_publico(request):
     """Crear un Pedido a partir del formulario público (finalizar). No requiere autenticación.
-    Busca o crea un `Usuario` por email, crea `Pedido` y (si existe) un `DetallePedido`.
+    Busca o crea un `Usuario` (por email o cookie de invitado), crea `Pedido` y (si existe) un `DetallePedido`.
     """
     if request.method != 'POST':
         return redirect('finalizar_frontend')
@@ -513,202 +931,225 @@ def crear_pedido_publico(request):
     direccion = request.POST.get('direccion', '').strip()
     email = request.POST.get('email', '').strip()
     metodo = request.POST.get('metodo', '').strip()
-    artista_nombre = request.POST.get('artista', '').strip()
-    producto_nombre = request.POST.get('producto', '').strip()
-    precio_raw = request.POST.get('precio', '').strip()
-
-    # Obtener o crear usuario (perfil) por email
-    usuario = None
-    if request.user.is_authenticated:
-        try:
-            usuario = request.user.usuario
-            # actualizar datos públicos si vienen
-            if nombre:
-                usuario.nombre = nombre
-            if direccion:
-                usuario.direccion = direccion
-            if email:
-                usuario.email = email
-            usuario.save()
-        except Exception:
-            usuario = None
-
-    if not usuario:
-        if email:
-            try:
-                usuario = Usuario.objects.get(email=email)
-                if nombre:
-                    usuario.nombre = nombre
-                if direccion:
-                    usuario.direccion = direccion
-                usuario.save()
-            except Usuario.DoesNotExist:
-                usuario = Usuario.objects.create(nombre=nombre or email, email=email, direccion=direccion)
-        else:
-            usuario = Usuario.objects.create(nombre=nombre or 'Cliente anónimo', email=f'anon_{Pedido.objects.count()+1}@local')
 
     # Si el usuario tiene un carrito con items, usar esos valores reales
-    try:
-        cart = Cart.objects.filter(usuario=usuario).first()
-    except Exception:
-        cart = None
+    # (los invitados no tienen Cart en BD, su carrito vive en la cookie)
+    cart = None
+    if request.user.is_authenticated:
+        cart = Cart.objects.filter(usuario__user=request.user).first()
 
+    # Visitantes sin sesión: usar directamente el carrito de la cookie
+    carrito_sesion = SessionCart(request)
     if cart and cart.items.exists():
         items = list(cart.items.select_related('producto').all())
-        # Proteger la operación con transacción y bloqueos para evitar race conditions
-        product_ids = [i.producto.id for i in items]
-        try:
-            with transaction.atomic():
-                productos_locked = Producto.objects.select_for_update().filter(id__in=product_ids)
-                producto_map = {p.id: p for p in productos_locked}
-
-                # Re-verificar stock después de bloquear filas
-                for i in items:
-                    p = producto_map.get(i.producto.id)
-                    if not p or p.stock <= 0:
-                        messages.error(request, f'El producto "{i.producto.nombre_producto}" está fuera de stock.')
-                        return redirect('ver_carrito')
-                    if i.cantidad > p.stock:
-                        messages.error(request, f'Solo quedan {p.stock} unidades de "{i.producto.nombre_producto}" en stock.')
-                        return redirect('ver_carrito')
+    elif not request.user.is_authenticated:
+        items = carrito_sesion.items()
+    else:
+        items = []
 
-                cantidad_total = sum(i.cantidad for i in items)
-                total = sum(i.subtotal() for i in items)
-
-                pedido = Pedido.objects.create(usuario=usuario, cantidad_producto=cantidad_total, total=total)
-
-                for i in items:
-                    DetallePedido.objects.create(
-                        pedido=pedido,
-                        usuario=usuario,
-                        producto=i.producto,
-                        cantidad_producto=i.cantidad,
-                        precio=i.producto.precio,
-                        total=i.subtotal()
-                    )
-
-                    # Reducir stock del producto vendido (usando la instancia bloqueada)
-                    try:
-                        p_locked = producto_map.get(i.producto.id)
-                        if p_locked:
-                            p_locked.stock = max(0, p_locked.stock - i.cantidad)
-                            p_locked.save()
-                    except Exception:
-                        pass
-
-                # limpiar carrito
-                try:
-                    cart.items.all().delete()
-                except Exception:
-                    pass
+    comprador = _comprador(request, nombre, direccion, email)
+    if items:
+        # La venta se agrega al libro de stock dentro de la transacción; si algún
+        # producto queda sin disponible se revierte todo (ver stock.registrar_venta)
+        try:
+            pedido_id, usuario = ejecutar(_crear_pedido_carrito, comprador, items, cart.id if cart else None)
 
-                return redirect(f"{reverse('gracias_frontend')}?cleared=1&pedido={pedido.id}")
+            carrito_sesion.vaciar()
+            respuesta = redirect(f"{reverse('gracias_frontend')}?cleared=1&pedido={pedido_id}")
+            return recordar_invitado(carrito_sesion.guardar(respuesta), usuario)
+        except StockInsuficiente as e:
+            messages.error(request, str(e))
+            return redirect('ver_carrito')
         except Exception:
+            logger.exception('Error al crear el pedido del carrito')
             messages.error(request, 'Error procesando el pedido. Intenta de nuevo.')
             return redirect('ver_carrito')
 
-    # Si no hay carrito, usar los datos enviados (cantidad y precio)
-    import re
-    cantidad = int(request.POST.get('cantidad', '1') or '1')
-    price_clean = re.sub(r'[^0-9.,]', '', precio_raw).replace(',', '.')
+    # Si no hay carrito, compra directa de un producto: el precio sale de la BD
+    try:
+        producto_id = int(request.POST.get('producto_id', ''))
+        cantidad = max(1, int(request.POST.get('cantidad', '1') or '1'))
+    except ValueError:
+        producto_id, cantidad = None, 1
+    producto_obj = Producto.objects.filter(id=producto_id).first() if producto_id else None
+    if producto_obj is None:
+        messages.error(request, 'No hay productos para comprar.')
+        return redirect('ver_carrito')
+
+    total = producto_obj.precio * cantidad
+
     try:
-        unit_price = float(price_clean) if price_clean else 0.0
+        pedido_id, usuario = ejecutar(_crear_pedido_individual, comprador, producto_obj, cantidad, total)
+    except StockInsuficiente as e:
+        messages.error(request, str(e))
+        return redirect('finalizar_producto', producto_id=producto_obj.id)
     except Exception:
-        unit_price = 0.0
+        logger.exception('Error al crear el pedido de un producto')
+        messages.error(request, 'Error procesando el pedido. Intenta de nuevo.')
+        return redirect('finalizar_producto', producto_id=producto_obj.id)
 
-    total = unit_price * cantidad
+    return recordar_invitado(redirect(f"{reverse('gracias_frontend')}?cleared=1&pedido={pedido_id}"), usuario)
 
-    pedido = Pedido.objects.create(usuario=usuario, cantidad_producto=cantidad, total=total)
 
-    # Intentar enlazar un Producto existente y crear DetallePedido con cantidad
-    producto_obj = None
-    if producto_nombre:
-        qs = Producto.objects.filter(nombre_producto__iexact=producto_nombre)
-        if artista_nombre:
-            qs = qs.filter(artista__nombre_artista__iexact=artista_nombre)
-        producto_obj = qs.first()
-
-    if producto_obj:
-        # Verificar stock para compra individual
-        if producto_obj.stock <= 0:
-            messages.error(request, f'El producto "{producto_obj.nombre_producto}" está fuera de stock.')
-            return redirect(f"{reverse('finalizar_frontend')}?artista={artista_nombre}&producto={producto_nombre}&precio={precio_raw}")
-        if cantidad > producto_obj.stock:
-            messages.error(request, f'Solo quedan {producto_obj.stock} unidades de "{producto_obj.nombre_producto}" en stock.')
-            return redirect(f"{reverse('finalizar_frontend')}?artista={artista_nombre}&producto={producto_nombre}&precio={precio_raw}")
+def _comprador(request, nombre, direccion, email):
+    """Lo que hace falta del request para resolver el perfil del pedido en el trabajo.
+
+    Sólo lee: el perfil del usuario con sesión y el id de la cookie de invitado.
+    """
+    perfil = None
+    if request.user.is_authenticated:
+        perfil = Usuario.objects.filter(user=request.user).first()
+    return perfil, invitado_de_cookie(request), nombre, direccion, email
+
 
+def _resolver_comprador(perfil, invitado_id, nombre, direccion, email):
+    """Perfil del pedido: el del usuario con sesión o el de invitado (ver invitados.py).
+
+    Corre dentro del trabajo, así las escrituras en `Usuario` pasan por el escritor
+    y un formulario sin productos no deja perfiles de invitado sin pedidos.
+    """
+    if perfil is not None:
+        try:
+            # actualizar datos públicos si vienen (sólo se escribe lo que cambió)
+            with transaction.atomic():
+                return actualizar_datos(perfil, nombre=nombre, direccion=direccion, email=email)
+        except Exception:
+            pass
+    return resolver_invitado(invitado_id, nombre=nombre, email=email, direccion=direccion)
+
+
+# Trabajos de escritura del checkout: corren en una transacción, en el hilo del
+# request o en el escritor único (ver escritor.py), así que no usan el request.
+# Devuelven (id del pedido, perfil) para que la vista recuerde al invitado.
+def _crear_pedido_carrito(comprador, items, cart_id=None):
+    usuario = _resolver_comprador(*comprador)
+    cantidad_total = sum(i.cantidad for i in items)
+    total = sum(i.subtotal() for i in items)
+
+    pedido = Pedido.objects.create(usuario=usuario, cantidad_producto=cantidad_total, total=total)
+
+    for i in items:
         DetallePedido.objects.create(
             pedido=pedido,
             usuario=usuario,
-            producto=producto_obj,
-            cantidad_producto=cantidad,
-            precio=producto_obj.precio,
-            total=total,
+            producto=i.producto,
+            cantidad_producto=i.cantidad,
+            precio=i.producto.precio,
+            total=i.subtotal()
         )
 
-        # Reducir stock del producto vendido
-        try:
-            producto_obj.stock = max(0, producto_obj.stock - cantidad)
-            producto_obj.save()
-        except Exception:
-            pass
+    registrar_venta([(i.producto, i.cantidad) for i in items], pedido=pedido)
 
-    return redirect(f"{reverse('gracias_frontend')}?cleared=1&pedido={pedido.id}")
+    # limpiar carrito
+    if cart_id:
+        CartItem.objects.filter(cart_id=cart_id).delete()
+    return pedido.id, usuario
+
+
+def _crear_pedido_individual(comprador, producto, cantidad, total):
+    usuario = _resolver_comprador(*comprador)
+    pedido = Pedido.objects.create(usuario=usuario, cantidad_producto=cantidad, total=total)
+    DetallePedido.objects.create(
+        pedido=pedido,
+        usuario=usuario,
+        producto=producto,
+        cantidad_producto=cantidad,
+        precio=producto.precio,
+        total=total,
+    )
+    # Verificar stock para compra individual (revierte el pedido si no alcanza)
+    registrar_venta([(producto, cantidad)], pedido=pedido)
+    return pedido.id, usuario
+
+
+def _sumar_al_carrito(usuario, producto, cantidad):
+    """Suma `cantidad` al carrito en BD si alcanza el stock. Devuelve (agregado, cantidad previa)."""
+    cart, _ = Cart.objects.get_or_create(usuario=usuario)
+    item = CartItem.objects.filter(cart=cart, producto=producto).first()
+    current_qty = item.cantidad if item else 0
+    if current_qty + cantidad > producto.stock_disponible:
+        return False, current_qty
+
+    # Aplicar la suma segura
+    if item:
+        item.cantidad = current_qty + cantidad
+        item.save(update_fields=['cantidad'])
+    else:
+        CartItem.objects.create(cart=cart, producto=producto, cantidad=cantidad)
+    return True, current_qty
 
 
 # ----------------------
 # CARRITO (cliente)
 # ----------------------
-@login_required
 def add_to_cart(request, producto_id):
-    producto = get_object_or_404(Producto, id=producto_id)
-    usuario = request.user.usuario
-    cart, _ = Cart.objects.get_or_create(usuario=usuario)
+    producto = get_object_or_404(anotar_stock_disponible(Producto.objects.all()), id=producto_id)
+    # redirigir a la página anterior o al index
+    next_url = request.POST.get('next') or request.META.get('HTTP_REFERER') or '/index/'
 
     # cantidad desde POST (si no viene, 1)
     cantidad = int(request.POST.get('cantidad', 1)) if request.method == 'POST' else 1
     # Validar stock antes de agregar
-    if producto.stock <= 0:
+    if producto.stock_disponible <= 0:
         messages.error(request, f'"{producto.nombre_producto}" está fuera de stock.')
-        next_url = request.POST.get('next') or request.META.get('HTTP_REFERER') or '/index/'
         return redirect(next_url)
 
-    item, created = CartItem.objects.get_or_create(cart=cart, producto=producto)
-    current_qty = item.cantidad if not created else 0
-    requested_new = current_qty + cantidad
-
-    if requested_new > producto.stock:
-        messages.error(request, f'No se pueden agregar {cantidad} unidades. Solo quedan {producto.stock - current_qty} unidades de "{producto.nombre_producto}".')
-        next_url = request.POST.get('next') or request.META.get('HTTP_REFERER') or '/index/'
+    # Visitante sin sesión: el carrito vive en una cookie firmada, sin escrituras en BD
+    if not request.user.is_authenticated:
+        carrito = SessionCart(request)
+        current_qty = carrito.cantidad(producto.id)
+        if current_qty + cantidad > producto.stock_disponible:
+            messages.error(request, f'No se pueden agregar {cantidad} unidades. Solo quedan {producto.stock_disponible - current_qty} unidades de "{producto.nombre_producto}".')
+            return redirect(next_url)
+        carrito.agregar(producto.id, cantidad)
+        messages.success(request, f'"{producto.nombre_producto}" agregado al carrito.')
+        return carrito.guardar(redirect(next_url))
+
+    agregado, current_qty = ejecutar(_sumar_al_carrito, request.user.usuario, producto, cantidad)
+    if not agregado:
+        messages.error(request, f'No se pueden agregar {cantidad} unidades. Solo quedan {producto.stock_disponible - current_qty} unidades de "{producto.nombre_producto}".')
         return redirect(next_url)
 
-    # Aplicar la suma segura
-    if not created:
-        item.cantidad = current_qty + cantidad
-    else:
-        item.cantidad = cantidad
-    item.save()
-
     messages.success(request, f'"{producto.nombre_producto}" agregado al carrito.')
-    # redirigir a la página anterior o al index
-    next_url = request.POST.get('next') or request.META.get('HTTP_REFERER') or '/index/'
     return redirect(next_url)
 
 
-@login_required
 def ver_carrito(request):
-    usuario = request.user.usuario
-    cart, _ = Cart.objects.get_or_create(usuario=usuario)
-    items = cart.items.select_related('producto').all()
+    if request.user.is_authenticated:
+        usuario = request.user.usuario
+        cart, _ = Cart.objects.get_or_create(usuario=usuario)
+        items = anotar_stock_disponible(cart.items.select_related('producto'), 'producto__')
+    else:
+        cart = None
+        items = SessionCart(request).items()
     total = sum(item.subtotal() for item in items)
     # Detectar si hay problemas de stock en el carrito
-    cart_has_stock_issue = any((item.producto.stock <= 0) or (item.cantidad > item.producto.stock) for item in items)
+    cart_has_stock_issue = any((item.stock_disponible <= 0) or (item.cantidad > item.stock_disponible) for item in items)
     return render(request, 'cart.html', {'cart': cart, 'items': items, 'total': total, 'cart_has_stock_issue': cart_has_stock_issue})
 
 
-@login_required
 def update_cart_item(request, item_id):
-    item = get_object_or_404(CartItem, id=item_id, cart__usuario__user=request.user)
+    # Sin sesión, `item_id` es el id del producto dentro del carrito de la cookie
+    if not request.user.is_authenticated:
+        carrito = SessionCart(request)
+        if request.method == 'POST' and carrito.cantidad(item_id):
+            try:
+                cantidad = int(request.POST.get('cantidad', 1))
+                if cantidad > 0:
+                    disponible = stock_disponible([item_id]).get(item_id, 0)
+                    if cantidad > disponible:
+                        messages.error(request, f'Solo quedan {disponible} unidades en stock.')
+                        return redirect('ver_carrito')
+                carrito.fijar(item_id, cantidad)
+                messages.success(request, 'Carrito actualizado.')
+            except ValueError:
+                messages.error(request, 'Error al actualizar la cantidad.')
+        return carrito.guardar(redirect('ver_carrito'))
+
+    item = get_object_or_404(
+        anotar_stock_disponible(CartItem.objects.select_related('producto'), 'producto__'),
+        id=item_id, cart__usuario__user=request.user,
+    )
     if request.method == 'POST':
         try:
             cantidad = int(request.POST.get('cantidad', 1))
@@ -716,8 +1157,8 @@ def update_cart_item(request, item_id):
             if cantidad <= 0:
                 item.delete()
             else:
-                if cantidad > item.producto.stock:
-                    messages.error(request, f'Solo quedan {item.producto.stock} unidades de "{item.producto.nombre_producto}" en stock.')
+                if cantidad > item.stock_disponible:
+                    messages.error(request, f'Solo quedan {item.stock_disponible} unidades de "{item.producto.nombre_producto}" en stock.')
                     return redirect('ver_carrito')
                 item.cantidad = cantidad
                 item.save()
@@ -727,8 +1168,86 @@ def update_cart_item(request, item_id):
     return redirect('ver_carrito')
 
 
-@login_required
+def update_cart_batch(request):
+    """Aplica varios cambios de cantidad en una sola petición y responde JSON.
+
+    Cuerpo: {"cambios": {"<item_id>": cantidad, ...}}. Una cantidad <= 0 elimina
+    la línea. El stock se valida con una sola consulta y los cambios se guardan
+    en una transacción. Sin sesión, los ids son los del producto (carrito de cookie).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido.'}, status=405)
+    try:
+        cambios = {int(k): int(v) for k, v in json.loads(request.body)['cambios'].items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'error': 'Formato de cambios inválido.'}, status=400)
+
+    carrito = None if request.user.is_authenticated else SessionCart(request)
+    avisos, modificados, eliminados = [], [], []
+    with transaction.atomic():
+        if carrito is None:
+            items = list(anotar_stock_disponible(
+                CartItem.objects.select_related('producto').filter(cart__usuario__user=request.user),
+                'producto__',
+            ))
+        else:
+            items = carrito.items()
+        por_id = {item.id: item for item in items}
+
+        for item_id, cantidad in cambios.items():
+            item = por_id.get(item_id)
+            if item is None:
+                avisos.append({'item_id': item_id, 'mensaje': 'El producto ya no está en el carrito.'})
+            elif cantidad <= 0:
+                eliminados.append(item)
+            elif cantidad > item.stock_disponible:
+                avisos.append({
+                    'item_id': item_id,
+                    'mensaje': f'Solo quedan {item.stock_disponible} unidades de "{item.producto.nombre_producto}" en stock.',
+                })
+            elif cantidad != item.cantidad:
+                item.cantidad = cantidad
+                modificados.append(item)
+
+        if carrito is None:
+            if modificados:
+                CartItem.objects.bulk_update(modificados, ['cantidad'])
+            if eliminados:
+                CartItem.objects.filter(id__in=[item.id for item in eliminados]).delete()
+        else:
+            for item in modificados:
+                carrito.fijar(item.id, item.cantidad)
+            for item in eliminados:
+                carrito.quitar(item.id)
+
+    restantes = [item for item in items if item not in eliminados]
+    response = JsonResponse({
+        'lineas': {
+            item.id: {
+                'cantidad': item.cantidad,
+                'subtotal': item.subtotal(),
+                'stock_disponible': item.stock_disponible,
+            }
+            for item in restantes
+        },
+        'eliminados': [item.id for item in eliminados],
+        'total': sum((item.subtotal() for item in restantes), Decimal('0')),
+        'cantidad_total': sum(item.cantidad for item in restantes),
+        'articulos': len(restantes),
+        'avisos': avisos,
+        'cart_has_stock_issue': any(item.cantidad > item.stock_disponible for item in restantes),
+    })
+    return carrito.guardar(response) if carrito is not None else response
+
+
 def remove_cart_item(request, item_id):
+    if not request.user.is_authenticated:
+        carrito = SessionCart(request)
+        if request.method == 'POST':
+            carrito.quitar(item_id)
+            messages.success(request, 'Producto eliminado del carrito.')
+        return carrito.guardar(redirect('ver_carrito'))
+
     item = get_object_or_404(CartItem, id=item_id, cart__usuario__user=request.user)
     if request.method == 'POST':
         item.delete()
@@ -742,8 +1261,20 @@ def remove_cart_item(request, item_id):
 @login_required
 def perfil_usuario(request):
     usuario = request.user.usuario
-    pedidos = usuario.pedidos.order_by('-fecha')[:20]
-    return render(request, 'perfil.html', {'usuario': usuario, 'pedidos': pedidos})
+    incluir_archivados = request.GET.get('archivados') == '1'
+    pedidos = usuario.pedidos.prefetch_related('detalles__producto__artista').order_by('-fecha')
+    if incluir_archivados:
+        archivados = usuario.pedidos_archivados.prefetch_related(
+            'detalles__producto__artista'
+        ).order_by('-fecha')
+        pedidos = combinar_con_archivo(pedidos, archivados, limite=20)
+    else:
+        pedidos = pedidos[:20]
+    return render(request, 'perfil.html', {
+        'usuario': usuario,
+        'pedidos': pedidos,
+        'incluir_archivados': incluir_archivados,
+    })
 
 
 @login_required
@@ -763,11 +1294,25 @@ def editar_perfil(request):
 # ----------------------
 # CRUD Pedidos (Admin)
 # ----------------------
+# Con el archivo incluido se muestran sólo los más recientes: el archivo crece sin límite
+ARCHIVO_EN_PANEL = 200
+
+
 @login_required
 @user_passes_test(is_staff_user)
 def ver_pedidos(request):
+    incluir_archivados = request.GET.get('archivados') == '1'
     pedidos = Pedido.objects.select_related('usuario').all().order_by('-fecha')
-    return render(request, 'admin_panel/pedidos_ver.html', {'pedidos': pedidos})
+    if incluir_archivados:
+        pedidos = combinar_con_archivo(
+            pedidos, PedidoArchivado.objects.select_related('usuario').order_by('-fecha'),
+            limite=ARCHIVO_EN_PANEL,
+        )
+    return render(request, 'admin_panel/pedidos_ver.html', {
+        'pedidos': pedidos,
+        'incluir_archivados': incluir_archivados,
+        'limite_archivo': ARCHIVO_EN_PANEL,
+    })
 
 
 @login_required
@@ -789,24 +1334,22 @@ def agregar_pedido(request):
             return redirect('ver_pedidos')
         except Exception as e:
             messages.error(request, f'Error al crear pedido: {str(e)}')
-            
-    usuarios = _safe_all_usuarios()
-    return render(request, 'admin_panel/pedidos_agregar.html', {'usuarios': usuarios})
+
+    return render(request, 'admin_panel/pedidos_agregar.html')
 
 
 @login_required
 @user_passes_test(is_staff_user)
 def actualizar_pedido(request, pedido_id):
-    pedido = get_object_or_404(Pedido, id=pedido_id)
+    pedido = get_object_or_404(Pedido.objects.select_related('usuario'), id=pedido_id)
     if request.method == 'POST':
         pedido.cantidad_producto = int(request.POST.get('cantidad_producto', pedido.cantidad_producto))
         pedido.total = float(request.POST.get('total', pedido.total))
         pedido.save()
         messages.success(request, 'Pedido actualizado correctamente.')
         return redirect('ver_pedidos')
-    
-    usuarios = _safe_all_usuarios()
-    return render(request, 'admin_panel/pedidos_actualizar.html', {'pedido': pedido, 'usuarios': usuarios})
+
+    return render(request, 'admin_panel/pedidos_actualizar.html', {'pedido': pedido})
 
 
 @login_required
@@ -826,8 +1369,19 @@ def borrar_pedido(request, pedido_id):
 @login_required
 @user_passes_test(is_staff_user)
 def ver_detalles_pedidos(request):
+    incluir_archivados = request.GET.get('archivados') == '1'
     detalles = DetallePedido.objects.select_related('pedido', 'usuario', 'producto').all().order_by('-fecha')
-    return render(request, 'admin_panel/detalles_pedidos_ver.html', {'detalles': detalles})
+    if incluir_archivados:
+        detalles = combinar_con_archivo(
+            detalles,
+            DetallePedidoArchivado.objects.select_related('pedido', 'usuario').order_by('-fecha'),
+            limite=ARCHIVO_EN_PANEL,
+        )
+    return render(request, 'admin_panel/detalles_pedidos_ver.html', {
+        'detalles': detalles,
+        'incluir_archivados': incluir_archivados,
+        'limite_archivo': ARCHIVO_EN_PANEL,
+    })
 
 
 @login_required
@@ -858,21 +1412,17 @@ def agregar_detalle_pedido(request):
             return redirect('ver_detalles_pedidos')
         except Exception as e:
             messages.error(request, f'Error al crear detalle: {str(e)}')
-            
-    pedidos = Pedido.objects.all()
-    usuarios = _safe_all_usuarios()
-    productos = Producto.objects.all()
-    return render(request, 'admin_panel/detalles_pedidos_agregar.html', {
-        'pedidos': pedidos,
-        'usuarios': usuarios,
-        'productos': productos
-    })
+
+    # Pedido, cliente y producto se eligen con autocompletado (ver buscar_admin)
+    return render(request, 'admin_panel/detalles_pedidos_agregar.html')
 
 
 @login_required
 @user_passes_test(is_staff_user)
 def actualizar_detalle_pedido(request, detalle_id):
-    detalle = get_object_or_404(DetallePedido, id=detalle_id)
+    detalle = get_object_or_404(
+        DetallePedido.objects.select_related('pedido__usuario', 'usuario', 'producto'), id=detalle_id
+    )
     if request.method == 'POST':
         detalle.cantidad_producto = int(request.POST.get('cantidad_producto', detalle.cantidad_producto))
         detalle.precio = float(request.POST.get('precio', detalle.precio))
@@ -880,16 +1430,8 @@ def actualizar_detalle_pedido(request, detalle_id):
         detalle.save()
         messages.success(request, 'Detalle actualizado correctamente.')
         return redirect('ver_detalles_pedidos')
-    
-    pedidos = Pedido.objects.all()
-    usuarios = _safe_all_usuarios()
-    productos = Producto.objects.all()
-    return render(request, 'admin_panel/detalles_pedidos_actualizar.html', {
-        'detalle': detalle,
-        'pedidos': pedidos,
-        'usuarios': usuarios,
-        'productos': productos
-    })
+
+    return render(request, 'admin_panel/detalles_pedidos_actualizar.html', {'detalle': detalle})
 
 
 @login_required
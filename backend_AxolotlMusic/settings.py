@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,11 +42,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero: comprime lo que devuelvan todos los demás
+    'app_Axolotl.compresion.CompresionMiddleware',
+    'app_Axolotl.registro_sql.RegistroSQLMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app_Axolotl.db_router.ReplicaMiddleware',
+    'app_Axolotl.perfilador.PerfiladorMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,7 +84,37 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+        },
+    }
+}
+
+# Réplicas de solo lectura para el catálogo, separadas por comas.
+# Localmente: AXOLOTL_REPLICAS=db_replica.sqlite3 y python manage.py sincronizar_replicas
+DATABASE_REPLICAS = []
+for i, nombre in enumerate(filter(None, os.environ.get('AXOLOTL_REPLICAS', '').split(',')), 1):
+    alias = f'replica{i}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / nombre.strip(),
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['app_Axolotl.db_router.ReplicaRouter']
+
+# Vistas de la tienda que pueden leer de las réplicas
+REPLICA_VISTAS = {
+    'index_frontend',
+    'catalogo_frontend',
+    'genero_frontend',
+    'tipo_frontend',
+    'artistas_frontend',
+    'artista_detalle',
+    'comprar_artista',
+    'novedades_frontend',
+    'lista_frontend',
 }
 
 
@@ -119,6 +155,9 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Exportación estática del catálogo (python manage.py exportar_estaticos)
+EXPORTACION_ESTATICA_ROOT = BASE_DIR / 'estatico'
+
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -127,3 +166,53 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Pedidos con más días que esto se mueven al archivo (python manage.py archivar_pedidos)
+ARCHIVO_PEDIDOS_DIAS = 365
+
+# Respuestas HTML sin espacios sobrantes y comprimidas desde este tamaño (app_Axolotl/compresion.py)
+MINIFICAR_HTML = True
+COMPRESION_MINIMO = 860
+
+# Checkout y carrito encolados en un solo hilo escritor por proceso (app_Axolotl/escritor.py).
+# Pensado para SQLite con muchos compradores a la vez.
+ESCRITOR_UNICO = os.environ.get('AXOLOTL_ESCRITOR_UNICO') == '1'
+ESCRITOR_LOTE = 20
+if ESCRITOR_UNICO:
+    # Con las escrituras encoladas, cada transacción toma el lock al empezar y espera
+    # (hasta `timeout` s) en vez de fallar a mitad. Sin la cola, las lecturas dentro
+    # de `atomic()` también lo tomarían y se serializarían todas.
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Catálogo y tipos se envían en streaming desde esta cantidad de productos (app_Axolotl/listados.py)
+LISTADO_STREAMING_DESDE = 300
+LISTADO_LOTE = 60
+
+# Perfilador por muestreo (app_Axolotl/perfilador.py): staff con ?perfilar=1 o esta fracción del tráfico
+PERFILADOR_MUESTREO = float(os.environ.get('AXOLOTL_PERFILADOR_MUESTREO', '0'))
+PERFILADOR_INTERVALO = 0.005
+PERFILES_ROOT = BASE_DIR / 'perfiles'
+PERFILES_MAX = 200
+
+# Consultas SQL por huella y detección de N+1 (app_Axolotl/registro_sql.py), activo con DEBUG
+REGISTRO_SQL = os.environ.get('AXOLOTL_REGISTRO_SQL', '1' if DEBUG else '0') == '1'
+REGISTRO_SQL_LENTA = 0.1  # segundos: se avisa en el log
+REGISTRO_SQL_NMAS1 = 10  # misma consulta repetida en un request
+
+# Sitemap y feed de productos por bloques de ids, guardados en disco (app_Axolotl/mapa_sitio.py)
+SITEMAP_ROOT = BASE_DIR / 'sitemap'
+SITEMAP_BLOQUE = 5000  # ids por bloque (el máximo del protocolo es 50.000 URLs por sitemap)
+SITEMAP_VIGENCIA = 300  # segundos entre revisiones de las firmas
+SITIO_URL = os.environ.get('AXOLOTL_SITIO_URL', '')  # vacío: el host del request
+
+# Instantánea del catálogo mapeada en memoria por los workers (python manage.py generar_instantanea --cada 60).
+# Mientras no se genere, las páginas del catálogo leen del ORM.
+INSTANTANEA_CATALOGO = True
+INSTANTANEA_CATALOGO_ROOT = BASE_DIR / 'instantanea'
+
+# Exportación columnar por mes para análisis fuera de línea (python manage.py exportar_columnas)
+EXPORTACION_COLUMNAR_ROOT = BASE_DIR / 'columnar'
+
+# Rankings de más vendidos (app_Axolotl/mas_vendidos.py, python manage.py actualizar_mas_vendidos)
+MAS_VENDIDOS_VENTANAS = (7, 30)  # días
+MAS_VENDIDOS_TAMANO = 12